@@ -0,0 +1,394 @@
+"""
+Benchmarks the vendor qualification pipeline on catalogs generated by `Benchmarks.CatalogGenerator`.
+
+Run it as a module from the repository root, so the pipeline's top-level modules are importable:
+
+    python -m Benchmarks.BenchmarkRunner --sizes 1000 10000 --output benchmark-report.json
+
+`--help` lists the options (scorers, repetitions, persisted indexes, quantization, ...).
+"""
+import os
+import io
+import sys
+import json
+import time
+import platform
+import subprocess
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from Benchmarks.CatalogGenerator import write_catalog, generate_catalog, MAIN_CATEGORIES, DOMAIN_WORDS
+
+BENCHMARK_REPORT_FORMAT_VERSION = 1
+
+# Catalog sizes benchmarked end to end by default
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+# Queries per end-to-end run, drawn from the generator's categories and words
+BENCHMARK_QUERY_COUNT = 20
+
+# Vendors the micro-benchmarks of the per-row pipeline run on, it vectorizes every feature separately
+MICRO_SAMPLE_SIZE = 200
+
+def make_benchmark_queries(n_queries=BENCHMARK_QUERY_COUNT, seed=0):
+    """
+    Builds (software_category, capabilities) pairs matching the generated catalogs, the same for the same seed.
+
+    Returns:
+        list: The queries, as accepted by `get_qualifiedVendors_batch`.
+    """
+    rng = np.random.default_rng(seed)
+    queries = []
+    for _ in range(n_queries):
+        category = MAIN_CATEGORIES[rng.integers(0, len(MAIN_CATEGORIES))]
+        capabilities = [' '.join(rng.choice(DOMAIN_WORDS, size=2, replace=False))
+                        for _ in range(rng.integers(1, 4))]
+        queries.append((category, capabilities))
+    return queries
+
+def measure(function, repeat=5, warmup=1):
+    """
+    Times repeated calls of `function`.
+
+    Args:
+        function (callable): Called without arguments.
+        repeat (int, optional): Number of timed calls. Defaults to 5.
+        warmup (int, optional): Number of untimed calls made first. Defaults to 1.
+
+    Returns:
+        dict: 'runs' and the 'min_ms', 'median_ms', 'mean_ms' and 'p95_ms' of the timed calls.
+    """
+    for _ in range(warmup):
+        function()
+
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - started) * 1000)
+    return summarize_durations(durations)
+
+def summarize_durations(durations):
+    """Returns the statistics of `measure` for durations given in milliseconds."""
+    durations = np.asarray(durations, dtype=np.float64)
+    if len(durations) == 0:
+        return {'runs': 0, 'min_ms': None, 'median_ms': None, 'mean_ms': None, 'p95_ms': None}
+    return {
+        'runs': len(durations),
+        'min_ms': round(float(durations.min()), 4),
+        'median_ms': round(float(np.median(durations)), 4),
+        'mean_ms': round(float(durations.mean()), 4),
+        'p95_ms': round(float(np.percentile(durations, 95)), 4),
+    }
+
+def get_peak_rss_mb():
+    """Returns the peak resident set size of the current process in MB, None where it can't be read."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        # Peak working set on Windows
+        return round(psutil.Process().memory_info().peak_wset / 2 ** 20, 1)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10, 1)
+
+def run_micro_benchmarks(sample_size=MICRO_SAMPLE_SIZE, repeat=5, seed=0):
+    """
+    Times the individual stages of the per-row pipeline and their indexed replacements on a generated sample.
+
+    Args:
+        sample_size (int, optional): Number of generated vendors. Defaults to MICRO_SAMPLE_SIZE.
+        repeat (int, optional): Timed calls per stage. Defaults to 5.
+        seed (int, optional): Seed of the sample and queries. Defaults to 0.
+
+    Returns:
+        dict: Statistics (see `measure`) per benchmarked function.
+    """
+    from CommonProcessingUtility import load_nltk_data, load_stemmer_lemmatizer_stopwords, preprocess_text, get_query
+    from Vectorization.FullDataVectorizer import generate_tfidf_per_row, build_feature_index
+    from SimilarityEvaluation.SimilarityEvaluator import calculate_similarity, filter_highly_similar_rows,\
+          calculate_feature_similarity_batch
+    from RankingService import rank_vendors, rank_top_vendors
+
+    load_nltk_data()
+    lemmatizer, stemmer, stop_words = load_stemmer_lemmatizer_stopwords()
+    # The per-row similarity doesn't handle vendors without features, the sample has none
+    df = generate_catalog(sample_size, seed, invalid_fraction=0)
+    software_category, capabilities = make_benchmark_queries(1, seed)[0]
+    query = get_query(software_category, capabilities)
+    descriptions = [json.loads(features)[0]['features'][0]['description'] for features in df['Features'][:100]]
+
+    results = {}
+    # The per-row functions print their errors per vendor, keep that out of the output
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['preprocess_text'] = measure(
+            lambda: [preprocess_text(stemmer, lemmatizer, stop_words, text) for text in descriptions], repeat)
+        results['generate_tfidf_per_row'] = measure(lambda: generate_tfidf_per_row(df.copy()), repeat)
+
+        vectorized = generate_tfidf_per_row(df.copy())
+        results['calculate_similarity'] = measure(lambda: calculate_similarity(query, vectorized.copy()), repeat)
+
+        scored = calculate_similarity(query, vectorized.copy())
+        results['filter_highly_similar_rows'] = measure(lambda: filter_highly_similar_rows(scored), repeat)
+
+        filtered = filter_highly_similar_rows(scored)
+        results['rank_vendors'] = measure(lambda: rank_vendors(filtered), repeat)
+
+        feature_index = build_feature_index(df)
+        results['calculate_feature_similarity_batch'] = measure(
+            lambda: calculate_feature_similarity_batch([query], feature_index), repeat)
+
+        similarity_scores = scored['avg_similarity_scores'].to_numpy(dtype=np.float64)
+        ratings = scored['rating'].to_numpy(dtype=np.float64)
+        results['rank_top_vendors'] = measure(lambda: rank_top_vendors(similarity_scores, ratings), repeat)
+
+    return results
+
+def run_retrieval_benchmarks(catalog, query_texts, k=10, backends=('ivf', 'hnsw')):
+    """
+    Measures the approximate retrieval backends against exact search on a catalog's vendor embeddings.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        query_texts (list): Query texts, embedded once.
+        k (int, optional): Number of vendors retrieved per query. Defaults to 10.
+        backends (tuple, optional): Backends to evaluate (see `VectorRetrieval.RETRIEVAL_BACKENDS`).
+            Defaults to ('ivf', 'hnsw').
+
+    Returns:
+        dict: Per backend, 'build_s' and the 'recall_at_k', 'exact_ms' and 'approximate_ms' of
+        `VectorRetrieval.evaluate_recall`, None for a backend whose optional package isn't installed.
+    """
+    from VendorQualification.VendorCatalog import get_catalog_embedding_index
+    from SimilarityEvaluation.EmbeddingScorer import embed_query
+    from SimilarityEvaluation.VectorRetrieval import build_retrieval_index, evaluate_recall
+
+    embedding_index = get_catalog_embedding_index(catalog)
+    embeddings = embedding_index['embeddings']
+    query_embeddings = np.vstack([embed_query(query, embedding_index) for query in query_texts])
+
+    report = {}
+    for backend in backends:
+        started = time.perf_counter()
+        try:
+            retrieval_index = build_retrieval_index(embeddings, backend)
+        except ImportError:
+            report[backend] = None
+            continue
+        build_s = time.perf_counter() - started
+
+        recall = evaluate_recall(embeddings, query_embeddings, retrieval_index, k)
+        report[backend] = {
+            'build_s': round(build_s, 4),
+            'recall_at_k': round(recall['recall_at_k'], 4),
+            'exact_ms': round(recall['exact_ms'], 4),
+            'approximate_ms': round(recall['approximate_ms'], 4),
+        }
+    return report
+
+def run_quantization_benchmark(sample_size=MICRO_SAMPLE_SIZE, seed=0):
+    """
+    Compares the int8 quantized embedding model with the float32 one on a generated sample
+    (see `EmbeddingScorer.evaluate_quantization`).
+
+    Returns:
+        dict: The throughput, query latency and agreement of both models.
+    """
+    from SimilarityEvaluation.EmbeddingScorer import evaluate_quantization
+
+    df = generate_catalog(sample_size, seed, invalid_fraction=0)
+    return evaluate_quantization(df, held_out=sample_size, seed=seed)
+
+def run_end_to_end(input_path, queries, scorers=('tfidf',), k=10, index_path=None, repeat=3):
+    """
+    Measures `get_qualifiedVendors` end to end on one catalog, without the result cache.
+
+    Args:
+        input_path (str): Vendor CSV file.
+        queries (list): (software_category, capabilities) pairs.
+        scorers (tuple, optional): Scorers to benchmark (see `VendorQualifier.SCORERS`). Defaults to ('tfidf',).
+        k (int, optional): Number of vendors returned per query. Defaults to 10.
+        index_path (str, optional): Directory to persist the catalog index in. Defaults to None (in memory).
+        repeat (int, optional): Passes over the queries per scorer. Defaults to 3.
+
+    Returns:
+        dict: Contains:
+            - 'catalog_build_s': Time to load and index the catalog.
+            - 'vendors': Number of vendors in the catalog.
+            - 'vector_bytes_per_vendor': Memory of the feature vectors (see `VectorStore`) per vendor.
+            - 'scorers': Per scorer, the per-query 'latency' statistics, 'queries_per_second' and the mean
+              time per pipeline stage ('stages_ms', from `Instrumentation`).
+            - 'batch': 'queries_per_second' of `get_qualifiedVendors_batch` over the same queries.
+            - 'retrieval': Recall@k and latency of the IVF and HNSW backends against exact search (see
+              `run_retrieval_benchmarks`), when an embedding based scorer is benchmarked.
+            - 'peak_rss_mb': Peak resident memory of the process.
+    """
+    from CommonProcessingUtility import get_query
+    from VendorQualification.VendorCatalog import get_catalog
+    from VendorQualification.VendorQualifier import get_qualifiedVendors, get_qualifiedVendors_batch
+    from Vectorization.VectorStore import get_vector_nbytes
+    from Instrumentation import reset_metrics, get_metrics_snapshot
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        catalog = get_catalog(input_path, index_path)
+        catalog_build_s = time.perf_counter() - started
+
+    report = {'catalog_build_s': round(catalog_build_s, 4), 'vendors': len(catalog['df']), 'scorers': {},
+              'vector_bytes_per_vendor': round(get_vector_nbytes(catalog['feature_index']['matrix'])
+                                               / max(len(catalog['df']), 1), 1)}
+    query_texts = [get_query(software_category, capabilities) for software_category, capabilities in queries]
+
+    for scorer in scorers:
+        def run_query(position):
+            software_category, capabilities = queries[position]
+            return get_qualifiedVendors(input_path, query_texts[position], software_category, capabilities, k=k,
+                                        index_path=index_path, use_cache=False, scorer=scorer)
+
+        # First query loads what the scorer builds lazily (e.g. the embeddings)
+        with contextlib.redirect_stdout(io.StringIO()):
+            run_query(0)
+        reset_metrics()
+
+        durations = []
+        for _ in range(repeat):
+            for position in range(len(queries)):
+                started = time.perf_counter()
+                run_query(position)
+                durations.append((time.perf_counter() - started) * 1000)
+
+        stages = get_metrics_snapshot()['stages']
+        report['scorers'][scorer] = {
+            'latency': summarize_durations(durations),
+            'queries_per_second': round(len(durations) / (sum(durations) / 1000), 2) if durations else None,
+            'stages_ms': {stage: round(1000 * histogram['sum'] / len(durations), 4)
+                          for stage, histogram in sorted(stages.items())} if durations else {},
+        }
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        get_qualifiedVendors_batch(input_path, queries, k=k, index_path=index_path, use_cache=False)
+    elapsed = time.perf_counter() - started
+    report['batch'] = {'queries_per_second': round(repeat * len(queries) / elapsed, 2) if elapsed > 0 else None}
+
+    if 'embedding' in scorers or 'hybrid' in scorers:
+        report['retrieval'] = run_retrieval_benchmarks(catalog, query_texts, k)
+
+    report['peak_rss_mb'] = get_peak_rss_mb()
+    return report
+
+def run_catalog_size(n_vendors, work_dir, seed=0, scorers=('tfidf',), repeat=3, persist_index=False):
+    """
+    Generates (or reuses) the catalog of one size and benchmarks it end to end (see `run_end_to_end`).
+
+    Returns:
+        dict: The end-to-end report, plus 'generate_s' when the catalog had to be generated.
+    """
+    input_path = os.path.join(work_dir, f"catalog-{n_vendors}-{seed}.csv")
+    generate_s = None
+    if not os.path.exists(input_path):
+        started = time.perf_counter()
+        write_catalog(input_path, n_vendors, seed)
+        generate_s = round(time.perf_counter() - started, 4)
+
+    index_path = os.path.join(work_dir, f"index-{n_vendors}-{seed}") if persist_index else None
+    report = run_end_to_end(input_path, make_benchmark_queries(seed=seed), scorers, index_path=index_path,
+                            repeat=repeat)
+    report['generate_s'] = generate_s
+    return report
+
+def get_environment():
+    """Describes where the benchmarks ran, so reports of different machines aren't compared by accident."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def run_benchmarks(sizes=DEFAULT_SIZES, work_dir='benchmark-data', seed=0, scorers=('tfidf',), repeat=3,
+                   micro=True, persist_index=False, isolate=True, quantization=False):
+    """
+    Runs the micro-benchmarks and the end-to-end benchmarks of every catalog size.
+
+    Args:
+        sizes (iterable, optional): Numbers of vendors of the generated catalogs. Defaults to DEFAULT_SIZES.
+        work_dir (str, optional): Directory the generated catalogs (and indexes) are kept in, catalogs already
+            there are reused. Defaults to 'benchmark-data'.
+        seed (int, optional): Seed of the catalogs and queries. Defaults to 0.
+        scorers (tuple, optional): Scorers benchmarked end to end. Defaults to ('tfidf',).
+        repeat (int, optional): Repetitions per measurement. Defaults to 3.
+        micro (bool, optional): Also run `run_micro_benchmarks`. Defaults to True.
+        persist_index (bool, optional): Persist the catalog indexes in `work_dir`, a second run then measures
+            a warm start. Defaults to False.
+        isolate (bool, optional): Benchmark every size in a fresh process so its peak memory isn't
+            inflated by the previous sizes. Defaults to True.
+        quantization (bool, optional): Also run `run_quantization_benchmark`, it loads the embedding model
+            twice. Defaults to False.
+
+    Returns:
+        dict: The report, with 'environment', 'parameters', 'micro', 'quantization' and 'end_to_end' (keyed by size).
+    """
+    report = {
+        'format_version': BENCHMARK_REPORT_FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': get_environment(),
+        'parameters': {'sizes': list(sizes), 'seed': seed, 'scorers': list(scorers), 'repeat': repeat},
+        'micro': run_micro_benchmarks(repeat=repeat, seed=seed) if micro else None,
+        'quantization': run_quantization_benchmark(seed=seed) if quantization else None,
+        'end_to_end': {},
+    }
+
+    for n_vendors in sizes:
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                result = executor.submit(run_catalog_size, n_vendors, work_dir, seed, scorers, repeat,
+                                         persist_index).result()
+        else:
+            result = run_catalog_size(n_vendors, work_dir, seed, scorers, repeat, persist_index)
+        report['end_to_end'][str(n_vendors)] = result
+        print(f"Benchmarked {n_vendors} vendors: {json.dumps(result['scorers'])}")
+
+    return report
+
+def write_report(report, output_path):
+    """Writes a report as indented JSON with sorted keys, so two reports diff line by line."""
+    with open(output_path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
+        file.write('\n')
+    return output_path
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the vendor qualification pipeline on generated catalogs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Vendors per catalog')
+    parser.add_argument('--work-dir', default='benchmark-data', help='Directory of the generated catalogs')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the catalogs and queries')
+    parser.add_argument('--scorers', nargs='+', default=['tfidf'], help='Scorers benchmarked end to end')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement')
+    parser.add_argument('--no-micro', action='store_true', help='Skip the micro-benchmarks')
+    parser.add_argument('--persist-index', action='store_true', help='Persist the catalog indexes in --work-dir')
+    parser.add_argument('--no-isolate', action='store_true', help='Run every size in this process')
+    parser.add_argument('--quantization', action='store_true', help='Compare the int8 and float32 embedding models')
+    parser.add_argument('--output', default='benchmark-report.json', help='Path of the JSON report')
+    args = parser.parse_args()
+
+    benchmark_report = run_benchmarks(args.sizes, args.work_dir, args.seed, tuple(args.scorers), args.repeat,
+                                      micro=not args.no_micro, persist_index=args.persist_index,
+                                      isolate=not args.no_isolate, quantization=args.quantization)
+    write_report(benchmark_report, args.output)
+    print(f"Wrote benchmark report to {args.output}")
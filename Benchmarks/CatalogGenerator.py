@@ -0,0 +1,178 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Main categories vendors are spread over, most vendors fall into the first ones
+MAIN_CATEGORIES = [
+    'CRM Software', 'Accounting & Finance Software', 'HR Software', 'Marketing Software', 'Project Management Software',
+    'Analytics Software', 'Security Software', 'Collaboration & Productivity Software', 'E-Commerce Software',
+    'IT Management Software', 'Supply Chain & Logistics Software', 'Customer Service Software',
+    'Content Management Software', 'Development Software', 'ERP Software', 'Sales Software',
+]
+
+# Feature groups ('Category' of the nested features)
+FEATURE_CATEGORIES = ['Core', 'Reporting', 'Administration', 'Integrations', 'Security', 'Platform', 'Mobile',
+                      'Automation', 'Collaboration', 'Support']
+
+# Domain words the feature names and descriptions are drawn from, completed with synthetic words
+DOMAIN_WORDS = (
+    'account analytics api approval asset audit automation backup billing budget calendar campaign chat compliance '
+    'contact contract dashboard data deal document email employee encryption expense export forecast form import '
+    'integration inventory invoice lead ledger marketing mobile notification onboarding order payment payroll '
+    'permission pipeline planning portal project quote recruiting report role sales schedule search security '
+    'segment sso storage subscription survey task tax template ticket time tracking vendor workflow workspace'
+).split()
+
+SYLLABLES = ['ba', 'ce', 'di', 'fo', 'gu', 'ka', 'le', 'mi', 'no', 'pu', 'ra', 'se', 'ti', 'vo', 'zu', 'xe']
+
+# Vendors generated per chunk, changing it changes the generated catalogs
+GENERATOR_CHUNK_SIZE = 50000
+
+def build_vocabulary(size):
+    """Returns `size` distinct words: the domain words first, then synthetic ones built from syllables."""
+    words = list(DOMAIN_WORDS[:size])
+    number = 0
+    while len(words) < size:
+        # Base-16 digits of the counter spelled with syllables, at least three syllables long
+        digits, value = [], number
+        for _ in range(3):
+            digits.append(SYLLABLES[value % len(SYLLABLES)])
+            value //= len(SYLLABLES)
+        while value:
+            digits.append(SYLLABLES[value % len(SYLLABLES)])
+            value //= len(SYLLABLES)
+        words.append(''.join(digits))
+        number += 1
+    return words
+
+def iter_catalog_chunks(n_vendors, seed=0, feature_skew=1.6, max_features=60, vocabulary_size=5000,
+                        description_words=12, invalid_fraction=0.01):
+    """
+    Generates a G2-style vendor catalog in chunks of GENERATOR_CHUNK_SIZE vendors, the same rows for the same arguments.
+
+    Args:
+        n_vendors (int): Number of vendors.
+        seed (int, optional): Seed of the generator. Defaults to 0.
+        feature_skew (float, optional): Zipf exponent (> 1) of the number of features per vendor, lower
+            values give a heavier tail of vendors with many features. Defaults to 1.6.
+        max_features (int, optional): Upper bound of the features per vendor. Defaults to 60.
+        vocabulary_size (int, optional): Number of distinct words, drawn with Zipf-like frequencies. Defaults to 5000.
+        description_words (int, optional): Mean number of words per feature description. Defaults to 12.
+        invalid_fraction (float, optional): Share of vendors whose 'Features' is empty or malformed JSON,
+            as in the real dataset. Defaults to 0.01.
+
+    Yields:
+        pd.DataFrame: The next vendors with 'product_name', 'rating', 'seller', 'main_category' and 'Features'
+        (the nested JSON list of {'Category', 'features': [{'name', 'description'}]}).
+    """
+    chunk_size = GENERATOR_CHUNK_SIZE
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(build_vocabulary(vocabulary_size), dtype=object)
+    word_weights = 1.0 / np.arange(1, vocabulary_size + 1)
+    word_weights /= word_weights.sum()
+    category_weights = 1.0 / np.arange(1, len(MAIN_CATEGORIES) + 1)
+    category_weights /= category_weights.sum()
+    n_sellers = max(n_vendors // 5, 1)
+
+    for start in range(0, n_vendors, chunk_size):
+        size = min(chunk_size, n_vendors - start)
+        main_categories = rng.choice(len(MAIN_CATEGORIES), size=size, p=category_weights)
+        ratings = np.round(rng.uniform(1, 5, size=size) * 2) / 2
+        ratings[rng.random(size) < 0.1] = np.nan
+        sellers = rng.integers(0, n_sellers, size=size)
+        feature_counts = np.minimum(rng.zipf(feature_skew, size=size), max_features)
+        invalid = rng.random(size) < invalid_fraction
+
+        # Words of every feature of the chunk are drawn at once and split per feature
+        total_features = int(feature_counts.sum())
+        name_words = vocabulary[rng.choice(vocabulary_size, size=(total_features, 2), p=word_weights)]
+        word_counts = rng.poisson(description_words - 1, size=total_features) + 1
+        words = vocabulary[rng.choice(vocabulary_size, size=int(word_counts.sum()), p=word_weights)]
+        word_offsets = np.concatenate([[0], np.cumsum(word_counts)])
+        groups = rng.integers(0, len(FEATURE_CATEGORIES), size=total_features)
+
+        features = []
+        feature = 0
+        for vendor in range(size):
+            if invalid[vendor]:
+                features.append('' if rng.random() < 0.5 else '[{"Category": "Core", "features": [')
+                feature += feature_counts[vendor]
+                continue
+            by_group = {}
+            for _ in range(feature_counts[vendor]):
+                by_group.setdefault(FEATURE_CATEGORIES[groups[feature]], []).append({
+                    'name': f"{name_words[feature, 0].title()} {name_words[feature, 1]}",
+                    'description': ' '.join(words[word_offsets[feature]:word_offsets[feature + 1]]),
+                })
+                feature += 1
+            features.append(json.dumps([{'Category': group, 'features': group_features}
+                                        for group, group_features in by_group.items()]))
+
+        yield pd.DataFrame({
+            'product_name': [f"Product {start + vendor:07d}" for vendor in range(size)],
+            'rating': ratings,
+            'seller': [f"Seller {seller}" for seller in sellers],
+            'main_category': [MAIN_CATEGORIES[category] for category in main_categories],
+            'Features': features,
+        })
+
+def generate_catalog(n_vendors, seed=0, **kwargs):
+    """
+    Generates a G2-style vendor catalog in memory.
+
+    Args:
+        n_vendors (int): Number of vendors.
+        seed (int, optional): Seed of the generator. Defaults to 0.
+        **kwargs: Shape of the catalog, see `iter_catalog_chunks`.
+
+    Returns:
+        pd.DataFrame: The catalog, indexed by vendor id.
+    """
+    chunks = list(iter_catalog_chunks(n_vendors, seed, **kwargs))
+    if not chunks:
+        return pd.DataFrame(columns=['product_name', 'rating', 'seller', 'main_category', 'Features'])
+    return pd.concat(chunks, ignore_index=True)
+
+def write_catalog(output_path, n_vendors, seed=0, **kwargs):
+    """
+    Writes a G2-style vendor catalog to a CSV file chunk by chunk, so large catalogs never live in memory.
+
+    Args:
+        output_path (str): Path of the CSV file, overwritten.
+        n_vendors (int): Number of vendors.
+        seed (int, optional): Seed of the generator. Defaults to 0.
+        **kwargs: Shape of the catalog, see `iter_catalog_chunks`.
+
+    Returns:
+        str: The CSV file path.
+    """
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp_path = output_path + '.tmp'
+    header = True
+    with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+        for chunk in iter_catalog_chunks(n_vendors, seed, **kwargs):
+            chunk.to_csv(file, index=False, header=header)
+            header = False
+        if header:
+            file.write('product_name,rating,seller,main_category,Features\n')
+    os.replace(temp_path, output_path)
+    return output_path
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Generate a synthetic G2-style vendor catalog CSV.')
+    parser.add_argument('output', help='Path of the CSV file to write')
+    parser.add_argument('--vendors', type=int, default=1000, help='Number of vendors')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generator')
+    parser.add_argument('--feature-skew', type=float, default=1.6,
+                        help='Zipf exponent of the features per vendor, lower is more skewed')
+    parser.add_argument('--max-features', type=int, default=60, help='Upper bound of the features per vendor')
+    args = parser.parse_args()
+
+    write_catalog(args.output, args.vendors, args.seed, feature_skew=args.feature_skew, max_features=args.max_features)
+    print(f"Wrote {args.vendors} vendors to {args.output}")
@@ -1,38 +1,92 @@
 import pandas as pd
+import numpy as np
 import re
+import threading
+from collections import OrderedDict
 import nltk
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer, PorterStemmer
 
-def load_nltk_data():
+# Special characters (non-alphanumeric characters) removed by preprocess_text
+_SPECIAL_CHARACTERS = re.compile(r'[^a-zA-Z0-9\s]')
+
+# Bounded LRU cache of word -> lemmatized and stemmed word, shared by indexing and query paths.
+# Catalog vocabulary is small and repetitive, so most words are normalized only once per process.
+TOKEN_CACHE_SIZE = 100000
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_cache_stats = {'hits': 0, 'misses': 0}
+
+# NLTK resources used by text preprocessing and where nltk.data.find looks for them.
+# Tokenization is a plain split, so the punkt tokenizers are not needed.
+NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+}
+_nltk_ready = False
+_nltk_lock = threading.Lock()
+_text_resources = None
+_text_resources_lock = threading.Lock()
+
+def load_nltk_data(offline=False):
     """
-    Downloads necessary NLTK datasets for text preprocessing, including:
-    - 'punkt' for tokenization
-    - 'punkt_tab' (which seems to be unnecessary here, can be removed)
+    Makes sure the NLTK datasets needed for text preprocessing are available, once per process:
     - 'stopwords' for removing common words from text
     - 'wordnet' for lemmatization
 
-    This function is necessary to prepare the NLTK resources before text processing.
+    Resources already present locally are not downloaded again. Once they are available, the
+    lemmatizer, stemmer and stopwords are loaded and WordNet is warmed up, so the first text
+    processed doesn't pay for the lazy corpus load. Later calls return immediately.
+
+    Args:
+        offline (bool, optional): Only verify the local NLTK data, never download. Defaults to False.
+
+    Raises:
+        LookupError: If `offline` is set and some resources are missing locally.
     """
-    nltk.download('punkt')
-    nltk.download('punkt_tab')  # Note: This download may not be required
-    nltk.download('stopwords')
-    nltk.download('wordnet')
+    global _nltk_ready
+    if _nltk_ready:
+        return
+
+    with _nltk_lock:
+        if _nltk_ready:
+            return
+
+        missing = []
+        for name, resource_path in NLTK_RESOURCES.items():
+            try:
+                nltk.data.find(resource_path)
+            except LookupError:
+                missing.append(name)
+
+        if missing and offline:
+            raise LookupError(f"Missing NLTK data {missing}, download them with nltk.download() or disable offline mode")
+        for name in missing:
+            nltk.download(name, quiet=True)
+
+        # Warm up WordNet, it is only read from disk on first use
+        lemmatizer, _, _ = load_stemmer_lemmatizer_stopwords()
+        lemmatizer.lemmatize('warmup')
+        _nltk_ready = True
 
 def load_stemmer_lemmatizer_stopwords():
     """
-    Loads and returns instances of the NLTK lemmatizer, stemmer, and stopwords set.
+    Returns the process-wide instances of the NLTK lemmatizer, stemmer, and stopwords set.
+
+    They are created on first call and shared afterwards.
 
     Returns:
         tuple: Contains:
             - lemmatizer (WordNetLemmatizer): NLTK lemmatizer for word normalization.
             - stemmer (PorterStemmer): NLTK Porter stemmer for word stemming.
-            - stop_words (set): Set of common English stopwords from NLTK.
+            - stop_words (frozenset): Set of common English stopwords from NLTK.
     """
-    lemmatizer = WordNetLemmatizer()
-    stemmer = PorterStemmer()
-    stop_words = set(stopwords.words('english'))
-    return lemmatizer, stemmer, stop_words
+    global _text_resources
+    if _text_resources is None:
+        with _text_resources_lock:
+            if _text_resources is None:
+                _text_resources = (WordNetLemmatizer(), PorterStemmer(), frozenset(stopwords.words('english')))
+    return _text_resources
 
 def load_data(file_path):
     """
@@ -69,23 +123,81 @@ def preprocess_text(stemmer, lemmatizer, stop_words, text):
     text = text.lower()
 
     # Remove special characters (non-alphanumeric characters)
-    text = re.sub(r'[^a-zA-Z0-9\s]', '', text)
+    text = _SPECIAL_CHARACTERS.sub('', text)
 
     # Tokenization (split the text into words)
     words = text.split()
 
     # Remove stopwords and apply stemming and lemmatization
-    processed_words = []
-    for word in words:
-        if word not in stop_words:
-            # Lemmatize and stem
-            lemmatized_word = lemmatizer.lemmatize(word)
-            stemmed_word = stemmer.stem(lemmatized_word)
-            processed_words.append(stemmed_word)
+    processed_words = [normalize_token(stemmer, lemmatizer, word) for word in words if word not in stop_words]
 
     # Join the processed words back into a string
     return ' '.join(processed_words)
 
+def preprocess_texts(stemmer, lemmatizer, stop_words, texts):
+    """
+    Preprocesses a list of texts in one call, see `preprocess_text`.
+
+    Args:
+        stemmer (PorterStemmer): The stemmer to apply to each word.
+        lemmatizer (WordNetLemmatizer): The lemmatizer to apply to each word.
+        stop_words (set): Set of stopwords to be removed from the texts.
+        texts (iterable): The input texts to be processed.
+
+    Returns:
+        list: The processed texts, in the same order as `texts`.
+    """
+    return [preprocess_text(stemmer, lemmatizer, stop_words, text) for text in texts]
+
+def normalize_token(stemmer, lemmatizer, word):
+    """
+    Lemmatizes and then stems a single word, memoized in a bounded, thread-safe LRU cache.
+
+    The cache is keyed by the word only, so it assumes every caller passes the same kind of
+    stemmer and lemmatizer (the NLTK ones from `load_stemmer_lemmatizer_stopwords`).
+
+    Args:
+        stemmer (PorterStemmer): The stemmer to apply to the word.
+        lemmatizer (WordNetLemmatizer): The lemmatizer to apply to the word.
+        word (str): Lowercased word to normalize.
+
+    Returns:
+        str: The lemmatized and stemmed word.
+    """
+    with _token_cache_lock:
+        normalized_word = _token_cache.get(word)
+        if normalized_word is not None:
+            _token_cache.move_to_end(word)
+            _token_cache_stats['hits'] += 1
+            return normalized_word
+        _token_cache_stats['misses'] += 1
+
+    # Lemmatize and stem outside the lock, the worst case is two threads computing the same word
+    normalized_word = stemmer.stem(lemmatizer.lemmatize(word))
+
+    with _token_cache_lock:
+        _token_cache[word] = normalized_word
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return normalized_word
+
+def get_token_cache_stats():
+    """
+    Returns the hit/miss counters and current size of the token normalization cache.
+
+    Returns:
+        dict: 'hits', 'misses', 'size' and 'max_size' of the cache.
+    """
+    with _token_cache_lock:
+        return {**_token_cache_stats, 'size': len(_token_cache), 'max_size': TOKEN_CACHE_SIZE}
+
+def clear_token_cache():
+    """Empties the token normalization cache and resets its counters."""
+    with _token_cache_lock:
+        _token_cache.clear()
+        _token_cache_stats['hits'] = 0
+        _token_cache_stats['misses'] = 0
+
 def clean_json_for_csv(json_data):
     """
     Cleans up JSON data by removing newline and carriage return characters to ensure proper CSV formatting.
@@ -122,3 +234,21 @@ def get_query(software_category, capabilities):
         query = software_category
     
     return query
+
+def concatenate_ranges(starts, counts):
+    """
+    Returns the concatenation of `range(start, start + count)` for every start/count pair, as one array.
+
+    Args:
+        starts (array-like): First value of every range.
+        counts (array-like): Length of every range.
+
+    Returns:
+        np.ndarray: The concatenated ranges (int64).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    total = counts.sum()
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    ends = np.cumsum(counts)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - (ends - counts), counts) + np.arange(total)
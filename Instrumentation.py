@@ -0,0 +1,235 @@
+import os
+import io
+import time
+import uuid
+import random
+import cProfile
+import pstats
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Set VENDOR_METRICS_ENABLED=0 to turn every timer and counter into a no-op
+METRICS_ENABLED = os.environ.get('VENDOR_METRICS_ENABLED', '1') == '1'
+
+# Fraction of traced requests run under cProfile, 0 disables profiling
+PROFILE_SAMPLE_RATE = float(os.environ.get('VENDOR_PROFILE_SAMPLE_RATE', '0'))
+
+# Directory the profiles are written to as <trace id>.prof, they are printed when it isn't set
+PROFILE_OUTPUT_DIR = os.environ.get('VENDOR_PROFILE_DIR') or None
+
+# Number of functions printed per profile
+PROFILE_PRINT_LIMIT = 25
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Pipeline stages timed with `stage_timer`, listed first in the metrics output
+STAGES = ('load_data', 'preprocess', 'vectorize', 'score', 'rerank', 'filter', 'rank', 'serialize')
+
+METRICS_PREFIX = 'vendor_qualification'
+
+# Process-wide metrics, updated under _metrics_lock
+_metrics_lock = threading.Lock()
+_stage_histograms = {}
+_counters = {}
+
+# Trace id of the request being handled by the current thread or task
+_trace_id = contextvars.ContextVar('vendor_qualification_trace_id', default=None)
+
+class _NullTimer:
+    """Context manager doing nothing, returned by `stage_timer` when metrics are disabled."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_timer = _NullTimer()
+
+class _StageTimer:
+    """Context manager recording the wall time of a stage in its histogram."""
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe_stage(self.stage, time.perf_counter() - self.started)
+        return False
+
+def stage_timer(stage):
+    """
+    Times a pipeline stage: `with stage_timer('score'): ...`.
+
+    Args:
+        stage (str): Name of the stage, one of STAGES for the qualification pipeline.
+
+    Returns:
+        A context manager recording the duration of its block, a shared no-op when metrics are disabled.
+    """
+    return _StageTimer(stage) if METRICS_ENABLED else _null_timer
+
+def observe_stage(stage, seconds):
+    """Records one duration (in seconds) in the latency histogram of `stage`."""
+    if not METRICS_ENABLED:
+        return
+    with _metrics_lock:
+        histogram = _stage_histograms.get(stage)
+        if histogram is None:
+            histogram = _stage_histograms[stage] = {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+        for position, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][position] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+def increment_counter(name, value=1):
+    """
+    Adds `value` to a counter, e.g. 'vendors_scanned', 'features_scored' or 'cache_hits'.
+
+    Counters are exposed as <METRICS_PREFIX>_<name>_total.
+    """
+    if not METRICS_ENABLED:
+        return
+    with _metrics_lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def get_trace_id():
+    """Returns the trace id of the current request, None outside of a traced request."""
+    return _trace_id.get()
+
+def start_trace(trace_id=None, profile=None):
+    """
+    Starts tracing a request: assigns its trace id and, for a sampled fraction of requests, starts cProfile.
+
+    Args:
+        trace_id (str, optional): Id propagated by the caller (e.g. an X-Request-ID header). Defaults to a new id.
+        profile (bool, optional): Force (or prevent) profiling this request. Defaults to sampling
+            PROFILE_SAMPLE_RATE of the requests.
+
+    Returns:
+        dict: The trace, to pass to `finish_trace`, containing 'trace_id', 'started', 'token' and 'profiler'.
+    """
+    trace_id = trace_id or uuid.uuid4().hex
+    if profile is None:
+        profile = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler is already active on this thread
+            print(f"Error profiling request {trace_id}: {e}")
+            profiler = None
+
+    return {
+        'trace_id': trace_id,
+        'started': time.perf_counter(),
+        'token': _trace_id.set(trace_id),
+        'profiler': profiler,
+    }
+
+def finish_trace(trace):
+    """
+    Ends a trace started with `start_trace`: records the request and saves its profile if it was profiled.
+
+    Returns:
+        float: Duration of the request in seconds.
+    """
+    seconds = time.perf_counter() - trace['started']
+    profiler = trace['profiler']
+    if profiler is not None:
+        profiler.disable()
+        save_profile(profiler, trace['trace_id'])
+        increment_counter('profiled_requests')
+
+    increment_counter('requests')
+    observe_stage('request', seconds)
+    _trace_id.reset(trace['token'])
+    return seconds
+
+@contextmanager
+def trace_request(trace_id=None, profile=None):
+    """
+    Traces the block as one request (see `start_trace`), yielding its trace id.
+    """
+    trace = start_trace(trace_id, profile)
+    try:
+        yield trace['trace_id']
+    finally:
+        finish_trace(trace)
+
+def save_profile(profiler, trace_id):
+    """Writes a request profile to PROFILE_OUTPUT_DIR, or prints its most expensive functions."""
+    if PROFILE_OUTPUT_DIR:
+        os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+        profiler.dump_stats(os.path.join(PROFILE_OUTPUT_DIR, f"{trace_id}.prof"))
+        return
+
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(PROFILE_PRINT_LIMIT)
+    print(f"Profile of request {trace_id}:\n{output.getvalue()}")
+
+def get_metrics_snapshot():
+    """
+    Returns a copy of the metrics.
+
+    Returns:
+        dict: Contains:
+            - 'stages': Stage -> {'buckets': counts per LATENCY_BUCKETS bucket (not cumulative), 'count', 'sum'}.
+            - 'counters': Counter name -> value.
+    """
+    with _metrics_lock:
+        return {
+            'stages': {stage: {'buckets': list(histogram['buckets']), 'count': histogram['count'],
+                               'sum': histogram['sum']}
+                       for stage, histogram in _stage_histograms.items()},
+            'counters': dict(_counters),
+        }
+
+def reset_metrics():
+    """Clears every histogram and counter."""
+    with _metrics_lock:
+        _stage_histograms.clear()
+        _counters.clear()
+
+def render_prometheus_metrics():
+    """
+    Renders the metrics in the Prometheus text exposition format (version 0.0.4).
+
+    Returns:
+        str: The metrics, one histogram with a 'stage' label for the stage latencies and one metric per counter.
+    """
+    snapshot = get_metrics_snapshot()
+    stages = snapshot['stages']
+    counters = snapshot['counters']
+
+    lines = []
+    histogram_name = f"{METRICS_PREFIX}_stage_seconds"
+    lines.append(f"# HELP {histogram_name} Wall time spent per pipeline stage.")
+    lines.append(f"# TYPE {histogram_name} histogram")
+    ordered = [stage for stage in STAGES if stage in stages] + sorted(stage for stage in stages if stage not in STAGES)
+    for stage in ordered:
+        histogram = stages[stage]
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += count
+            lines.append(f'{histogram_name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+        lines.append(f'{histogram_name}_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'{histogram_name}_sum{{stage="{stage}"}} {histogram["sum"]:.9g}')
+        lines.append(f'{histogram_name}_count{{stage="{stage}"}} {histogram["count"]}')
+
+    for name in sorted(counters):
+        counter_name = f"{METRICS_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {counter_name} counter")
+        lines.append(f"{counter_name} {counters[name]}")
+
+    return '\n'.join(lines) + '\n'
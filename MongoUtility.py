@@ -1,56 +1,310 @@
-from mongodbConnectio import get_mongo_client, get_db, get_collection
+from mongodbConnectio import get_pooled_client, get_db, get_collection
+from pymongo import InsertOne, UpdateOne
+from bson import Binary
+from sklearn.feature_extraction.text import CountVectorizer
+import numpy as np
+import scipy.sparse as sp
 import pandas as pd
 import json
+import os
+from Vectorization.VectorStore import as_vector_matrix, as_vector_array, encode_vector_block, decode_vector_block,\
+      get_vendor_vectors
 
-def vectorize_data_mongo(df_tfidf):
-    mongo_uri = "mongodb://localhost:27017/"
-    collection_name = "vectorsforg2"
-    db_name = "vectorsforg2db"
-
-    # Get MongoDB connection
-    client = get_mongo_client(mongo_uri)
-    db = get_db(client, db_name)
-    collection = get_collection(db, collection_name)
-    
-    if collection:
-        # Convert DataFrame to dictionary format for MongoDB insertion
-        data_dict = df_tfidf.to_dict(orient='records')  # Convert each row to a dictionary
-        
-        # Insert the data into MongoDB
-        collection.insert_many(data_dict)  # Insert all records
-        
-        print(f"Inserted {len(data_dict)} records into MongoDB collection {collection_name}")
-
-        # Close MongoDB connection
-        client.close()
+MONGO_URI = os.environ.get('MONGO_URI', "mongodb://localhost:27017/")
+DB_NAME = "vectorsforg2db"
+COLLECTION_NAME = "vectorsforg2"
+
+# Documents per bulk write request and per cursor batch
+MONGO_BATCH_SIZE = 1000
+
+# BSON binary subtype (user-defined range) of the vector blocks of `VectorStore.encode_vector_block`
+VECTOR_BLOCK_SUBTYPE = 0x80
+
+def get_vectors_collection():
+    """Returns the vectors collection through the shared, pooled MongoDB client (None if unavailable)."""
+    client = get_pooled_client(MONGO_URI)
+    db = get_db(client, DB_NAME)
+    return get_collection(db, COLLECTION_NAME)
+
+def encode_vector(values):
+    """Encodes a vector as raw float32 bytes for storage in MongoDB."""
+    return Binary(np.ascontiguousarray(values, dtype=np.float32).tobytes())
+
+def decode_vector(data):
+    """Decodes a vector stored by `encode_vector`, without copying the bytes."""
+    return np.frombuffer(data, dtype=np.float32)
+
+def encode_vectors(matrix):
+    """Encodes vectors (one per row) as a binary vector block for storage in MongoDB."""
+    return Binary(encode_vector_block(matrix), VECTOR_BLOCK_SUBTYPE)
+
+def bulk_write_in_batches(collection, operations, batch_size=MONGO_BATCH_SIZE, ordered=False):
+    """
+    Sends write operations to MongoDB in chunks instead of one unbounded request.
+
+    Args:
+        collection (Collection): The collection to write to.
+        operations (iterable): pymongo write operations (InsertOne, UpdateOne, ...), may be a generator.
+        batch_size (int, optional): Number of operations per bulk write. Defaults to MONGO_BATCH_SIZE.
+        ordered (bool, optional): Stop at the first failing operation of a batch instead of applying
+            the others. Defaults to False.
+
+    Returns:
+        int: Number of operations sent.
+    """
+    total = 0
+    batch = []
+    for operation in operations:
+        batch.append(operation)
+        if len(batch) >= batch_size:
+            collection.bulk_write(batch, ordered=ordered)
+            total += len(batch)
+            batch = []
+    if batch:
+        collection.bulk_write(batch, ordered=ordered)
+        total += len(batch)
+    return total
+
+def _encode_vectors_field(vectors):
+    """
+    Converts the 'vectors' column of `generate_tfidf_per_row_withSave` (float32 arrays, or JSON text read
+    back from its CSV output) to binary vectors per feature.
+    """
+    if isinstance(vectors, str):
+        vectors = json.loads(vectors)
+    if not isinstance(vectors, dict):
+        return None
+    return {name: encode_vector(as_vector_array(vector)) if vector is not None else None
+            for name, vector in vectors.items()}
+
+def _decode_field(field, value):
+    """Turns a stored field back into its Python value: ids to strings, JSON text parsed, binary vectors decoded."""
+    if field == '_id':
+        return str(value)  # Convert ObjectId to string
+
+    if field in ['Features', 'vectors', 'vectorizer_paths'] and isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except Exception as e:
+            print(f"Failed to parse {field}: {e}")
+            return value
+
+    if field == 'vectors' and isinstance(value, bytes):
+        return decode_vector_block(value)
+
+    if field == 'vectors' and isinstance(value, dict):
+        decoded = {}
+        for name, vector in value.items():
+            if isinstance(vector, bytes):
+                vector = decode_vector(vector)
+            elif isinstance(vector, dict) and isinstance(vector.get('weights'), bytes):
+                vector = {'terms': vector['terms'], 'weights': decode_vector(vector['weights'])}
+            decoded[name] = vector
+        return decoded
+    return value
+
+def vectorize_data_mongo(df_tfidf, batch_size=MONGO_BATCH_SIZE, ordered=False):
+    """
+    Inserts vectorized vendor records into MongoDB in chunked bulk writes, with the feature
+    vectors stored as binary float32 arrays.
+
+    Args:
+        df_tfidf (pd.DataFrame): Vendor records, e.g. from `generate_tfidf_per_row_withSave`.
+        batch_size (int, optional): Number of records per bulk write. Defaults to MONGO_BATCH_SIZE.
+        ordered (bool, optional): Stop a batch at the first failing insert. Defaults to False.
+    """
+    collection = get_vectors_collection()
+
+    if collection is not None:
+        columns = list(df_tfidf.columns)
+
+        def insert_operations():
+            # Build one record at a time instead of converting the whole DataFrame up front
+            for values in df_tfidf.itertuples(index=False, name=None):
+                record = dict(zip(columns, values))
+                if 'vectors' in record:
+                    record['vectors'] = _encode_vectors_field(record['vectors'])
+                yield InsertOne(record)
+
+        inserted = bulk_write_in_batches(collection, insert_operations(), batch_size, ordered)
+
+        print(f"Inserted {inserted} records into MongoDB collection {COLLECTION_NAME}")
     else:
         print("Error: Could not establish MongoDB connection.")
 
 
-def fetch_data_from_mongodb(query={}):
-    # Connect to MongoDB
-    mongo_uri = "mongodb://localhost:27017/"
-    collection_name = "vectorsforg2"
-    db_name = "vectorsforg2db"
-    client = get_mongo_client(mongo_uri)
-    db = get_db(client, db_name)
-    collection = get_collection(db, collection_name)
+def fetch_data_from_mongodb(query=None, projection=None, batch_size=MONGO_BATCH_SIZE):
+    """
+    Reads documents from MongoDB in cursor batches, column by column, into a DataFrame.
+
+    Args:
+        query (dict, optional): MongoDB filter. Defaults to all documents.
+        projection (dict or list, optional): Fields to return, only these are transferred. Defaults to all fields.
+        batch_size (int, optional): Number of documents per cursor batch. Defaults to MONGO_BATCH_SIZE.
 
-    # Fetch documents
-    cursor = collection.find(query)
+    Returns:
+        pd.DataFrame: One row per document, with JSON text parsed, binary vectors decoded to NumPy arrays
+            and vector blocks to CSR matrices.
+    """
+    collection = get_vectors_collection()
+    if collection is None:
+        print("Error: Could not establish MongoDB connection.")
+        return pd.DataFrame()
+
+    cursor = collection.find(query or {}, projection).batch_size(batch_size)
 
-    data = []
+    # Accumulate columns directly, a field missing from a document is None in its column
+    columns = {}
+    count = 0
     for doc in cursor:
-        doc['_id'] = str(doc['_id'])  # Convert ObjectId to string
+        for field, value in doc.items():
+            if field not in columns:
+                columns[field] = [None] * count
+            columns[field].append(_decode_field(field, value))
+        count += 1
+        for values in columns.values():
+            if len(values) < count:
+                values.append(None)
+
+    return pd.DataFrame(columns)
+
+
+def fetch_feature_index_mongodb(query=None, batch_size=MONGO_BATCH_SIZE):
+    """
+    Streams the vendors synced by `sync_vendor_delta_mongo` into a vendor DataFrame and a feature index,
+    without materializing the documents.
+
+    Args:
+        query (dict, optional): Additional MongoDB filter. Tombstoned vendors are always skipped.
+        batch_size (int, optional): Number of documents per cursor batch. Defaults to MONGO_BATCH_SIZE.
+
+    Returns:
+        tuple: Contains:
+            - df (pd.DataFrame): Vendor data, indexed by vendor id (row position).
+            - feature_index (dict): The feature index of the vendors (see `FullDataVectorizer.build_feature_index`).
+    """
+    collection = get_vectors_collection()
+    if collection is None:
+        print("Error: Could not establish MongoDB connection.")
+        return pd.DataFrame(), None
+
+    metadata_fields = ['product_name', 'rating', 'seller', 'main_category', 'Features']
+    projection = {field: 1 for field in metadata_fields + ['vectors', 'feature_names', 'terms']}
+    projection['_id'] = 0
+    cursor = collection.find({**(query or {}), 'deleted': {'$ne': True}}, projection).batch_size(batch_size)
+
+    metadata = {field: [] for field in metadata_fields}
+    vocabulary = {}
+    feature_vendor, feature_names, data, indices, row_lengths = [], [], [], [], []
+    for vendor, doc in enumerate(cursor):
+        for field in metadata_fields:
+            metadata[field].append(doc.get(field))
+        vectors = doc.get('vectors')
+        if isinstance(vectors, bytes):
+            # One vector block per vendor, its columns numbering the vendor's own 'terms'
+            block = decode_vector_block(vectors)
+            term_ids = np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in doc['terms']),
+                                   dtype=np.int64, count=len(doc['terms']))
+            feature_vendor.extend([vendor] * block.shape[0])
+            feature_names.extend(doc['feature_names'])
+            indices.append(term_ids[block.indices])
+            data.append(block.data)
+            row_lengths.append(np.diff(block.indptr))
+            continue
+        # Documents synced by older versions: terms and raw weights per feature
+        for name, vector in (vectors or {}).items():
+            feature_vendor.append(vendor)
+            feature_names.append(name)
+            indices.append(np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in vector['terms']),
+                                       dtype=np.int64, count=len(vector['terms'])))
+            data.append(decode_vector(vector['weights']))
+            row_lengths.append([len(vector['terms'])])
+
+    # Renumber terms in sorted order, as a freshly built index would
+    terms = np.array(sorted(vocabulary), dtype=object)
+    column_map = np.empty(len(vocabulary), dtype=np.int32)
+    column_map[[vocabulary[term] for term in terms]] = np.arange(len(terms), dtype=np.int32)
+    indptr = np.zeros(len(feature_names) + 1, dtype=np.int64)
+    if row_lengths:
+        np.cumsum(np.concatenate(row_lengths), out=indptr[1:])
+    matrix = as_vector_matrix(sp.csr_matrix(
+        (np.concatenate(data) if data else np.empty(0, dtype=np.float32),
+         column_map[np.concatenate(indices)] if indices else np.empty(0, dtype=np.int32), indptr),
+        shape=(len(feature_names), len(terms))))
+
+    df = pd.DataFrame(metadata)
+    feature_vendor = np.asarray(feature_vendor, dtype=np.int64)
+    vendor_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(feature_vendor, minlength=len(df)), out=vendor_offsets[1:])
+
+    feature_index = {
+        'vectorizer': CountVectorizer(vocabulary={term: col for col, term in enumerate(terms)}) if len(terms) else None,
+        'idf': None,
+        'matrix': matrix,
+        'feature_vendor': feature_vendor,
+        'feature_names': feature_names,
+        'vendor_offsets': vendor_offsets,
+    }
+    return df, feature_index
+
+
+def sync_vendor_delta_mongo(df, feature_index, fingerprints, changes, batch_size=MONGO_BATCH_SIZE):
+    """
+    Applies a catalog refresh to MongoDB: upserts the added and changed vendors, keyed by product name,
+    and tombstones the removed ones instead of inserting every record again.
+
+    Args:
+        df (pd.DataFrame): New vendor data, indexed by vendor id (row position).
+        feature_index (dict): Feature index of `df` (see `FullDataVectorizer.build_feature_index`).
+        fingerprints (np.ndarray): Content hash of every vendor of `df`.
+        changes (dict): Vendor keys that were 'added', 'changed' and 'removed'
+            (see `IncrementalIndexer.diff_vendor_fingerprints`).
+        batch_size (int, optional): Number of operations per bulk write. Defaults to MONGO_BATCH_SIZE.
+    """
+    collection = get_vectors_collection()
+
+    if collection is None:
+        print("Error: Could not establish MongoDB connection.")
+        return
+
+    vendor_offsets = feature_index['vendor_offsets']
+    feature_names = feature_index['feature_names']
+    terms = feature_index['vectorizer'].get_feature_names_out() if feature_index['vectorizer'] is not None \
+        else np.empty(0, dtype=object)
+
+    upserted_keys = set(changes['added']) | set(changes['changed'])
+    operations = []
+    for vendor, key in enumerate(df['product_name'].astype(str)):
+        if key not in upserted_keys:
+            continue
+        row = df.iloc[vendor]
+
+        # The vendor's vectors go in one block whose columns number the vendor's own terms,
+        # so they stay valid when the shared vocabulary changes
+        vectors = get_vendor_vectors(feature_index, vendor)
+        vendor_terms, local_columns = np.unique(vectors.indices, return_inverse=True)
+        vectors = sp.csr_matrix((vectors.data, local_columns.ravel(), vectors.indptr),
+                                shape=(vectors.shape[0], len(vendor_terms)))
 
-        # Parse JSON string fields if necessary
-        for field in ['Features', 'vectors', 'vectorizer_paths']:
-            if field in doc and isinstance(doc[field], str):
-                try:
-                    doc[field] = json.loads(doc[field])
-                except Exception as e:
-                    print(f"Failed to parse {field}: {e}")
+        document = {
+            'product_name': key,
+            'rating': None if pd.isna(row['rating']) else float(row['rating']),
+            'seller': row['seller'],
+            'main_category': row['main_category'],
+            'Features': row['Features'],
+            'fingerprint': str(fingerprints[vendor]),
+            'feature_names': [str(name) for name in feature_names[vendor_offsets[vendor]:vendor_offsets[vendor + 1]]],
+            'terms': terms[vendor_terms].tolist(),
+            'vectors': encode_vectors(vectors),
+            'deleted': False,
+        }
+        operations.append(UpdateOne({'product_name': key}, {'$set': document}, upsert=True))
 
-        data.append(doc)
+    for key in changes['removed']:
+        operations.append(UpdateOne({'product_name': key}, {'$set': {'deleted': True}}))
 
-    return pd.DataFrame(data)
+    if operations:
+        collection.create_index('product_name')
+        bulk_write_in_batches(collection, operations, batch_size)
+        print(f"Upserted {len(upserted_keys)} and tombstoned {len(changes['removed'])} records "
+              f"in MongoDB collection {COLLECTION_NAME}")
@@ -1,22 +1,163 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+from collections import Counter
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
 
-def set_prequalified_by_main_category(df, query, threshold=0.3):
+# Minimum category similarity for a vendor to be prequalified
+PREQUALIFICATION_THRESHOLD = 0.3
+
+# Number of distinct queries whose prequalified categories are memoized per model
+PREQUALIFICATION_CACHE_SIZE = 4096
+
+# Same tokenization as the TfidfVectorizer prequalification was defined with
+_analyze_category_text = TfidfVectorizer().build_analyzer()
+
+def tokenize_category_text(text):
+    """Returns the tokens of `text` as seen by the category TF-IDF model, in order."""
+    return _analyze_category_text(text)
+
+def build_category_model(main_categories):
+    """
+    Fits the category TF-IDF model once over the distinct main categories of the catalog.
+
+    Args:
+        main_categories (pd.Series): The 'main_category' of every vendor, indexed by vendor id (row position).
+
+    Returns:
+        dict: The category model, containing:
+            - 'vendor_categories': Row of 'counts' holding every vendor's category.
+            - 'counts': Term counts (CSR, distinct categories x terms) of every distinct category.
+            - 'vocabulary': Term -> column of 'counts'.
+            - 'document_frequency': Number of vendors whose category contains each term.
+            - 'n_vendors': Number of vendors.
+            - 'lookups': Memoized results of `get_prequalified_categories`, guarded by 'lookups_lock'.
+    """
+    # The vectorizer lower-cases, so categories differing only by case share one row
+    codes, categories = pd.factorize(main_categories.astype(object).fillna('').astype(str).str.lower(), sort=True)
+
+    vectorizer = CountVectorizer(analyzer=_analyze_category_text)
+    try:
+        counts = vectorizer.fit_transform(categories).astype(np.float64)
+        vocabulary = vectorizer.vocabulary_
+    except ValueError:
+        # No category has any token
+        counts = sp.csr_matrix((len(categories), 0), dtype=np.float64)
+        vocabulary = {}
+
+    vendors_per_category = np.bincount(codes, minlength=len(categories))
+    document_frequency = (counts > 0).T @ vendors_per_category
+
+    return {
+        'vendor_categories': codes,
+        'counts': sp.csr_matrix(counts),
+        'vocabulary': vocabulary,
+        'document_frequency': np.asarray(document_frequency, dtype=np.float64).ravel(),
+        'n_vendors': len(codes),
+        'lookups': {},
+        'lookups_lock': threading.Lock(),
+    }
+
+def calculate_category_similarities(category_model, query):
+    """
+    Calculates the TF-IDF cosine similarity between a query and every distinct category.
+
+    The scores are those of a TfidfVectorizer fitted on every vendor's category plus the query, as
+    `set_prequalified_by_main_category` used to do on each call: document frequencies are counted
+    once per vendor and only the query's own terms get their frequency adjusted per query.
+
+    Args:
+        category_model (dict): Category model built by `build_category_model`.
+        query (str): The query to compare the categories to.
+
+    Returns:
+        np.ndarray: Similarity of every distinct category (rows of the model's 'counts').
+    """
+    counts = category_model['counts']
+    vocabulary = category_model['vocabulary']
+    document_frequency = category_model['document_frequency']
+    n_documents = category_model['n_vendors'] + 1
+
+    query_terms = Counter(tokenize_category_text(query))
+    columns = np.array([vocabulary[term] for term in query_terms if term in vocabulary], dtype=np.int64)
+    query_counts = np.array([count for term, count in query_terms.items() if term in vocabulary], dtype=np.float64)
+    unseen_counts = np.array([count for term, count in query_terms.items() if term not in vocabulary],
+                             dtype=np.float64)
+
+    # Smoothed IDF, the query is one more document containing its own terms
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    idf[columns] = np.log((1 + n_documents) / (2 + document_frequency[columns])) + 1
+    unseen_idf = np.log((1 + n_documents) / 2) + 1
+
+    category_norms = np.sqrt(counts.power(2) @ idf ** 2)
+    query_weights = query_counts * idf[columns]
+    query_norm = np.sqrt(np.sum(query_weights ** 2) + np.sum((unseen_counts * unseen_idf) ** 2))
+    dots = counts[:, columns] @ (query_weights * idf[columns])
+
+    similarities = np.zeros(counts.shape[0], dtype=np.float64)
+    valid = category_norms > 0
+    if query_norm > 0:
+        similarities[valid] = dots[valid] / (category_norms[valid] * query_norm)
+    return similarities
+
+def get_prequalified_categories(category_model, query, threshold=PREQUALIFICATION_THRESHOLD):
+    """
+    Returns the category similarities of a query and which categories are prequalified, memoized per query.
+
+    Args:
+        category_model (dict): Category model built by `build_category_model`.
+        query (str): The query to compare the categories to.
+        threshold (float, optional): Minimum similarity of a prequalified category. Defaults to 0.3.
+
+    Returns:
+        tuple: Similarity and prequalified flag of every distinct category, shared and must not be modified.
+    """
+    # Term order doesn't change the scores
+    key = (tuple(sorted(tokenize_category_text(query))), threshold)
+    lookups = category_model['lookups']
+    result = lookups.get(key)
+    if result is not None:
+        return result
+
+    similarities = calculate_category_similarities(category_model, query)
+    result = (similarities, similarities >= threshold)
+
+    with category_model['lookups_lock']:
+        if len(lookups) >= PREQUALIFICATION_CACHE_SIZE:
+            lookups.clear()
+        lookups[key] = result
+    return result
+
+def get_prequalified_vendors(category_model, query, threshold=PREQUALIFICATION_THRESHOLD):
+    """
+    Flags the vendors whose main category matches the query, a lookup of their category's flag.
+
+    Args:
+        category_model (dict): Category model built by `build_category_model`.
+        query (str): The query to compare the categories to.
+        threshold (float, optional): Minimum similarity of a prequalified category. Defaults to 0.3.
+
+    Returns:
+        np.ndarray: True for every prequalified vendor, by vendor id.
+    """
+    _, prequalified = get_prequalified_categories(category_model, query, threshold)
+    return prequalified[category_model['vendor_categories']]
+
+def set_prequalified_by_main_category(df, query, threshold=PREQUALIFICATION_THRESHOLD, category_model=None):
     """
     Marks vendors as prequalified if their 'main_category' matches the query
     based on TF-IDF cosine similarity.
+
+    Pass the `category_model` built once for `df` (see `build_category_model`) to avoid fitting it on every call.
     """
-    vectorizer = TfidfVectorizer()
-    combined = df['main_category'].fillna('').tolist() + [query]
-    
-    tfidf_matrix = vectorizer.fit_transform(combined)
-    
-    query_vector = tfidf_matrix[-1]
-    category_vectors = tfidf_matrix[:-1]
-
-    similarities = cosine_similarity(query_vector, category_vectors).flatten()
-    
-    df['main_category_similarity'] = similarities
-    df['prequalified'] = similarities >= threshold  # mark True if above threshold
-    
+    if category_model is None:
+        category_model = build_category_model(df['main_category'].reset_index(drop=True))
+
+    similarities, prequalified = get_prequalified_categories(category_model, query, threshold)
+    codes = category_model['vendor_categories']
+
+    df['main_category_similarity'] = similarities[codes]
+    df['prequalified'] = prequalified[codes]  # mark True if above threshold
+
     return df
@@ -1,3 +1,5 @@
+import numpy as np
+
 def rank_vendors(df, weight_similarity=0.7, weight_rating=0.3):
     """
     Ranks vendors based on weighted average of similarity and rating.
@@ -35,3 +37,49 @@ def rank_vendors(df, weight_similarity=0.7, weight_rating=0.3):
     df_ranked['rank'] = range(1, len(df_ranked) + 1)
 
     return df_ranked
+
+def rank_top_vendors(similarity_scores, ratings, k=10, weight_similarity=0.7, weight_rating=0.3, prequalified=None):
+    """
+    Selects the top k vendors by the same weighted score as `rank_vendors`, without sorting all of them.
+
+    Parameters:
+    - similarity_scores: array of average similarity scores, one per candidate vendor
+    - ratings: array of vendor ratings aligned with `similarity_scores` (missing ratings count as 0)
+    - k: number of top vendors to return (default 10)
+    - weight_similarity: weight for average similarity score (default 0.7)
+    - weight_rating: weight for vendor rating (default 0.3)
+    - prequalified: optional boolean array, prequalified vendors are ranked before all others
+
+    Returns:
+    - Tuple of (positions of the top vendors in the input arrays in rank order, their final scores).
+      Vendors with the same score are ranked by position, so the top k is the first k of any larger top.
+    """
+    similarity_scores = np.asarray(similarity_scores, dtype=np.float64)
+    ratings = np.nan_to_num(np.asarray(ratings, dtype=np.float64))
+    if len(similarity_scores) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    # Normalize both scores to bring them into [0,1] range
+    max_similarity = similarity_scores.max()
+    normalized_similarity = similarity_scores / max_similarity if max_similarity > 0 else np.zeros_like(similarity_scores)
+    max_rating = ratings.max()
+    normalized_rating = ratings / max_rating if max_rating > 0 else np.zeros_like(ratings)
+
+    # Compute final score using weighted sum
+    final_scores = weight_similarity * normalized_similarity + weight_rating * normalized_rating
+
+    # Prequalified vendors first: lift their key above every other vendor's final score
+    order_key = final_scores
+    if prequalified is not None:
+        order_key = final_scores + np.where(prequalified, np.ptp(final_scores) + 1, 0)
+
+    # Partial selection of the k best, then only those are sorted. Every vendor tied with the k-th is kept
+    # before cutting, so ties are broken by position and the top k is always a prefix of the top k + n
+    if k < len(order_key):
+        kth_value = order_key[np.argpartition(-order_key, k - 1)[k - 1]]
+        top = np.flatnonzero(order_key >= kth_value)
+    else:
+        top = np.arange(len(order_key))
+    top = top[np.lexsort((top, -order_key[top]))][:k]
+
+    return top, final_scores[top]
@@ -0,0 +1,291 @@
+import os
+import time
+import threading
+import numpy as np
+from Vectorization.VectorizerUtility import save_array_bundle, read_bundle_manifest
+from SimilarityEvaluation.VectorRetrieval import score_rows
+
+# Transformer used to embed vendors and queries, a hub name or a local (e.g. fine-tuned) checkpoint
+EMBEDDING_MODEL_NAME = os.environ.get('VENDOR_EMBEDDING_MODEL', 'distilbert-base-uncased')
+
+# Same truncation as the BERT ranking notebook, but padding only up to the longest text of a batch
+EMBEDDING_MAX_LENGTH = 128
+EMBEDDING_BATCH_SIZE = 32
+
+# CPU serving: dynamic int8 quantization of the linear layers, and torch intra-op threads (0 keeps torch's default)
+EMBEDDING_QUANTIZE = os.environ.get('VENDOR_EMBEDDING_QUANTIZE', '0') == '1'
+EMBEDDING_THREADS = int(os.environ.get('VENDOR_EMBEDDING_THREADS', '0'))
+
+# Vendors below this cosine similarity with the query are not qualified
+EMBEDDING_SIMILARITY_THRESHOLD = 0.5
+
+EMBEDDING_INDEX_FORMAT_VERSION = 1
+
+# Loaded models by name. torch and transformers are only imported once an embedding scorer is used.
+_models = {}
+_models_lock = threading.Lock()
+
+def load_embedding_model(model_name=None, quantize=None):
+    """
+    Returns the (tokenizer, model) pair used for embeddings, loaded on CPU in eval mode once per process.
+
+    Args:
+        model_name (str, optional): Hub name or local path of the model. Defaults to EMBEDDING_MODEL_NAME.
+        quantize (bool, optional): Quantize the weights of the linear layers to int8, activations are
+            quantized on the fly. Defaults to EMBEDDING_QUANTIZE.
+
+    Returns:
+        tuple: The tokenizer and the transformer model without task head.
+    """
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+    model = _models.get((model_name, quantize))
+    if model is None:
+        with _models_lock:
+            model = _models.get((model_name, quantize))
+            if model is None:
+                import torch
+                from transformers import AutoTokenizer, AutoModel
+                if EMBEDDING_THREADS:
+                    torch.set_num_threads(EMBEDDING_THREADS)
+
+                tokenizer = AutoTokenizer.from_pretrained(model_name)
+                encoder = AutoModel.from_pretrained(model_name)
+                encoder.to('cpu')
+                encoder.eval()
+                if quantize:
+                    from torch.ao.quantization import quantize_dynamic
+                    encoder = quantize_dynamic(encoder, {torch.nn.Linear}, dtype=torch.qint8)
+                model = _models[(model_name, quantize)] = (tokenizer, encoder)
+    return model
+
+def get_vendor_texts(df):
+    """Returns the text embedded for every vendor, built like 'combined_features' in the BERT ranking notebook."""
+    main_categories = df['main_category'].astype(object).fillna('')
+    features = df['Features'].astype(object).fillna('')
+    return [f"Category: {main_category} Features: {feature}" for main_category, feature in zip(main_categories, features)]
+
+def embed_texts(texts, model_name=None, batch_size=None, max_length=None, quantize=None):
+    """
+    Embeds texts with mean pooling over the last hidden states, in length-bucketed batches.
+
+    Texts are tokenized once, sorted by token count and batched in that order, so every batch is
+    padded only up to its own longest text instead of to `max_length`.
+
+    Args:
+        texts (list): The texts to embed.
+        model_name (str, optional): Model to embed with (see `load_embedding_model`).
+        batch_size (int, optional): Texts per forward pass. Defaults to EMBEDDING_BATCH_SIZE.
+        max_length (int, optional): Tokens kept per text. Defaults to EMBEDDING_MAX_LENGTH.
+        quantize (bool, optional): Use the int8 quantized model (see `load_embedding_model`).
+
+    Returns:
+        np.ndarray: L2-normalized embeddings (float32), one row per text in the order of `texts`.
+    """
+    import torch
+
+    tokenizer, model = load_embedding_model(model_name, quantize)
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    max_length = max_length or EMBEDDING_MAX_LENGTH
+
+    encodings = tokenizer(list(texts), truncation=True, max_length=max_length)['input_ids']
+    order = np.argsort([len(input_ids) for input_ids in encodings], kind='stable')
+    embeddings = np.zeros((len(encodings), model.config.hidden_size), dtype=np.float32)
+
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            positions = order[start:start + batch_size]
+            batch = tokenizer.pad({'input_ids': [encodings[position] for position in positions]},
+                                  padding=True, return_tensors='pt')
+            hidden_states = model(input_ids=batch['input_ids'], attention_mask=batch['attention_mask']).last_hidden_state
+
+            # Mean over the real tokens only
+            mask = batch['attention_mask'].unsqueeze(-1).to(hidden_states.dtype)
+            pooled = (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+            embeddings[positions] = pooled.float().numpy()
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1)
+
+def build_embedding_index(df, model_name=None, batch_size=None, dtype=np.float16, quantize=None):
+    """
+    Precomputes the embedding of every vendor, offline.
+
+    Args:
+        df (pd.DataFrame): Vendors with 'main_category' and 'Features' columns, indexed by vendor id (row position).
+        model_name (str, optional): Model to embed with. Defaults to EMBEDDING_MODEL_NAME.
+        batch_size (int, optional): Texts per forward pass. Defaults to EMBEDDING_BATCH_SIZE.
+        dtype (np.dtype, optional): Storage type of the embeddings, np.float16 halves their size. Defaults to np.float16.
+        quantize (bool, optional): Embed with the int8 quantized model. Defaults to EMBEDDING_QUANTIZE.
+
+    Returns:
+        dict: The embedding index, containing:
+            - 'embeddings': L2-normalized vendor embeddings (vendors x hidden size).
+            - 'model_name': Name of the model the embeddings were computed with.
+            - 'quantized': Whether that model was quantized, queries are embedded the same way.
+    """
+    model_name = model_name or EMBEDDING_MODEL_NAME
+    quantize = EMBEDDING_QUANTIZE if quantize is None else quantize
+    embeddings = embed_texts(get_vendor_texts(df), model_name, batch_size, quantize=quantize)
+    return {'embeddings': embeddings.astype(dtype), 'model_name': model_name, 'quantized': quantize}
+
+def save_embedding_index(embedding_index, embedding_path, vendor_names=None, source=None):
+    """
+    Saves an embedding index as a .npy bundle (see `VectorizerUtility.save_array_bundle`).
+
+    Args:
+        embedding_index (dict): Embedding index built by `build_embedding_index`.
+        embedding_path (str): Directory to write the index to.
+        vendor_names (iterable, optional): Product name of every vendor, checked on load.
+        source (dict, optional): Description of the data the index was built from, stored in the manifest as is.
+
+    Returns:
+        str: The index directory path.
+    """
+    arrays = {
+        'embeddings': embedding_index['embeddings'],
+        'vendor_names': np.asarray(list(vendor_names) if vendor_names is not None else [], dtype=str),
+    }
+    manifest = {
+        'format_version': EMBEDDING_INDEX_FORMAT_VERSION,
+        'model_name': embedding_index['model_name'],
+        'quantized': embedding_index['quantized'],
+        'source': source,
+    }
+    return save_array_bundle(embedding_path, arrays, manifest)
+
+def load_embedding_index(embedding_path, mmap=True):
+    """
+    Loads an embedding index saved by `save_embedding_index`.
+
+    Args:
+        embedding_path (str): Directory the index was saved to.
+        mmap (bool, optional): Memory-map the embeddings read-only. Defaults to True.
+
+    Returns:
+        tuple: The embedding index and the product names saved with it.
+
+    Raises:
+        ValueError: If there is no index at `embedding_path` or it was saved in another format version.
+    """
+    manifest = read_bundle_manifest(embedding_path)
+    if manifest is None:
+        raise ValueError(f"No embedding index found at {embedding_path}")
+    if manifest.get('format_version') != EMBEDDING_INDEX_FORMAT_VERSION:
+        raise ValueError(f"Embedding index at {embedding_path} has format version {manifest.get('format_version')}, "
+                         f"expected {EMBEDDING_INDEX_FORMAT_VERSION}")
+
+    mmap_mode = 'r' if mmap else None
+    embeddings = np.load(os.path.join(embedding_path, 'embeddings.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+    vendor_names = np.load(os.path.join(embedding_path, 'vendor_names.npy'), allow_pickle=False)
+    return {'embeddings': embeddings, 'model_name': manifest['model_name'], 'quantized': manifest.get('quantized', False),
+            'source': manifest.get('source')}, vendor_names
+
+def get_embedding_index_path(index_path):
+    """Returns where the embedding index lives next to a feature index directory, None without one."""
+    return index_path.rstrip(os.sep) + '-embeddings' if index_path else None
+
+def load_or_build_embedding_index(df, embedding_path=None, source=None):
+    """
+    Loads the saved embedding index when it was built from the same vendors and data, builds (and saves) it otherwise.
+
+    Args:
+        df (pd.DataFrame): Vendor data, indexed by vendor id (row position).
+        embedding_path (str, optional): Directory of the saved embedding index. Defaults to None (not persisted).
+        source (dict, optional): Fingerprint of the vendor data file (see `get_source_fingerprint`).
+
+    Returns:
+        dict: The embedding index (see `build_embedding_index`).
+    """
+    vendor_names = df['product_name'].astype(str).to_numpy()
+    if embedding_path and read_bundle_manifest(embedding_path) is not None:
+        try:
+            embedding_index, saved_names = load_embedding_index(embedding_path)
+            if embedding_index['model_name'] == EMBEDDING_MODEL_NAME and embedding_index['source'] == source \
+                    and embedding_index['quantized'] == EMBEDDING_QUANTIZE \
+                    and np.array_equal(saved_names, vendor_names):
+                return embedding_index
+        except ValueError as e:
+            print(f"Error loading embedding index from {embedding_path}, rebuilding it: {e}")
+
+    embedding_index = build_embedding_index(df)
+    if embedding_path:
+        save_embedding_index(embedding_index, embedding_path, vendor_names=vendor_names, source=source)
+    return embedding_index
+
+def embed_query(query, embedding_index):
+    """Embeds a query with the model the embedding index was built with, returns an L2-normalized float32 vector."""
+    return embed_texts([query], embedding_index['model_name'], quantize=embedding_index['quantized'])[0]
+
+def calculate_embedding_similarity(query, embedding_index):
+    """
+    Calculates the cosine similarity between a query and every vendor: the query is the only text
+    embedded per call, vendors are scored with one matrix-vector product.
+
+    Args:
+        query (str): The query text (see `CommonProcessingUtility.get_query`).
+        embedding_index (dict): Embedding index built by `build_embedding_index`.
+
+    Returns:
+        np.ndarray: Similarity score (float32) of every vendor.
+    """
+    return score_rows(embedding_index['embeddings'], embed_query(query, embedding_index))
+
+def evaluate_quantization(df, model_name=None, held_out=200, k=10, query_samples=20, seed=0):
+    """
+    Compares the int8 quantized model with the float32 one on a held-out sample of vendors.
+
+    Args:
+        df (pd.DataFrame): Vendors with 'main_category' and 'Features' columns.
+        model_name (str, optional): Model to evaluate. Defaults to EMBEDDING_MODEL_NAME.
+        held_out (int, optional): Number of vendors sampled. Defaults to 200.
+        k (int, optional): Neighbours compared per vendor for the ranking agreement. Defaults to 10.
+        query_samples (int, optional): Single-text calls timed for the request-path latency. Defaults to 20.
+        seed (int, optional): Seed of the vendor sample. Defaults to 0.
+
+    Returns:
+        dict: Contains:
+            - 'float32' and 'int8': 'texts_per_second' when embedding the sample in batches and mean
+              'query_ms' of embedding a single text, as done per request.
+            - 'mean_cosine' and 'min_cosine': Similarity between the float32 and int8 embedding of each vendor.
+            - 'recall_at_k': Share of each vendor's k nearest vendors under float32 also found under int8.
+            - 'vendors' and 'k': Size of the sample and k.
+    """
+    texts = get_vendor_texts(df)
+    rng = np.random.default_rng(seed)
+    sample = [texts[position] for position in np.sort(rng.choice(len(texts), min(held_out, len(texts)), replace=False))]
+
+    report = {'vendors': len(sample), 'k': k}
+    embeddings = {}
+    for name, quantize in (('float32', False), ('int8', True)):
+        # Load (and quantize) outside of the timed sections
+        load_embedding_model(model_name, quantize)
+
+        started = time.perf_counter()
+        embeddings[name] = embed_texts(sample, model_name, quantize=quantize)
+        elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for text in sample[:query_samples]:
+            embed_texts([text], model_name, quantize=quantize)
+        query_ms = 1000 * (time.perf_counter() - started) / max(min(query_samples, len(sample)), 1)
+
+        report[name] = {'texts_per_second': len(sample) / elapsed if elapsed > 0 else float('inf'), 'query_ms': query_ms}
+
+    cosines = np.sum(embeddings['float32'] * embeddings['int8'], axis=1)
+    report['mean_cosine'] = float(cosines.mean()) if len(cosines) else 1.0
+    report['min_cosine'] = float(cosines.min()) if len(cosines) else 1.0
+
+    # Nearest vendors of every sampled vendor among the others, under both models
+    k = min(k, len(sample) - 1)
+    recalls = []
+    if k > 0:
+        neighbours = {}
+        for name, vectors in embeddings.items():
+            similarities = vectors @ vectors.T
+            np.fill_diagonal(similarities, -np.inf)
+            neighbours[name] = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        recalls = [len(np.intersect1d(expected, found)) / k
+                   for expected, found in zip(neighbours['float32'], neighbours['int8'])]
+    report['recall_at_k'] = float(np.mean(recalls)) if recalls else 1.0
+    return report
@@ -1,8 +1,12 @@
-from CommonProcessingUtility import preprocess_text, load_stemmer_lemmatizer_stopwords
+from CommonProcessingUtility import preprocess_text, preprocess_texts, load_stemmer_lemmatizer_stopwords,\
+      concatenate_ranges
 from sklearn.metrics.pairwise import cosine_similarity
 from Vectorization.VectorizerUtility import load_vectorizer
+from Vectorization.VectorStore import as_vector_row, as_postings_matrix
+from Instrumentation import stage_timer, increment_counter
 import json
 import numpy as np
+import scipy.sparse as sp
 
 def calculate_similarity_withMongo(query, df):
     lemmatizer, stemmer, stop_words = load_stemmer_lemmatizer_stopwords()
@@ -28,8 +32,6 @@ def calculate_similarity_withMongo(query, df):
             count = 0
 
             for feature_name, feature_data in feature_vectors.items():
-                print(f"Processing feature '{feature_name}' in row {idx}")
-
                 if feature_data and 'vector' in feature_data:
                     try:
                         vectorizer_path = vectorizer_paths.get(feature_name, None)  # Get the path for the current feature
@@ -43,10 +45,9 @@ def calculate_similarity_withMongo(query, df):
 
                             # Transform the query using the stored vectorizer
                             query_vector = vectorizer.transform([processed_query])
-                            print(f"Query Vector Shape: {query_vector.shape}")
 
-                            # Get stored feature vector and ensure it's in the correct shape
-                            feature_vector = np.array(feature_data['vector']).reshape(1, -1)
+                            # Get stored feature vector as a float32 row
+                            feature_vector = as_vector_row(feature_data['vector'])
 
                             # Check if shapes match before computing similarity
                             if query_vector.shape[1] == feature_vector.shape[1]:
@@ -118,9 +119,7 @@ def calculate_similarity(query, df):
             count = 0
 
             for feature_name, vector in feature_vectors.items():
-                print(f"Processing feature '{feature_name}' in row {idx}")
-
-                if vector:
+                if vector is not None:
                     try:
                         vectorizer = feature_vectorizers.get(feature_name, None)
 
@@ -136,10 +135,9 @@ def calculate_similarity(query, df):
 
                         # Transform the query
                         query_vector = vectorizer.transform([processed_query])
-                        print(f"Query Vector Shape: {query_vector.shape}")
 
-                        # Convert stored feature vector to numpy array
-                        feature_vector = np.array(vector).reshape(1, -1)
+                        # Stored feature vectors are float32 arrays, older ones nested lists
+                        feature_vector = as_vector_row(vector)
 
                         if query_vector.shape[1] == feature_vector.shape[1]:
                             similarity = cosine_similarity(query_vector, feature_vector)[0][0]
@@ -172,6 +170,187 @@ def calculate_similarity(query, df):
 
     return df
 
+def vectorize_queries(queries, feature_index):
+    """
+    Preprocesses queries and vectorizes them against the shared vocabulary of the feature index.
+
+    Args:
+        queries (list): The input query strings.
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+
+    Returns:
+        scipy.sparse.csr_matrix: One row (float32) per query, weighted like the feature rows
+        but not normalized.
+    """
+    with stage_timer('preprocess'):
+        lemmatizer, stemmer, stop_words = load_stemmer_lemmatizer_stopwords()
+        processed_queries = preprocess_texts(stemmer, lemmatizer, stop_words, queries)
+
+    with stage_timer('vectorize'):
+        query_matrix = sp.csr_matrix(feature_index['vectorizer'].transform(processed_queries), dtype=np.float32)
+        if feature_index['idf'] is not None:
+            query_matrix = sp.csr_matrix(query_matrix @ sp.diags(feature_index['idf']))
+    return query_matrix
+
+def get_term_postings(feature_index):
+    """
+    Returns the inverted index of the feature index: for every term, the feature rows containing it.
+
+    The postings are the feature matrix in CSC layout, column `t` lists (in row order) the feature rows
+    holding term `t` and their weights. Saved feature indexes memory-map them (see
+    `VectorizerUtility.load_feature_index`), otherwise they are built on first use and kept in the feature index.
+
+    Args:
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+
+    Returns:
+        scipy.sparse.csc_matrix: The postings (features x terms, float32).
+    """
+    postings = feature_index.get('postings')
+    if postings is None:
+        postings = feature_index['postings'] = as_postings_matrix(feature_index['matrix'])
+    return postings
+
+def _gather_postings(query_vector, feature_index):
+    """Returns the feature row, weight product and squared query weight of every posting of the query terms."""
+    postings = get_term_postings(feature_index)
+    terms = query_vector.indices
+    starts = postings.indptr[terms]
+    counts = postings.indptr[terms + 1] - starts
+    positions = concatenate_ranges(starts, counts)
+
+    query_weights = np.repeat(query_vector.data.astype(np.float64), counts)
+    return postings.indices[positions], postings.data[positions] * query_weights, query_weights ** 2
+
+def _accumulate_postings(rows, products, squares):
+    """Sums the postings of every feature row into its cosine similarity with the query."""
+    feature_rows, inverse = np.unique(rows, return_inverse=True)
+    numerators = np.bincount(inverse, weights=products, minlength=len(feature_rows))
+    query_norms = np.sqrt(np.bincount(inverse, weights=squares, minlength=len(feature_rows)))
+    scores = np.minimum(numerators / query_norms, 1.0).astype(np.float32)
+    return feature_rows.astype(np.int64), scores
+
+def score_query_features(query_vector, feature_index):
+    """
+    Scores one vectorized query against the features sharing at least one term with it, walking
+    only the postings of the query terms.
+
+    Args:
+        query_vector (scipy.sparse.csr_matrix): One row of `vectorize_queries`.
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+
+    Returns:
+        tuple: Contains:
+            - feature_rows (np.ndarray): Sorted feature rows sharing a term with the query.
+            - scores (np.ndarray): Their similarity scores (float32), every other feature scores exactly 0.
+
+    Notes:
+        - As with the per-feature vectorizers, query terms that don't occur in a feature are ignored
+          for that feature, so only the query terms present in a feature count towards the query norm.
+    """
+    return _accumulate_postings(*_gather_postings(query_vector, feature_index))
+
+def calculate_feature_similarity_batch(queries, feature_index):
+    """
+    Calculates the cosine similarity between many queries and the features of the feature index.
+    Only the postings of the query terms are visited, so the cost grows with the number of features
+    matching the queries rather than with the size of the catalog.
+
+    Args:
+        queries (list): The input query strings to compare against the features.
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+
+    Returns:
+        scipy.sparse.csc_matrix: Similarity scores (float32), one row per feature row of the index and
+        one column per query. Features sharing no term with a query have no entry (a score of 0).
+    """
+    n_features = feature_index['matrix'].shape[0]
+    if feature_index['vectorizer'] is None:
+        return sp.csc_matrix((n_features, len(queries)), dtype=np.float32)
+
+    query_matrix = vectorize_queries(queries, feature_index)
+
+    with stage_timer('score'):
+        columns = [score_query_features(query_matrix[position], feature_index) for position in range(len(queries))]
+        indptr = np.zeros(len(queries) + 1, dtype=np.int64)
+        np.cumsum([len(feature_rows) for feature_rows, _ in columns], out=indptr[1:])
+        indices = np.concatenate([feature_rows for feature_rows, _ in columns] or [np.empty(0, dtype=np.int64)])
+        data = np.concatenate([scores for _, scores in columns] or [np.empty(0, dtype=np.float32)])
+    increment_counter('features_scored', len(data))
+
+    return sp.csc_matrix((data, indices, indptr), shape=(n_features, len(queries)))
+
+def get_query_feature_scores(scores, query_position):
+    """
+    Returns the scores of one query (a column of `calculate_feature_similarity_batch`) without densifying it.
+
+    Returns:
+        tuple: The sorted feature rows with a non-zero score and their scores, views into `scores`.
+    """
+    start, end = scores.indptr[query_position], scores.indptr[query_position + 1]
+    return scores.indices[start:end], scores.data[start:end]
+
+def aggregate_candidate_vendor_scores(feature_rows, feature_scores, feature_index, threshold=0.6):
+    """
+    Aggregates sparse feature similarity scores per vendor, only for the vendors owning a scored feature.
+
+    Args:
+        feature_rows (np.ndarray): Sorted feature rows with a non-zero score (see `score_query_features`).
+        feature_scores (np.ndarray): Similarity score of each of `feature_rows`.
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+        threshold (float, optional): The minimum feature similarity for a vendor to count as relevant.
+            Defaults to 0.6.
+
+    Returns:
+        tuple: Arrays with one entry per vendor owning at least one of `feature_rows`:
+            - vendor_ids (np.ndarray): Sorted vendor ids.
+            - avg_scores (np.ndarray): Average similarity score across all the vendor's features.
+            - max_scores (np.ndarray): Highest similarity score among the vendor's features.
+            - has_high_similarity (np.ndarray): True where at least one feature score is >= threshold.
+
+    Notes:
+        - Vendors not returned have an average and highest score of 0.
+    """
+    if len(feature_rows) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return np.empty(0, dtype=np.int64), empty, empty, np.empty(0, dtype=bool)
+
+    # Rows are grouped by vendor, so the scored rows of a vendor are contiguous
+    vendor_offsets = feature_index['vendor_offsets']
+    vendors = np.asarray(feature_index['feature_vendor'])[feature_rows]
+    vendor_ids, starts = np.unique(vendors, return_index=True)
+
+    feature_scores = np.asarray(feature_scores, dtype=np.float64)
+    avg_scores = np.add.reduceat(feature_scores, starts) / (vendor_offsets[vendor_ids + 1] - vendor_offsets[vendor_ids])
+    max_scores = np.maximum.reduceat(feature_scores, starts)
+    return vendor_ids, avg_scores, max_scores, max_scores >= threshold
+
+def get_feature_similarity_scores(feature_rows, feature_scores, feature_index, vendor_ids):
+    """
+    Builds the per-feature similarity score dictionaries for the given vendors only.
+
+    Args:
+        feature_rows (np.ndarray): Sorted feature rows with a non-zero score (see `score_query_features`).
+        feature_scores (np.ndarray): Similarity score of each of `feature_rows`.
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+        vendor_ids (iterable): Vendor ids to build the dictionaries for.
+
+    Returns:
+        list: A dictionary of feature name -> similarity score for every vendor in `vendor_ids`,
+        features that were not scored have a score of 0.
+    """
+    vendor_offsets = feature_index['vendor_offsets']
+    feature_names = feature_index['feature_names']
+
+    similarity_results = []
+    for vendor in vendor_ids:
+        start, end = vendor_offsets[vendor], vendor_offsets[vendor + 1]
+        low, high = np.searchsorted(feature_rows, [start, end])
+        scores = np.zeros(end - start, dtype=np.float32)
+        scores[feature_rows[low:high] - start] = feature_scores[low:high]
+        similarity_results.append(dict(zip(feature_names[start:end], scores.tolist())))
+    return similarity_results
+
 def filter_highly_similar_rows(df, threshold=0.6):
     """
     Filters rows in the DataFrame where at least one feature's similarity score 
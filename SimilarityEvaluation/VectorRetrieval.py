@@ -0,0 +1,314 @@
+import os
+import time
+import numpy as np
+from Vectorization.VectorizerUtility import save_array_bundle, read_bundle_manifest
+
+# Retrieval backends of the dense similarity stage:
+#   - 'exact': brute-force scoring of every allowed vector, the reference.
+#   - 'ivf': inverted file, vectors are clustered with k-means and only the clusters closest to the query are scored.
+#   - 'hnsw': hierarchical navigable small world graph, needs the optional hnswlib package.
+RETRIEVAL_BACKENDS = ('exact', 'ivf', 'hnsw')
+RETRIEVAL_BACKEND = os.environ.get('VENDOR_RETRIEVAL_BACKEND', 'exact')
+
+# IVF: clusters probed per query (more is slower and more accurate), k-means iterations and sample size
+IVF_N_PROBE = 8
+IVF_KMEANS_ITERATIONS = 10
+IVF_KMEANS_SAMPLE = 100000
+
+# HNSW: graph degree and build/search beam widths (a larger ef_search is slower and more accurate)
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 100
+
+# Rows scored at a time by brute force
+RETRIEVAL_SCORING_BLOCK = 65536
+
+RETRIEVAL_INDEX_FORMAT_VERSION = 1
+
+def build_retrieval_index(embeddings, backend=None, n_lists=None, seed=0):
+    """
+    Builds the retrieval index of a dense matrix of L2-normalized vectors, scored by inner product.
+
+    Args:
+        embeddings (np.ndarray): The vectors (rows) to search, e.g. vendor embeddings.
+        backend (str, optional): One of RETRIEVAL_BACKENDS. Defaults to RETRIEVAL_BACKEND.
+        n_lists (int, optional): Number of IVF clusters. Defaults to about the square root of the number of rows.
+        seed (int, optional): Seed of the IVF k-means, the index is reproducible for a given seed. Defaults to 0.
+
+    Returns:
+        dict: The retrieval index, containing:
+            - 'backend': The backend name.
+            - 'size' and 'dim': Shape of `embeddings`.
+            - For 'ivf': 'centroids' (clusters x dim, float32), 'list_offsets' and 'list_ids' (rows of cluster `c`
+              are `list_ids[list_offsets[c]:list_offsets[c + 1]]`, sorted).
+            - For 'hnsw': 'graph', the hnswlib index.
+
+    Raises:
+        ValueError: If `backend` is not one of RETRIEVAL_BACKENDS.
+        ImportError: If `backend` is 'hnsw' and hnswlib isn't installed.
+    """
+    backend = backend or RETRIEVAL_BACKEND
+    if backend not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend '{backend}', expected one of {', '.join(RETRIEVAL_BACKENDS)}")
+
+    size, dim = embeddings.shape
+    retrieval_index = {'backend': backend, 'size': size, 'dim': dim}
+
+    if backend == 'ivf':
+        n_lists = max(1, min(n_lists or int(np.sqrt(size)), size))
+        centroids = _train_centroids(embeddings, n_lists, seed)
+        assignments = _nearest_centroids(embeddings, centroids)
+        list_ids = np.argsort(assignments, kind='stable').astype(np.int64)
+        list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+        retrieval_index.update(centroids=centroids, list_offsets=list_offsets, list_ids=list_ids)
+
+    elif backend == 'hnsw':
+        import hnswlib
+        graph = hnswlib.Index(space='ip', dim=dim)
+        graph.init_index(max_elements=max(size, 1), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M, random_seed=seed)
+        if size:
+            graph.add_items(np.asarray(embeddings, dtype=np.float32), np.arange(size))
+        retrieval_index['graph'] = graph
+
+    return retrieval_index
+
+def _train_centroids(embeddings, n_lists, seed):
+    """Spherical k-means on a sample of the rows, returns L2-normalized centroids (float32)."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(embeddings), max(IVF_KMEANS_SAMPLE, n_lists))
+    sample = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)]
+
+    for _ in range(IVF_KMEANS_ITERATIONS):
+        assignments = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+
+        # Clusters that lost every row are restarted on a random row
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms > 0, norms, 1)
+    return centroids.astype(np.float32)
+
+def _nearest_centroids(embeddings, centroids):
+    """Returns the position of the closest centroid (by inner product) of every row."""
+    assignments = np.empty(len(embeddings), dtype=np.int64)
+    for start in range(0, len(embeddings), RETRIEVAL_SCORING_BLOCK):
+        block = np.asarray(embeddings[start:start + RETRIEVAL_SCORING_BLOCK], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+def score_rows(embeddings, query_embedding, rows=None):
+    """
+    Returns the inner product of the query with the given rows (every row by default), as float32.
+
+    Rows are converted to float32 a block at a time, NumPy has no BLAS for float16.
+    """
+    size = len(embeddings) if rows is None else len(rows)
+    scores = np.empty(size, dtype=np.float32)
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    for start in range(0, size, RETRIEVAL_SCORING_BLOCK):
+        end = min(start + RETRIEVAL_SCORING_BLOCK, size)
+        block = embeddings[start:end] if rows is None else embeddings[rows[start:end]]
+        scores[start:end] = np.asarray(block, dtype=np.float32) @ query_embedding
+    return scores
+
+def _top_k(rows, scores, k):
+    """Returns the k best (rows, scores) by decreasing score."""
+    if k < len(scores):
+        best = np.argpartition(-scores, k - 1)[:k]
+        rows, scores = rows[best], scores[best]
+    order = np.lexsort((rows, -scores))
+    return rows[order], scores[order]
+
+def search_retrieval_index(retrieval_index, embeddings, query_embedding, k, allowed_ids=None, n_probe=None,
+                           ef_search=None):
+    """
+    Finds the k rows with the highest inner product with a query.
+
+    Args:
+        retrieval_index (dict): Retrieval index built by `build_retrieval_index` for `embeddings`.
+        embeddings (np.ndarray): The indexed vectors, candidates are always rescored exactly against them.
+        query_embedding (np.ndarray): L2-normalized query vector.
+        k (int): Number of rows to return.
+        allowed_ids (np.ndarray, optional): Sorted row ids the results must come from, e.g. the vendors of the
+            requested category. Defaults to None (every row).
+        n_probe (int, optional): IVF clusters probed. Defaults to IVF_N_PROBE. More clusters are probed when
+            the allowed rows of the probed ones can't fill k results.
+        ef_search (int, optional): HNSW search beam width. Defaults to HNSW_EF_SEARCH.
+
+    Returns:
+        tuple: The row ids found and their scores (float32), by decreasing score. Approximate backends may
+        miss some of the exact top k.
+    """
+    if allowed_ids is not None:
+        k = min(k, len(allowed_ids))
+    else:
+        k = min(k, retrieval_index['size'])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    backend = retrieval_index['backend']
+    if backend == 'ivf':
+        centroids = retrieval_index['centroids']
+        list_offsets, list_ids = retrieval_index['list_offsets'], retrieval_index['list_ids']
+        cluster_order = np.argsort(-(centroids @ np.asarray(query_embedding, dtype=np.float32)), kind='stable')
+
+        probes = min(n_probe or IVF_N_PROBE, len(centroids))
+        while True:
+            clusters = cluster_order[:probes]
+            rows = np.concatenate([list_ids[list_offsets[cluster]:list_offsets[cluster + 1]] for cluster in clusters])
+            if allowed_ids is not None:
+                rows = rows[np.isin(rows, allowed_ids)]
+            if len(rows) >= k or probes == len(centroids):
+                break
+            probes = min(probes * 2, len(centroids))
+        return _top_k(rows, score_rows(embeddings, query_embedding, rows), k)
+
+    if backend == 'hnsw':
+        graph = retrieval_index['graph']
+        graph.set_ef(max(ef_search or HNSW_EF_SEARCH, k))
+        allowed = None if allowed_ids is None else set(allowed_ids.tolist())
+        try:
+            labels, _ = graph.knn_query(np.asarray(query_embedding, dtype=np.float32), k=k,
+                                        filter=None if allowed is None else allowed.__contains__)
+            rows = labels[0].astype(np.int64)
+            return _top_k(rows, score_rows(embeddings, query_embedding, rows), k)
+        except RuntimeError:
+            # The filtered graph walk couldn't reach k allowed rows, fall back to brute force over them
+            pass
+
+    rows = allowed_ids if allowed_ids is not None else np.arange(retrieval_index['size'])
+    return _top_k(np.asarray(rows, dtype=np.int64), score_rows(embeddings, query_embedding, rows), k)
+
+def save_retrieval_index(retrieval_index, retrieval_path, source=None):
+    """
+    Saves a retrieval index as a .npy bundle (see `VectorizerUtility.save_array_bundle`), HNSW graphs in hnswlib's format.
+
+    Args:
+        retrieval_index (dict): Retrieval index built by `build_retrieval_index`.
+        retrieval_path (str): Directory to write the index to.
+        source (dict, optional): Description of the vectors the index was built from, stored in the manifest as is.
+
+    Returns:
+        str: The index directory path.
+    """
+    arrays = {name: retrieval_index[name] for name in ('centroids', 'list_offsets', 'list_ids') if name in retrieval_index}
+    manifest = {
+        'format_version': RETRIEVAL_INDEX_FORMAT_VERSION,
+        'backend': retrieval_index['backend'],
+        'size': retrieval_index['size'],
+        'dim': retrieval_index['dim'],
+        'source': source,
+    }
+
+    write_files = None
+    if retrieval_index['backend'] == 'hnsw':
+        write_files = lambda path: retrieval_index['graph'].save_index(os.path.join(path, 'hnsw.bin'))
+    return save_array_bundle(retrieval_path, arrays, manifest, write_files=write_files)
+
+def load_retrieval_index(retrieval_path):
+    """
+    Loads a retrieval index saved by `save_retrieval_index`.
+
+    Args:
+        retrieval_path (str): Directory the index was saved to.
+
+    Returns:
+        tuple: The retrieval index and the source description saved with it.
+
+    Raises:
+        ValueError: If there is no index at `retrieval_path` or it was saved in another format version.
+    """
+    manifest = read_bundle_manifest(retrieval_path)
+    if manifest is None:
+        raise ValueError(f"No retrieval index found at {retrieval_path}")
+    if manifest.get('format_version') != RETRIEVAL_INDEX_FORMAT_VERSION:
+        raise ValueError(f"Retrieval index at {retrieval_path} has format version {manifest.get('format_version')}, "
+                         f"expected {RETRIEVAL_INDEX_FORMAT_VERSION}")
+
+    retrieval_index = {'backend': manifest['backend'], 'size': manifest['size'], 'dim': manifest['dim']}
+    if manifest['backend'] == 'ivf':
+        for name in ('centroids', 'list_offsets', 'list_ids'):
+            retrieval_index[name] = np.load(os.path.join(retrieval_path, f"{name}.npy"), allow_pickle=False)
+    elif manifest['backend'] == 'hnsw':
+        import hnswlib
+        graph = hnswlib.Index(space='ip', dim=manifest['dim'])
+        graph.load_index(os.path.join(retrieval_path, 'hnsw.bin'), max_elements=max(manifest['size'], 1))
+        retrieval_index['graph'] = graph
+    return retrieval_index, manifest.get('source')
+
+def get_retrieval_index_path(index_path):
+    """Returns where the retrieval index lives next to a feature index directory, None without one."""
+    return index_path.rstrip(os.sep) + '-retrieval' if index_path else None
+
+def load_or_build_retrieval_index(embeddings, retrieval_path=None, backend=None, source=None):
+    """
+    Loads the saved retrieval index when it was built with the same backend from the same vectors, builds (and saves) it otherwise.
+
+    Args:
+        embeddings (np.ndarray): The vectors to index.
+        retrieval_path (str, optional): Directory of the saved retrieval index. Defaults to None (not persisted).
+        backend (str, optional): One of RETRIEVAL_BACKENDS. Defaults to RETRIEVAL_BACKEND.
+        source (dict, optional): Description of the vectors, e.g. the fingerprint of the data they were built from.
+
+    Returns:
+        dict: The retrieval index (see `build_retrieval_index`).
+    """
+    backend = backend or RETRIEVAL_BACKEND
+    if retrieval_path and read_bundle_manifest(retrieval_path) is not None:
+        try:
+            retrieval_index, saved_source = load_retrieval_index(retrieval_path)
+            if retrieval_index['backend'] == backend and saved_source == source \
+                    and (retrieval_index['size'], retrieval_index['dim']) == embeddings.shape:
+                return retrieval_index
+        except (ValueError, RuntimeError) as e:
+            print(f"Error loading retrieval index from {retrieval_path}, rebuilding it: {e}")
+
+    retrieval_index = build_retrieval_index(embeddings, backend)
+    if retrieval_path and backend != 'exact':
+        save_retrieval_index(retrieval_index, retrieval_path, source=source)
+    return retrieval_index
+
+def evaluate_recall(embeddings, query_embeddings, retrieval_index, k=10, allowed_ids=None, **search_params):
+    """
+    Benchmarks a retrieval index against brute force: recall@k and latency per query.
+
+    Args:
+        embeddings (np.ndarray): The indexed vectors.
+        query_embeddings (np.ndarray): L2-normalized queries, one per row.
+        retrieval_index (dict): Retrieval index to evaluate (see `build_retrieval_index`).
+        k (int, optional): Number of results compared per query. Defaults to 10.
+        allowed_ids (np.ndarray, optional): Sorted row ids to restrict both searches to, e.g. a category.
+        **search_params: Tuning parameters passed to `search_retrieval_index` (n_probe, ef_search).
+
+    Returns:
+        dict: 'recall_at_k' (share of the exact top k found, averaged over queries), 'k', 'queries',
+        and the mean 'exact_ms' and 'approximate_ms' per query.
+    """
+    exact_index = {'backend': 'exact', 'size': len(embeddings), 'dim': embeddings.shape[1]}
+    recalls = []
+    exact_seconds = approximate_seconds = 0.0
+    for query_embedding in query_embeddings:
+        started = time.perf_counter()
+        expected, _ = search_retrieval_index(exact_index, embeddings, query_embedding, k, allowed_ids)
+        exact_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        found, _ = search_retrieval_index(retrieval_index, embeddings, query_embedding, k, allowed_ids, **search_params)
+        approximate_seconds += time.perf_counter() - started
+
+        if len(expected):
+            recalls.append(len(np.intersect1d(expected, found)) / len(expected))
+
+    queries = max(len(query_embeddings), 1)
+    return {
+        'recall_at_k': float(np.mean(recalls)) if recalls else 1.0,
+        'k': k,
+        'queries': len(query_embeddings),
+        'exact_ms': 1000 * exact_seconds / queries,
+        'approximate_ms': 1000 * approximate_seconds / queries,
+    }
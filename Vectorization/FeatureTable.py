@@ -0,0 +1,366 @@
+import os
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import CountVectorizer
+from CommonProcessingUtility import load_nltk_data, preprocess_texts, load_stemmer_lemmatizer_stopwords,\
+      concatenate_ranges
+from Vectorization.VectorizerUtility import save_array_bundle, read_bundle_manifest
+
+# Worker processes used to flatten the catalog, and vendors per worker task
+INDEX_WORKERS = int(os.environ.get('VENDOR_INDEX_WORKERS', '1'))
+INDEX_CHUNK_SIZE = int(os.environ.get('VENDOR_INDEX_CHUNK_SIZE', '500'))
+
+# Version of the on-disk feature table layout, bumped whenever the set or meaning of the arrays changes
+FEATURE_TABLE_FORMAT_VERSION = 1
+
+# Arrays of a saved feature table, each stored as its own .npy file
+FEATURE_TABLE_ARRAYS = ['feature_vendor', 'vendor_offsets', 'category_ids', 'categories', 'name_ids', 'names',
+                        'token_offsets', 'tokens', 'vocabulary', 'invalid_vendors', 'vendor_fingerprints']
+
+# Vendors with invalid 'Features' JSON listed in the ingest report, the others are only counted
+INVALID_FEATURES_REPORT_LIMIT = 10
+
+# Same tokenization as the CountVectorizer of the feature index
+_analyze_feature_text = CountVectorizer().build_analyzer()
+
+def flatten_feature_shard(df):
+    """
+    Parses the 'Features' JSON of a shard of vendors once and tokenizes the text of every feature.
+
+    The text of a feature is its description, name, feature category and the vendor's main category,
+    as in `generate_tfidf_per_row`. Features are keyed by name per vendor, so a repeated name keeps
+    its first position and its last description.
+
+    Args:
+        df (pd.DataFrame): Vendors of the shard, with 'Features' and 'main_category' columns, indexed by vendor id.
+
+    Returns:
+        tuple: Contains:
+            - table (dict): Feature table of the shard (see `build_feature_table`) over its own vocabularies,
+              without 'vendor_offsets'.
+            - errors (list): (vendor id, message) of every vendor with empty or invalid JSON.
+    """
+    lemmatizer, stemmer, stop_words = load_stemmer_lemmatizer_stopwords()
+
+    feature_vendor = []
+    categories = []
+    names = []
+    descriptions = []
+    errors = []
+    for idx, features, main_category in zip(df.index, df['Features'], df['main_category']):
+        column_value_as_string = str(features)
+
+        # Check if the string is empty or just whitespace
+        if not column_value_as_string.strip():
+            errors.append((idx, 'empty JSON'))
+            continue
+
+        try:
+            featuresValues = json.loads(column_value_as_string)
+        except json.JSONDecodeError as e:
+            errors.append((idx, str(e)))
+            continue
+
+        # Valid JSON of another shape, e.g. 'null' or an object, is reported like invalid JSON
+        shape_error = _check_features_shape(featuresValues)
+        if shape_error:
+            errors.append((idx, shape_error))
+            continue
+
+        described = {}
+        for category in featuresValues:
+            for feature in category.get("features", []):
+                name = feature.get('name', '')
+                description = feature.get('description', '')
+                description += ' ' + name + ' ' + category.get('Category', '') + ' ' + str(main_category)
+                described[name] = (category.get('Category', ''), description)
+
+        for name, (category, description) in described.items():
+            if description.strip():
+                feature_vendor.append(idx)
+                categories.append(category)
+                names.append(name)
+                descriptions.append(description)
+
+    processed_descriptions = preprocess_texts(stemmer, lemmatizer, stop_words, descriptions)
+    tokens = [_analyze_feature_text(description) for description in processed_descriptions]
+
+    category_values, category_ids = _intern(categories)
+    name_values, name_ids = _intern(names)
+    vocabulary, token_ids = _intern([token for feature_tokens in tokens for token in feature_tokens])
+    token_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum([len(feature_tokens) for feature_tokens in tokens], out=token_offsets[1:])
+
+    table = {
+        'feature_vendor': np.asarray(feature_vendor, dtype=np.int64),
+        'category_ids': category_ids,
+        'categories': category_values,
+        'name_ids': name_ids,
+        'names': name_values,
+        'token_offsets': token_offsets,
+        'tokens': token_ids,
+        'vocabulary': vocabulary,
+        'invalid_vendors': np.asarray([idx for idx, _ in errors], dtype=np.int64),
+    }
+    return table, errors
+
+def _check_features_shape(features_values):
+    """
+    Returns why parsed 'Features' JSON isn't a list of feature categories, None if it is.
+
+    A category is an object whose optional 'features' is a list of objects, and the 'Category',
+    'name' and 'description' values, when present, are strings.
+    """
+    if not isinstance(features_values, list):
+        return f"expected a list of feature categories, got {type(features_values).__name__}"
+    for category in features_values:
+        if not isinstance(category, dict):
+            return f"expected a feature category object, got {type(category).__name__}"
+        if not isinstance(category.get('Category', ''), str):
+            return "feature category 'Category' is not a string"
+        features = category.get('features', [])
+        if not isinstance(features, list):
+            return f"expected a list of features, got {type(features).__name__}"
+        for feature in features:
+            if not isinstance(feature, dict):
+                return f"expected a feature object, got {type(feature).__name__}"
+            if not isinstance(feature.get('name', ''), str) or not isinstance(feature.get('description', ''), str):
+                return "feature 'name' or 'description' is not a string"
+    return None
+
+def _intern(values):
+    """Returns the sorted distinct `values` and the id (int32) of every value in them."""
+    if not values:
+        return np.empty(0, dtype=str), np.empty(0, dtype=np.int32)
+    unique_values, ids = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return unique_values, ids.astype(np.int32)
+
+def merge_feature_tables(tables, n_vendors):
+    """
+    Merges feature tables of disjoint sets of vendors into one table over shared sorted vocabularies.
+
+    Args:
+        tables (list): Feature tables (see `build_feature_table`), 'vendor_offsets' isn't required.
+        n_vendors (int): Number of vendors of the merged table.
+
+    Returns:
+        dict: The merged feature table, rows grouped by vendor in vendor order. Rows of a vendor
+        keep their order.
+    """
+    # Only the values still referenced are kept, so the result doesn't depend on how the rows were split
+    merged = {}
+    remapped = {}
+    for values_name, ids_name in (('categories', 'category_ids'), ('names', 'name_ids'), ('vocabulary', 'tokens')):
+        used = [np.unique(table[ids_name]) for table in tables]
+        values = np.unique(np.concatenate([np.asarray(table[values_name])[table_used]
+                                           for table, table_used in zip(tables, used)] or [np.empty(0, dtype=str)]))
+        merged[values_name] = values
+        remapped[ids_name] = [np.searchsorted(values, table[values_name]).astype(np.int32)[table[ids_name]]
+                              for table in tables]
+
+    feature_vendor = np.concatenate([table['feature_vendor'] for table in tables] or [np.empty(0, dtype=np.int64)])
+    order = np.argsort(feature_vendor, kind='stable')
+
+    # Token ranges of every row in the concatenated token buffer, reordered like the rows
+    token_counts = np.concatenate([np.diff(table['token_offsets']) for table in tables] or [np.empty(0, dtype=np.int64)])
+    token_bases = np.cumsum([0] + [len(table['tokens']) for table in tables[:-1]])
+    token_starts = np.concatenate([table['token_offsets'][:-1] + base for table, base in zip(tables, token_bases)]
+                                  or [np.empty(0, dtype=np.int64)])
+    tokens = np.concatenate(remapped['tokens'] or [np.empty(0, dtype=np.int32)])
+    tokens = tokens[concatenate_ranges(token_starts[order], token_counts[order])]
+
+    token_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(token_counts[order], out=token_offsets[1:])
+    feature_vendor = feature_vendor[order]
+    vendor_offsets = np.zeros(n_vendors + 1, dtype=np.int64)
+    np.cumsum(np.bincount(feature_vendor, minlength=n_vendors), out=vendor_offsets[1:])
+
+    return {
+        'feature_vendor': feature_vendor,
+        'vendor_offsets': vendor_offsets,
+        'category_ids': np.concatenate(remapped['category_ids'] or [np.empty(0, dtype=np.int32)])[order],
+        'categories': merged['categories'],
+        'name_ids': np.concatenate(remapped['name_ids'] or [np.empty(0, dtype=np.int32)])[order],
+        'names': merged['names'],
+        'token_offsets': token_offsets,
+        'tokens': tokens,
+        'vocabulary': merged['vocabulary'],
+        'invalid_vendors': np.unique(np.concatenate([table['invalid_vendors'] for table in tables]
+                                                    or [np.empty(0, dtype=np.int64)])),
+    }
+
+def build_feature_table(df, workers=None, chunk_size=None, n_vendors=None):
+    """
+    Flattens the nested 'Features' JSON of every vendor once, at ingestion, into a columnar feature table.
+
+    JSON parsing and NLTK preprocessing are independent per vendor, so each worker process handles
+    `chunk_size` consecutive vendors at a time. Shards are merged in vendor order over sorted
+    vocabularies, so the table doesn't depend on the number of workers. Vendors with empty or
+    invalid JSON get no rows and are reported once here.
+
+    Args:
+        df (pd.DataFrame): Vendors with 'Features' and 'main_category' columns, indexed by vendor id.
+        workers (int, optional): Number of worker processes, 1 to run in this process. Defaults to INDEX_WORKERS.
+        chunk_size (int, optional): Number of vendors per shard. Defaults to INDEX_CHUNK_SIZE.
+        n_vendors (int, optional): Number of vendors the ids of `df` are taken from. Defaults to len(df).
+
+    Returns:
+        dict: The feature table, one row per (vendor, feature), containing:
+            - 'feature_vendor': Vendor id of every row, rows are grouped by vendor in vendor order.
+            - 'vendor_offsets': Rows of vendor `v` are `vendor_offsets[v]:vendor_offsets[v + 1]`.
+            - 'category_ids' / 'categories': Feature category ('Category' of the JSON) of every row, interned.
+            - 'name_ids' / 'names': Feature name of every row, interned.
+            - 'token_offsets' / 'tokens' / 'vocabulary': Normalized tokens of row `r` are
+              `vocabulary[tokens[token_offsets[r]:token_offsets[r + 1]]]`, in text order.
+            - 'invalid_vendors': Ids of the vendors with empty or invalid 'Features' JSON.
+    """
+    workers = workers or INDEX_WORKERS
+    chunk_size = chunk_size or INDEX_CHUNK_SIZE
+    n_vendors = len(df) if n_vendors is None else n_vendors
+
+    if workers <= 1 or len(df) <= chunk_size:
+        shards = [flatten_feature_shard(df)]
+    else:
+        chunks = [df.iloc[start:start + chunk_size] for start in range(0, len(df), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=load_nltk_data) as executor:
+            shards = list(executor.map(flatten_feature_shard, chunks))
+
+    errors = [error for _, shard_errors in shards for error in shard_errors]
+    if errors:
+        listed = '; '.join(f"row {idx}: {message}" for idx, message in errors[:INVALID_FEATURES_REPORT_LIMIT])
+        more = f"; and {len(errors) - INVALID_FEATURES_REPORT_LIMIT} more" \
+            if len(errors) > INVALID_FEATURES_REPORT_LIMIT else ''
+        print(f"{len(errors)} vendors have empty or invalid Features JSON and get no features: {listed}{more}")
+
+    return merge_feature_tables([table for table, _ in shards], n_vendors)
+
+def select_feature_table(feature_table, vendor_ids, new_vendor_ids=None, n_vendors=None):
+    """
+    Returns the rows of some vendors of a feature table, optionally under new vendor ids.
+
+    Args:
+        feature_table (dict): Feature table (see `build_feature_table`).
+        vendor_ids (np.ndarray): Vendors to keep, their rows are returned in this order.
+        new_vendor_ids (np.ndarray, optional): Increasing id of each of `vendor_ids` in the result.
+            Defaults to `vendor_ids` (which must then be increasing).
+        n_vendors (int, optional): Number of vendors of the result. Defaults to that of `feature_table`.
+
+    Returns:
+        dict: A feature table with the rows of `vendor_ids`, over the same vocabularies.
+    """
+    vendor_ids = np.asarray(vendor_ids, dtype=np.int64)
+    new_vendor_ids = vendor_ids if new_vendor_ids is None else np.asarray(new_vendor_ids, dtype=np.int64)
+    n_vendors = len(feature_table['vendor_offsets']) - 1 if n_vendors is None else n_vendors
+    vendor_offsets = feature_table['vendor_offsets']
+    token_offsets = feature_table['token_offsets']
+
+    row_counts = vendor_offsets[vendor_ids + 1] - vendor_offsets[vendor_ids]
+    rows = concatenate_ranges(vendor_offsets[vendor_ids], row_counts)
+    token_counts = token_offsets[rows + 1] - token_offsets[rows]
+
+    selected_offsets = np.zeros(n_vendors + 1, dtype=np.int64)
+    np.cumsum(np.bincount(new_vendor_ids, weights=row_counts, minlength=n_vendors).astype(np.int64),
+              out=selected_offsets[1:])
+    selected_token_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(token_counts, out=selected_token_offsets[1:])
+
+    return {
+        'feature_vendor': np.repeat(new_vendor_ids, row_counts),
+        'vendor_offsets': selected_offsets,
+        'category_ids': np.asarray(feature_table['category_ids'])[rows],
+        'categories': feature_table['categories'],
+        'name_ids': np.asarray(feature_table['name_ids'])[rows],
+        'names': feature_table['names'],
+        'token_offsets': selected_token_offsets,
+        'tokens': np.asarray(feature_table['tokens'])[concatenate_ranges(token_offsets[rows], token_counts)],
+        'vocabulary': feature_table['vocabulary'],
+        'invalid_vendors': new_vendor_ids[np.isin(vendor_ids, feature_table['invalid_vendors'])],
+    }
+
+def update_feature_table(feature_table, old_fingerprints, df, fingerprints, workers=None, chunk_size=None):
+    """
+    Builds the feature table of `df` from a previous table, only flattening the vendors whose
+    fingerprint isn't in the previous table. The result is the table `build_feature_table(df)` would build.
+
+    Args:
+        feature_table (dict): Previous feature table.
+        old_fingerprints (np.ndarray): Fingerprint of every vendor of the previous table.
+        df (pd.DataFrame): New vendor data, indexed by vendor id (row position).
+        fingerprints (np.ndarray): Fingerprint of every vendor of `df` (see `IncrementalIndexer.fingerprint_vendors`).
+        workers (int, optional): Number of processes flattening the vendors (see `build_feature_table`).
+        chunk_size (int, optional): Number of vendors per worker task (see `build_feature_table`).
+
+    Returns:
+        tuple: Contains:
+            - feature_table (dict): The feature table of `df`.
+            - flattened (int): Number of vendors that had to be flattened.
+    """
+    old_vendor_by_fingerprint = {fingerprint: vendor for vendor, fingerprint in enumerate(old_fingerprints)}
+    source_vendor = np.array([old_vendor_by_fingerprint.get(fingerprint, -1) for fingerprint in fingerprints],
+                             dtype=np.int64)
+    reused = source_vendor >= 0
+    fresh_vendors = np.flatnonzero(~reused)
+
+    reused_table = select_feature_table(feature_table, source_vendor[reused], np.flatnonzero(reused), len(df))
+    fresh_table = build_feature_table(df.iloc[fresh_vendors], workers, chunk_size, n_vendors=len(df))
+    return merge_feature_tables([reused_table, fresh_table], len(df)), len(fresh_vendors)
+
+def get_feature_names(feature_table):
+    """Returns the feature name of every row of a feature table, as a list of str."""
+    return np.asarray(feature_table['names'])[feature_table['name_ids']].tolist()
+
+def get_feature_table_path(index_path):
+    """Returns where the feature table lives next to a feature index directory, None without one."""
+    return index_path.rstrip(os.sep) + '-features' if index_path else None
+
+def save_feature_table(feature_table, table_path, source=None, vendor_fingerprints=None):
+    """
+    Saves a feature table as a bundle of .npy arrays (see `VectorizerUtility.save_array_bundle`).
+
+    Args:
+        feature_table (dict): Feature table built by `build_feature_table`.
+        table_path (str): Directory to write the table to.
+        source (dict, optional): Fingerprint of the file the vendors were read from (see `get_source_fingerprint`).
+        vendor_fingerprints (iterable, optional): Content hash of every vendor, so the next ingest
+            only flattens the changed vendors (see `update_feature_table`).
+
+    Returns:
+        str: The table directory path.
+    """
+    arrays = {name: np.asarray(feature_table[name]) for name in FEATURE_TABLE_ARRAYS if name != 'vendor_fingerprints'}
+    arrays['vendor_fingerprints'] = np.asarray(list(vendor_fingerprints) if vendor_fingerprints is not None else [],
+                                               dtype=str)
+    manifest = {
+        'format_version': FEATURE_TABLE_FORMAT_VERSION,
+        'rows': len(feature_table['feature_vendor']),
+        'vendors': len(feature_table['vendor_offsets']) - 1,
+        'source': source,
+    }
+    return save_array_bundle(table_path, arrays, manifest)
+
+def load_feature_table(table_path, mmap=True):
+    """
+    Loads a feature table saved by `save_feature_table`.
+
+    Args:
+        table_path (str): Directory the table was saved to.
+        mmap (bool, optional): Memory-map the arrays read-only. Defaults to True.
+
+    Returns:
+        tuple: The feature table and the vendor fingerprints saved with it (empty if none were given).
+
+    Raises:
+        ValueError: If there is no table at `table_path` or it was saved in another format version.
+    """
+    manifest = read_bundle_manifest(table_path)
+    if manifest is None:
+        raise ValueError(f"No feature table found at {table_path}")
+    if manifest.get('format_version') != FEATURE_TABLE_FORMAT_VERSION:
+        raise ValueError(f"Feature table at {table_path} has format version {manifest.get('format_version')}, "
+                         f"expected {FEATURE_TABLE_FORMAT_VERSION}")
+
+    mmap_mode = 'r' if mmap else None
+    feature_table = {name: np.load(os.path.join(table_path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+                     for name in FEATURE_TABLE_ARRAYS}
+    return feature_table, feature_table.pop('vendor_fingerprints')
@@ -1,9 +1,15 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer, TfidfTransformer
+from sklearn.preprocessing import normalize
+import numpy as np
+import scipy.sparse as sp
 import json
 from Vectorization.VectorizerUtility import save_vectorizer
 from CommonProcessingUtility import load_nltk_data, load_data, preprocess_text,\
       load_stemmer_lemmatizer_stopwords, clean_json_for_csv
 from MongoUtility import vectorize_data_mongo
+from Vectorization.FeatureTable import build_feature_table, get_feature_names
+from Vectorization.VectorStore import as_vector_matrix, as_vector_array
+
 
 def generate_tfidf_per_row_withSave(df_tfidf, directory_path):
     # Initialize the new columns in the DataFrame to store vectors and paths
@@ -34,15 +40,15 @@ def generate_tfidf_per_row_withSave(df_tfidf, directory_path):
                             tfidf_matrix = vectorizer.fit_transform([processed_description])
                             vectorizer_path = save_vectorizer(vectorizer, idx, name, directory_path)
                             
-                            # Store the vector and path separately
-                            vectors[name] = tfidf_matrix.toarray().tolist()
+                            # Store the vector (contiguous float32) and path separately
+                            vectors[name] = as_vector_array(tfidf_matrix)
                             vectorizer_paths[name] = vectorizer_path
                         else:
                             vectors[name] = None  # Add None if description is empty
                             vectorizer_paths[name] = None  # Add None if description is empty
 
                 # Store the vectors and vectorizer paths in separate columns
-                df_tfidf.at[idx, 'vectors'] = clean_json_for_csv(json.dumps(vectors))  # Store vectors
+                df_tfidf.at[idx, 'vectors'] = vectors  # Store vectors
                 df_tfidf.at[idx, 'vectorizer_paths'] = clean_json_for_csv(json.dumps(vectorizer_paths))  # Store paths
 
             except json.JSONDecodeError as e:
@@ -68,7 +74,7 @@ def generate_tfidf_per_row(df_tfidf, directory_path=None):
 
     Returns:
         pd.DataFrame: The updated DataFrame with two new columns:
-            - 'vectors': A dictionary of TF-IDF vectors (as lists) per feature.
+            - 'vectors': A dictionary of TF-IDF vectors (contiguous float32 arrays) per feature.
             - 'vectorizers': A dictionary of fitted TfidfVectorizer objects per feature.
 
     Notes:
@@ -105,7 +111,7 @@ def generate_tfidf_per_row(df_tfidf, directory_path=None):
                             tfidf_matrix = vectorizer.fit_transform([processed_description])
                             
                             # Store the vector and the vectorizer object
-                            vectors[name] = tfidf_matrix.toarray().tolist()
+                            vectors[name] = as_vector_array(tfidf_matrix)
                             vectorizers[name] = vectorizer
                         else:
                             vectors[name] = None
@@ -126,11 +132,120 @@ def generate_tfidf_per_row(df_tfidf, directory_path=None):
 
     return df_tfidf
 
+def count_table_terms(feature_table):
+    """
+    Counts the terms of every row of a feature table over the sorted vocabulary of the terms it uses.
+
+    Args:
+        feature_table (dict): Feature table built by `FeatureTable.build_feature_table`.
+
+    Returns:
+        tuple: Contains:
+            - feature_vendor (np.ndarray): Vendor id of every feature row.
+            - feature_names (list): Feature name of every feature row.
+            - terms (np.ndarray): Sorted vocabulary of the rows.
+            - counts (scipy.sparse.csr_matrix): Term counts (feature rows x `terms`), the same as a
+              CountVectorizer fitted on the preprocessed feature texts.
+    """
+    tokens = np.asarray(feature_table['tokens'])
+    token_offsets = np.asarray(feature_table['token_offsets'])
+    n_rows = len(token_offsets) - 1
+
+    used_tokens, columns = np.unique(tokens, return_inverse=True)
+    rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(token_offsets))
+    counts = sp.csr_matrix((np.ones(len(tokens), dtype=np.int64), (rows, columns.ravel())),
+                           shape=(n_rows, len(used_tokens)))
+    counts.sort_indices()
+
+    terms = np.asarray(feature_table['vocabulary'])[used_tokens].astype(object)
+    return np.asarray(feature_table['feature_vendor'], dtype=np.int64), get_feature_names(feature_table), terms, counts
+
+def count_feature_terms(df, workers=None, chunk_size=None):
+    """
+    Counts the terms of every vendor feature, flattening the vendors first (see `FeatureTable.build_feature_table`).
+
+    Args:
+        df (pd.DataFrame): Vendors with 'Features' and 'main_category' columns, indexed by vendor id.
+        workers (int, optional): Number of worker processes (see `build_feature_table`).
+        chunk_size (int, optional): Number of vendors per shard (see `build_feature_table`).
+
+    Returns:
+        tuple: (feature_vendor, feature_names, terms, counts) as returned by `count_table_terms`.
+    """
+    n_vendors = int(df.index.max()) + 1 if len(df) else 0
+    return count_table_terms(build_feature_table(df, workers, chunk_size, n_vendors=n_vendors))
+
+def build_feature_index(df, use_idf=False, workers=None, chunk_size=None, feature_table=None):
+    """
+    Builds one sparse TF-IDF matrix holding a row per (vendor, feature) over a single shared vocabulary.
+
+    Args:
+        df (pd.DataFrame): DataFrame with a 'Features' column of JSON strings and a 'main_category' column.
+            Its index labels must be the row positions (0..n-1), they are used as vendor ids.
+        feature_table (dict, optional): Feature table of `df` flattened at ingestion
+            (see `FeatureTable.build_feature_table`), the index is then built from its token ids
+            without parsing or preprocessing anything. Defaults to flattening `df` here.
+        use_idf (bool, optional): Weight terms by their inverse document frequency across all features.
+            Defaults to False, which gives exactly the scores of the per-feature vectorizers of
+            `generate_tfidf_per_row` (a single-document vectorizer has an IDF of 1 for every term).
+        workers (int, optional): Number of processes flattening the vendors (see `build_feature_table`).
+        chunk_size (int, optional): Number of vendors per worker task (see `build_feature_table`).
+
+    Returns:
+        dict: The feature index, containing:
+            - 'vectorizer': CountVectorizer holding the shared vocabulary, used to vectorize queries
+              (None if the vocabulary is empty).
+            - 'idf': Array of IDF weights per term, or None when `use_idf` is False.
+            - 'matrix': CSR matrix (features x terms, float32) of L2-normalized feature vectors.
+            - 'feature_vendor': Vendor id of every feature row.
+            - 'feature_names': Feature name of every feature row.
+            - 'vendor_offsets': Feature rows of vendor `v` are `vendor_offsets[v]:vendor_offsets[v + 1]`.
+
+    Notes:
+        - Feature rows are stored grouped by vendor, in vendor order.
+        - Vendors with empty or invalid JSON get no feature rows.
+        - The index is the same whatever the number of workers.
+    """
+    if feature_table is None:
+        feature_table = build_feature_table(df, workers, chunk_size)
+    feature_vendor, feature_names, terms, counts = count_table_terms(feature_table)
+
+    # One vocabulary for all features, used to vectorize queries the same way
+    vectorizer = CountVectorizer(vocabulary={term: col for col, term in enumerate(terms.tolist())}) \
+        if len(terms) else None
+
+    idf = None
+    if use_idf and counts.shape[1]:
+        idf = TfidfTransformer().fit(counts).idf_.astype(np.float32)
+        counts = counts @ sp.diags(idf)
+
+    matrix = as_vector_matrix(normalize(counts, norm='l2'))
+
+    vendor_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(feature_vendor, minlength=len(df)), out=vendor_offsets[1:])
+
+    return {
+        'vectorizer': vectorizer,
+        'idf': idf,
+        'matrix': matrix,
+        'feature_vendor': feature_vendor,
+        'feature_names': feature_names,
+        'vendor_offsets': vendor_offsets,
+    }
+
+def vectors_to_json(vectors):
+    """Serializes the 'vectors' of a row of `generate_tfidf_per_row_withSave` to JSON lists, for CSV output."""
+    if not isinstance(vectors, dict):
+        return vectors
+    return clean_json_for_csv(json.dumps({name: [vector.tolist()] if vector is not None else None
+                                          for name, vector in vectors.items()}))
+
 def vectorize_data_withMongoSave(input_path, vectorizer_output_path, updated_vector_output_path):
     load_nltk_data()
     df = load_data(input_path)
     df_tfidf = df[['product_name', 'rating', 'seller', 'main_category', 'Features']]
     df_tfidf = generate_tfidf_per_row_withSave(df_tfidf.copy(), vectorizer_output_path)
     print(len(df_tfidf))
-    df_tfidf.to_csv(updated_vector_output_path, index=False)
+    # The CSV keeps the vectors as JSON lists, MongoDB gets them as binary blocks
+    df_tfidf.assign(vectors=df_tfidf['vectors'].map(vectors_to_json)).to_csv(updated_vector_output_path, index=False)
     vectorize_data_mongo(df_tfidf)
@@ -0,0 +1,248 @@
+import hashlib
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from CommonProcessingUtility import load_nltk_data, concatenate_ranges
+from VendorDataLoader import load_vendor_data, get_data_cache_path
+from Vectorization.FullDataVectorizer import build_feature_index, count_feature_terms, count_table_terms
+from Vectorization.FeatureTable import build_feature_table, update_feature_table, select_feature_table,\
+      save_feature_table, load_feature_table, get_feature_table_path
+from Vectorization.VectorizerUtility import save_feature_index, load_feature_index, read_feature_index_manifest,\
+      get_source_fingerprint, read_bundle_manifest
+from Vectorization.VectorStore import as_vector_matrix
+
+def fingerprint_vendors(df):
+    """
+    Computes a content hash per vendor over the columns that affect its index entry.
+
+    Args:
+        df (pd.DataFrame): DataFrame with 'Features', 'main_category' and 'rating' columns.
+
+    Returns:
+        np.ndarray: Hex digest per vendor, in row order.
+    """
+    fingerprints = []
+    for features, main_category, rating in zip(df['Features'], df['main_category'], df['rating']):
+        content = f"{features}\x1f{main_category}\x1f{rating}".encode('utf-8')
+        fingerprints.append(hashlib.blake2b(content, digest_size=16).hexdigest())
+    return np.asarray(fingerprints, dtype=str)
+
+def diff_vendor_fingerprints(old_keys, old_fingerprints, new_keys, new_fingerprints):
+    """
+    Compares two catalog snapshots vendor by vendor.
+
+    Args:
+        old_keys (iterable): Vendor keys (product names) of the previous snapshot.
+        old_fingerprints (iterable): Fingerprints of the previous snapshot, aligned with `old_keys`.
+        new_keys (iterable): Vendor keys of the new snapshot.
+        new_fingerprints (iterable): Fingerprints of the new snapshot, aligned with `new_keys`.
+
+    Returns:
+        dict: Lists of vendor keys that were 'added', 'changed' and 'removed', and the number
+        of 'unchanged' vendors.
+    """
+    old = dict(zip(old_keys, old_fingerprints))
+    new = dict(zip(new_keys, new_fingerprints))
+
+    added = [key for key in new if key not in old]
+    changed = [key for key in new if key in old and new[key] != old[key]]
+    removed = [key for key in old if key not in new]
+
+    return {
+        'added': added,
+        'changed': changed,
+        'removed': removed,
+        'unchanged': len(new) - len(added) - len(changed),
+    }
+
+def update_feature_index(feature_index, old_fingerprints, df, fingerprints, workers=None, chunk_size=None,
+                         feature_table=None):
+    """
+    Builds the feature index of `df` from a previous index, only vectorizing the vendors whose
+    fingerprint isn't in the previous index. Rows of unchanged vendors are copied over and
+    rows of vendors missing from `df` are dropped.
+
+    The result is the same index `build_feature_index(df)` would build.
+
+    Args:
+        feature_index (dict): Previous feature index (see `build_feature_index`), without IDF weighting.
+        old_fingerprints (np.ndarray): Fingerprint of every vendor of the previous index.
+        df (pd.DataFrame): New vendor data, indexed by vendor id (row position).
+        fingerprints (np.ndarray): Fingerprint of every vendor of `df`.
+        workers (int, optional): Number of processes vectorizing the vendors (see `count_feature_terms`).
+        chunk_size (int, optional): Number of vendors per worker task (see `count_feature_terms`).
+        feature_table (dict, optional): Feature table of `df` (see `FeatureTable.build_feature_table`),
+            the rows of the re-indexed vendors are then read from it instead of flattening them.
+
+    Returns:
+        tuple: Contains:
+            - feature_index (dict): The feature index of `df`.
+            - reindexed (int): Number of vendors that had to be vectorized.
+    """
+    # With IDF every row depends on the whole catalog, so nothing can be reused
+    if feature_index['idf'] is not None:
+        return build_feature_index(df, use_idf=True, workers=workers, chunk_size=chunk_size,
+                                   feature_table=feature_table), len(df)
+
+    old_offsets = feature_index['vendor_offsets']
+    old_vendor_by_fingerprint = {fingerprint: vendor for vendor, fingerprint in enumerate(old_fingerprints)}
+    source_vendor = np.array([old_vendor_by_fingerprint.get(fingerprint, -1) for fingerprint in fingerprints],
+                             dtype=np.int64)
+    reused = source_vendor >= 0
+    reindexed_vendors = np.flatnonzero(~reused)
+
+    # Feature rows of the old index that are carried over, in new vendor order
+    reused_counts = np.where(reused, old_offsets[source_vendor + 1] - old_offsets[source_vendor], 0)
+    reused_rows = concatenate_ranges(old_offsets[source_vendor[reused]], reused_counts[reused])
+    old_matrix = feature_index['matrix'][reused_rows]
+
+    # Vectorize the added and changed vendors only
+    if feature_table is not None:
+        fresh_vendor, fresh_names, fresh_terms, fresh_term_counts = count_table_terms(
+            select_feature_table(feature_table, reindexed_vendors))
+    else:
+        fresh_vendor, fresh_names, fresh_terms, fresh_term_counts = count_feature_terms(df.iloc[reindexed_vendors],
+                                                                                        workers, chunk_size)
+
+    # Shared vocabulary of the new index: every term still used, sorted like CountVectorizer does
+    old_terms = feature_index['vectorizer'].get_feature_names_out() if feature_index['vectorizer'] is not None \
+        else np.empty(0, dtype=str)
+    kept_terms = old_terms[np.unique(old_matrix.indices)]
+    terms = np.union1d(kept_terms, fresh_terms)
+    vocabulary = {term: col for col, term in enumerate(terms.tolist())}
+
+    column_map = np.full(len(old_terms), -1, dtype=old_matrix.indices.dtype)
+    column_map[np.searchsorted(old_terms, kept_terms)] = np.searchsorted(terms, kept_terms)
+    old_matrix = sp.csr_matrix((old_matrix.data, column_map[old_matrix.indices], old_matrix.indptr),
+                               shape=(old_matrix.shape[0], len(terms)))
+
+    vectorizer = CountVectorizer(vocabulary=vocabulary) if len(terms) else None
+    fresh_column_map = np.searchsorted(terms, fresh_terms).astype(fresh_term_counts.indices.dtype)
+    fresh_matrix = sp.csr_matrix((fresh_term_counts.data, fresh_column_map[fresh_term_counts.indices],
+                                  fresh_term_counts.indptr), shape=(fresh_term_counts.shape[0], len(terms)))
+    fresh_matrix = sp.csr_matrix(normalize(fresh_matrix, norm='l2'), dtype=np.float32)
+
+    # Interleave carried over and fresh rows so that rows stay grouped by vendor, in vendor order
+    fresh_counts = np.bincount(fresh_vendor, minlength=len(df))
+    counts = reused_counts + fresh_counts
+    vendor_offsets = np.zeros(len(df) + 1, dtype=np.int64)
+    np.cumsum(counts, out=vendor_offsets[1:])
+
+    reused_starts = np.cumsum(reused_counts) - reused_counts
+    fresh_starts = np.cumsum(fresh_counts) - fresh_counts
+    source_starts = np.where(reused, reused_starts, old_matrix.shape[0] + fresh_starts)
+    order = concatenate_ranges(source_starts, counts)
+
+    matrix = sp.vstack([old_matrix, fresh_matrix], format='csr')[order]
+    old_names = np.asarray(feature_index['feature_names'], dtype=object)[reused_rows]
+    feature_names = np.concatenate([old_names, np.asarray(fresh_names, dtype=object)])[order].tolist()
+
+    return {
+        'vectorizer': vectorizer,
+        'idf': None,
+        'matrix': as_vector_matrix(matrix),
+        'feature_vendor': np.repeat(np.arange(len(df), dtype=np.int64), counts),
+        'feature_names': feature_names,
+        'vendor_offsets': vendor_offsets,
+    }, len(reindexed_vendors)
+
+def reindex_catalog(input_path, index_path, sync_mongo=False):
+    """
+    Refreshes the saved feature index from the vendor dataset, re-processing only the vendors
+    that were added or changed since the index was saved.
+
+    Args:
+        input_path (str): Path to the CSV file containing vendor information.
+        index_path (str): Directory of the saved feature index, created if missing.
+        sync_mongo (bool, optional): Also upsert the changed vendors into MongoDB and tombstone
+            the removed ones. Defaults to False.
+
+    Returns:
+        dict: Keys of the 'added', 'changed' and 'removed' vendors, the number of 'unchanged'
+        vendors and the number of vendors that were 'reindexed'.
+    """
+    load_nltk_data()
+    df = load_vendor_data(input_path, get_data_cache_path(index_path))
+    vendor_names = df['product_name'].astype(str).to_numpy()
+    fingerprints = fingerprint_vendors(df)
+    source = get_source_fingerprint(input_path)
+
+    feature_table = refresh_feature_table(df, fingerprints, get_feature_table_path(index_path), source)
+    feature_index, changes = refresh_feature_index(df, vendor_names, fingerprints, index_path, feature_table)
+    save_feature_index(feature_index, index_path, vendor_names=vendor_names, source=source,
+                       vendor_fingerprints=fingerprints)
+
+    print(f"Reindexed {changes['reindexed']} of {len(df)} vendors: {len(changes['added'])} added, "
+          f"{len(changes['changed'])} changed, {len(changes['removed'])} removed")
+
+    if sync_mongo:
+        from MongoUtility import sync_vendor_delta_mongo
+        sync_vendor_delta_mongo(df, feature_index, fingerprints, changes)
+
+    return changes
+
+def refresh_feature_table(df, fingerprints, table_path=None, source=None):
+    """
+    Returns the feature table of `df` (see `FeatureTable.build_feature_table`), flattening only the
+    vendors that were added or changed since the table saved at `table_path` was ingested.
+
+    Args:
+        df (pd.DataFrame): Vendor data, indexed by vendor id (row position).
+        fingerprints (np.ndarray): Fingerprint of every vendor of `df`.
+        table_path (str, optional): Directory of the saved feature table, the refreshed table is saved there.
+            Defaults to None (nothing is reused or saved).
+        source (dict, optional): Fingerprint of the vendor data file (see `get_source_fingerprint`).
+
+    Returns:
+        dict: The feature table of `df`.
+    """
+    old_table = old_fingerprints = None
+    if table_path and read_bundle_manifest(table_path) is not None:
+        try:
+            old_table, old_fingerprints = load_feature_table(table_path)
+        except (ValueError, OSError, EOFError) as e:
+            print(f"Error loading feature table from {table_path}, rebuilding it: {e}")
+
+    if old_table is not None and len(old_fingerprints) == len(old_table['vendor_offsets']) - 1:
+        if np.array_equal(old_fingerprints, fingerprints):
+            return old_table
+        feature_table, flattened = update_feature_table(old_table, old_fingerprints, df, fingerprints)
+        print(f"Flattened the features of {flattened} of {len(df)} vendors")
+    else:
+        feature_table = build_feature_table(df)
+
+    if table_path:
+        save_feature_table(feature_table, table_path, source=source, vendor_fingerprints=fingerprints)
+    return feature_table
+
+def refresh_feature_index(df, vendor_names, fingerprints, index_path, feature_table=None):
+    """
+    Builds the feature index of `df`, incrementally from the index saved at `index_path` when there is one.
+
+    Args:
+        df (pd.DataFrame): Vendor data, indexed by vendor id (row position).
+        vendor_names (np.ndarray): Product name of every vendor of `df`.
+        fingerprints (np.ndarray): Fingerprint of every vendor of `df`.
+        index_path (str): Directory of the saved feature index.
+        feature_table (dict, optional): Feature table of `df` the index is built from (see `refresh_feature_table`).
+
+    Returns:
+        tuple: The feature index of `df` and the changes as returned by `reindex_catalog`.
+    """
+    old_names = old_fingerprints = None
+    if read_feature_index_manifest(index_path) is not None:
+        try:
+            old_index, old_names, old_fingerprints = load_feature_index(index_path)
+        except (ValueError, OSError, EOFError) as e:
+            print(f"Error loading feature index from {index_path}, rebuilding it: {e}")
+
+    if old_fingerprints is None or len(old_fingerprints) != len(old_names):
+        changes = diff_vendor_fingerprints([], [], vendor_names.tolist(), fingerprints)
+        changes['reindexed'] = len(df)
+        return build_feature_index(df, feature_table=feature_table), changes
+
+    changes = diff_vendor_fingerprints(old_names.tolist(), old_fingerprints, vendor_names.tolist(), fingerprints)
+    feature_index, changes['reindexed'] = update_feature_index(old_index, old_fingerprints, df, fingerprints,
+                                                               feature_table=feature_table)
+    return feature_index, changes
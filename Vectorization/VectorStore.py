@@ -0,0 +1,186 @@
+import struct
+import numpy as np
+import scipy.sparse as sp
+
+# Vectors are stored with float32 weights, sparse ones as CSR with int32 column indices and row offsets
+VECTOR_DTYPE = np.float32
+VECTOR_INDEX_DTYPE = np.int32
+
+# Header of a binary vector block: magic (with the layout version), rows, columns and stored weights,
+# followed by the row offsets, the column indices and the weights, all little-endian
+VECTOR_BLOCK_MAGIC = b'VSB1'
+VECTOR_BLOCK_HEADER = struct.Struct('<4sIIQ')
+
+def as_vector_matrix(matrix):
+    """
+    Converts a matrix to the layout of the vector store: CSR with float32 weights, int32 indices and
+    sorted columns per row. The arrays are reused when they already are in that layout.
+
+    Args:
+        matrix: A SciPy sparse matrix or a dense array.
+
+    Returns:
+        sp.csr_matrix: The vectors, one per row.
+    """
+    if not sp.issparse(matrix):
+        matrix = sp.csr_matrix(np.atleast_2d(np.asarray(matrix, dtype=VECTOR_DTYPE)))
+    elif not sp.isspmatrix_csr(matrix):
+        matrix = matrix.tocsr()
+
+    if matrix.nnz >= np.iinfo(VECTOR_INDEX_DTYPE).max:
+        raise ValueError(f"Vector store matrices are limited to {np.iinfo(VECTOR_INDEX_DTYPE).max} weights")
+
+    data = matrix.data if matrix.data.dtype == VECTOR_DTYPE else matrix.data.astype(VECTOR_DTYPE)
+    indices = matrix.indices if matrix.indices.dtype == VECTOR_INDEX_DTYPE else matrix.indices.astype(VECTOR_INDEX_DTYPE)
+    indptr = matrix.indptr if matrix.indptr.dtype == VECTOR_INDEX_DTYPE else matrix.indptr.astype(VECTOR_INDEX_DTYPE)
+    if data is not matrix.data or indices is not matrix.indices or indptr is not matrix.indptr:
+        matrix = sp.csr_matrix((data, indices, indptr), shape=matrix.shape, copy=False)
+    if not matrix.has_sorted_indices:
+        matrix.sort_indices()
+    return matrix
+
+def as_vector_array(vector):
+    """
+    Returns one vector as a contiguous float32 array, from a 1 x n sparse row, an array or a (nested) list
+    of weights as stored by older versions of `generate_tfidf_per_row`. Float32 arrays are returned as is.
+    """
+    if sp.issparse(vector):
+        vector = vector.toarray()
+    return np.ascontiguousarray(vector, dtype=VECTOR_DTYPE).ravel()
+
+def as_vector_row(vector):
+    """
+    Returns a stored feature vector as a 1 x n row to compare queries against: sparse vectors as a float32
+    CSR row, dense ones (arrays or legacy lists) as a float32 array view.
+    """
+    if sp.issparse(vector):
+        return as_vector_matrix(vector if vector.shape[0] == 1 else vector.reshape(1, -1))
+    return as_vector_array(vector).reshape(1, -1)
+
+def make_vector_matrix(data, indices, indptr, shape):
+    """
+    Wraps stored CSR arrays (e.g. memory-mapped .npy files or a decoded block) in a matrix without copying them.
+
+    Args:
+        data (np.ndarray): Weights.
+        indices (np.ndarray): Column of every weight.
+        indptr (np.ndarray): Row offsets into `data` and `indices`.
+        shape (tuple): (rows, columns).
+
+    Returns:
+        sp.csr_matrix: The vectors, one per row.
+    """
+    return _keep_array_views(sp.csr_matrix((data, indices, indptr), shape=tuple(shape), copy=False),
+                             data, indices, indptr)
+
+def _keep_array_views(matrix, data, indices, indptr):
+    """
+    Puts the given arrays back into a sparse matrix built from them: SciPy copies slices much smaller than the
+    array they view and memory-mapped arrays, keep them as views when the dtypes allow it.
+    """
+    for name, array in (('data', data), ('indices', indices), ('indptr', indptr)):
+        if getattr(matrix, name).dtype == array.dtype:
+            setattr(matrix, name, array)
+    return matrix
+
+def as_postings_matrix(matrix):
+    """
+    Converts vectors to their postings, the inverted index of the vector store: the same float32 weights and
+    int32 indices in CSC layout, column `t` lists in row order the rows holding term `t`.
+
+    Args:
+        matrix: The vectors, one per row (see `as_vector_matrix`).
+
+    Returns:
+        sp.csc_matrix: The postings (rows x terms).
+    """
+    postings = sp.csc_matrix(as_vector_matrix(matrix), dtype=VECTOR_DTYPE)
+    if postings.indices.dtype != VECTOR_INDEX_DTYPE or postings.indptr.dtype != VECTOR_INDEX_DTYPE:
+        postings = sp.csc_matrix((postings.data, postings.indices.astype(VECTOR_INDEX_DTYPE),
+                                  postings.indptr.astype(VECTOR_INDEX_DTYPE)), shape=postings.shape, copy=False)
+    if not postings.has_sorted_indices:
+        postings.sort_indices()
+    return postings
+
+def make_postings_matrix(data, indices, indptr, shape):
+    """Wraps stored CSC arrays of postings (e.g. memory-mapped .npy files) without copying them, like `make_vector_matrix`."""
+    return _keep_array_views(sp.csc_matrix((data, indices, indptr), shape=tuple(shape), copy=False),
+                             data, indices, indptr)
+
+def get_vector_arrays(matrix):
+    """Returns the arrays a vector matrix is stored as: 'data' (float32), 'indices' and 'indptr' (int32)."""
+    matrix = as_vector_matrix(matrix)
+    return {'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr}
+
+def get_vendor_vectors(feature_index, vendor):
+    """
+    Returns the feature vectors of one vendor as a view of the index matrix.
+
+    Args:
+        feature_index (dict): Feature index (see `FullDataVectorizer.build_feature_index`).
+        vendor (int): Vendor id.
+
+    Returns:
+        sp.csr_matrix: One row per feature of the vendor, in feature index order. Its weights and column
+        indices share memory with the index matrix, only the row offsets are copied.
+    """
+    matrix = feature_index['matrix']
+    first, last = int(feature_index['vendor_offsets'][vendor]), int(feature_index['vendor_offsets'][vendor + 1])
+    start, end = matrix.indptr[first], matrix.indptr[last]
+    return make_vector_matrix(matrix.data[start:end], matrix.indices[start:end],
+                              (matrix.indptr[first:last + 1] - start).astype(VECTOR_INDEX_DTYPE, copy=False),
+                              (last - first, matrix.shape[1]))
+
+def encode_vector_block(matrix):
+    """
+    Serializes vectors to one compact binary block: a fixed header, then the raw CSR arrays.
+
+    Args:
+        matrix: The vectors, one per row (see `as_vector_matrix`).
+
+    Returns:
+        bytes: The block, read back with `decode_vector_block`.
+    """
+    matrix = as_vector_matrix(matrix)
+    header = VECTOR_BLOCK_HEADER.pack(VECTOR_BLOCK_MAGIC, matrix.shape[0], matrix.shape[1], matrix.nnz)
+    return b''.join([
+        header,
+        np.ascontiguousarray(matrix.indptr, dtype='<i4').tobytes(),
+        np.ascontiguousarray(matrix.indices, dtype='<i4').tobytes(),
+        np.ascontiguousarray(matrix.data, dtype='<f4').tobytes(),
+    ])
+
+def decode_vector_block(buffer):
+    """
+    Reads vectors serialized by `encode_vector_block`.
+
+    Args:
+        buffer (bytes-like): The block.
+
+    Returns:
+        sp.csr_matrix: The vectors, backed by read-only views of `buffer` rather than copies.
+
+    Raises:
+        ValueError: If `buffer` is not a vector block or is truncated.
+    """
+    buffer = memoryview(buffer)
+    if len(buffer) < VECTOR_BLOCK_HEADER.size:
+        raise ValueError("Vector block is truncated")
+    magic, rows, columns, nnz = VECTOR_BLOCK_HEADER.unpack_from(buffer)
+    if magic != VECTOR_BLOCK_MAGIC:
+        raise ValueError(f"Not a vector block (magic {magic!r})")
+    expected = VECTOR_BLOCK_HEADER.size + 4 * (rows + 1) + 8 * nnz
+    if len(buffer) != expected:
+        raise ValueError(f"Vector block has {len(buffer)} bytes, expected {expected}")
+
+    offset = VECTOR_BLOCK_HEADER.size
+    indptr = np.frombuffer(buffer, dtype='<i4', count=rows + 1, offset=offset)
+    offset += indptr.nbytes
+    indices = np.frombuffer(buffer, dtype='<i4', count=nnz, offset=offset)
+    offset += indices.nbytes
+    data = np.frombuffer(buffer, dtype='<f4', count=nnz, offset=offset)
+    return make_vector_matrix(data, indices, indptr, (rows, columns))
+
+def get_vector_nbytes(matrix):
+    """Returns the memory used by the arrays of a vector matrix, in bytes."""
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
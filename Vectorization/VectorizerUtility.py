@@ -1,6 +1,11 @@
 import pickle
 import os
 import re
+import json
+import shutil
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from Vectorization.VectorStore import get_vector_arrays, make_vector_matrix, as_postings_matrix, make_postings_matrix
 
 # Function to create a directory if it doesn't exist
 create_directory = lambda path: os.makedirs(path, exist_ok=True)
@@ -48,3 +53,161 @@ def load_vectorizer(vectorizer_path):
         print(f"ERROR loading vectorizer from {vectorizer_path}: {e}")
         return None  # Return None if loading failed
 
+# Version of the on-disk feature index layout, bumped whenever the set or meaning of the arrays changes
+FEATURE_INDEX_FORMAT_VERSION = 3
+
+# Arrays of a saved feature index, each stored as its own .npy file so it can be memory-mapped
+FEATURE_INDEX_ARRAYS = ['vocabulary', 'idf', 'data', 'indices', 'indptr', 'postings_data', 'postings_indices',
+                        'postings_indptr', 'feature_vendor', 'feature_names', 'vendor_offsets', 'vendor_names',
+                        'vendor_fingerprints']
+
+def get_source_fingerprint(input_path):
+    """Describes the current state of the vendor dataset file, to tell whether a saved index is stale."""
+    stat = os.stat(input_path)
+    return {'path': os.path.abspath(input_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def save_feature_index(feature_index, index_path, vendor_names=None, source=None, vendor_fingerprints=None):
+    """
+    Saves a feature index as one versioned directory of plain .npy arrays plus a manifest,
+    so it can be loaded memory-mapped without unpickling anything.
+
+    Args:
+        feature_index (dict): Feature index built by `FullDataVectorizer.build_feature_index`.
+        index_path (str): Directory to write the index to. An existing index there is replaced.
+        vendor_names (iterable, optional): Product name of every vendor, used to check on load that the
+            index still matches the vendor data.
+        source (dict, optional): Description of the data the index was built from (e.g. file size and mtime),
+            stored in the manifest as is.
+        vendor_fingerprints (iterable, optional): Content hash of every vendor, used to re-index
+            only the changed vendors on the next refresh (see `IncrementalIndexer`).
+
+    Returns:
+        str: The index directory path.
+    """
+    matrix = feature_index['matrix']
+    vectorizer = feature_index['vectorizer']
+    vocabulary = vectorizer.get_feature_names_out() if vectorizer is not None else []
+    postings = feature_index.get('postings')
+    if postings is None:
+        postings = as_postings_matrix(matrix)
+
+    arrays = {
+        'vocabulary': np.asarray(vocabulary, dtype=str),
+        'idf': feature_index['idf'] if feature_index['idf'] is not None else np.empty(0, dtype=np.float32),
+        # Same float32 / int32 CSR layout as the binary vector blocks of the MongoDB backend
+        **get_vector_arrays(matrix),
+        # The term postings (see `SimilarityEvaluator.get_term_postings`), memory-mapped like the matrix
+        'postings_data': postings.data,
+        'postings_indices': postings.indices,
+        'postings_indptr': postings.indptr,
+        'feature_vendor': feature_index['feature_vendor'],
+        'feature_names': np.asarray(feature_index['feature_names'], dtype=str),
+        'vendor_offsets': feature_index['vendor_offsets'],
+        'vendor_names': np.asarray(list(vendor_names) if vendor_names is not None else [], dtype=str),
+        'vendor_fingerprints': np.asarray(list(vendor_fingerprints) if vendor_fingerprints is not None else [], dtype=str),
+    }
+    manifest = {
+        'format_version': FEATURE_INDEX_FORMAT_VERSION,
+        'shape': list(matrix.shape),
+        'use_idf': feature_index['idf'] is not None,
+        'source': source,
+    }
+
+    # Written next to the target and swapped in, so readers never see a half-written index
+    return save_array_bundle(index_path, arrays, manifest)
+
+def read_feature_index_manifest(index_path):
+    """Returns the manifest of a saved feature index, or None if there is no index at `index_path`."""
+    return read_bundle_manifest(index_path)
+
+def save_array_bundle(bundle_path, arrays, manifest, write_files=None):
+    """
+    Saves named arrays as one directory of plain .npy files plus a JSON manifest.
+
+    The bundle is written next to `bundle_path` and swapped in, so readers never see a half-written one.
+
+    Args:
+        bundle_path (str): Directory to write the bundle to. An existing bundle there is replaced.
+        arrays (dict): Array name -> array, saved as `<name>.npy` (no pickled objects).
+        manifest (dict): JSON-serializable description of the bundle.
+        write_files (callable, optional): Called with the directory being written, to add files
+            that aren't arrays (e.g. a library's own index format) before the bundle is swapped in.
+
+    Returns:
+        str: The bundle directory path.
+    """
+    tmp_path = bundle_path.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    create_directory(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), array, allow_pickle=False)
+    if write_files is not None:
+        write_files(tmp_path)
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file)
+
+    old_path = bundle_path.rstrip(os.sep) + '.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(bundle_path):
+        os.replace(bundle_path, old_path)
+    os.replace(tmp_path, bundle_path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return bundle_path
+
+def read_bundle_manifest(bundle_path):
+    """Returns the manifest of a bundle saved by `save_array_bundle`, or None if there is none at `bundle_path`."""
+    try:
+        with open(os.path.join(bundle_path, 'manifest.json')) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def load_feature_index(index_path, mmap=True):
+    """
+    Loads a feature index saved by `save_feature_index`.
+
+    Args:
+        index_path (str): Directory the index was saved to.
+        mmap (bool, optional): Memory-map the arrays read-only instead of reading them into memory,
+            so worker processes share the pages. Defaults to True.
+
+    Returns:
+        tuple: Contains:
+            - feature_index (dict): The feature index, in the format of `build_feature_index`, with its
+              'postings' (see `SimilarityEvaluator.get_term_postings`).
+            - vendor_names (np.ndarray): Product names saved with the index (empty if none were given).
+            - vendor_fingerprints (np.ndarray): Vendor content hashes saved with the index (empty if none were given).
+
+    Raises:
+        ValueError: If there is no index at `index_path` or it was saved in another format version.
+    """
+    manifest = read_feature_index_manifest(index_path)
+    if manifest is None:
+        raise ValueError(f"No feature index found at {index_path}")
+    if manifest.get('format_version') != FEATURE_INDEX_FORMAT_VERSION:
+        raise ValueError(f"Feature index at {index_path} has format version {manifest.get('format_version')}, "
+                         f"expected {FEATURE_INDEX_FORMAT_VERSION}")
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(index_path, f"{name}.npy"), mmap_mode=mmap_mode, allow_pickle=False)
+              for name in FEATURE_INDEX_ARRAYS}
+
+    vocabulary = arrays['vocabulary']
+    vectorizer = CountVectorizer(vocabulary={term: col for col, term in enumerate(vocabulary.tolist())}) \
+        if len(vocabulary) else None
+
+    matrix = make_vector_matrix(arrays['data'], arrays['indices'], arrays['indptr'], manifest['shape'])
+    postings = make_postings_matrix(arrays['postings_data'], arrays['postings_indices'], arrays['postings_indptr'],
+                                    manifest['shape'])
+
+    feature_index = {
+        'vectorizer': vectorizer,
+        'idf': arrays['idf'] if manifest['use_idf'] else None,
+        'matrix': matrix,
+        'feature_vendor': arrays['feature_vendor'],
+        'feature_names': arrays['feature_names'],
+        'vendor_offsets': arrays['vendor_offsets'],
+        'postings': postings,
+    }
+    return feature_index, arrays['vendor_names'], arrays['vendor_fingerprints']
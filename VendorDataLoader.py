@@ -0,0 +1,171 @@
+import os
+import numpy as np
+import pandas as pd
+from Vectorization.VectorizerUtility import save_array_bundle, read_bundle_manifest, get_source_fingerprint
+
+# Columns of the vendor dataset used by the qualification pipeline, every other column is never parsed
+VENDOR_COLUMNS = ['product_name', 'rating', 'seller', 'main_category', 'Features']
+
+# Low-cardinality columns kept as pandas categoricals
+CATEGORICAL_COLUMNS = ['seller', 'main_category']
+
+# Explicit dtypes so pandas doesn't infer them per chunk, 'rating' is parsed separately
+VENDOR_DTYPES = {'product_name': str, 'seller': 'category', 'main_category': 'category', 'Features': str}
+
+# Rows parsed per CSV chunk
+CSV_CHUNK_SIZE = int(os.environ.get('VENDOR_CSV_CHUNK_SIZE', '20000'))
+
+VENDOR_DATA_CACHE_FORMAT_VERSION = 1
+
+def iter_vendor_chunks(input_path, chunk_size=None):
+    """
+    Reads the vendor dataset in chunks, parsing only the columns the pipeline uses.
+
+    Args:
+        input_path (str): Path to the CSV file containing vendor information.
+        chunk_size (int, optional): Rows per chunk. Defaults to CSV_CHUNK_SIZE.
+
+    Yields:
+        pd.DataFrame: The next chunk with the VENDOR_COLUMNS, numbered like the rows of the whole file.
+    """
+    reader = pd.read_csv(input_path, usecols=VENDOR_COLUMNS, dtype=VENDOR_DTYPES, chunksize=chunk_size or CSV_CHUNK_SIZE)
+    with reader:
+        for chunk in reader:
+            chunk['rating'] = pd.to_numeric(chunk['rating'], errors='coerce')
+            yield chunk[VENDOR_COLUMNS]
+
+def load_vendor_data(input_path, cache_path=None, chunk_size=None):
+    """
+    Loads the columns of the vendor dataset used by the pipeline, from the columnar cache when it is current.
+
+    Args:
+        input_path (str): Path to the CSV file containing vendor information.
+        cache_path (str, optional): Directory of the columnar cache. When it was written from the current
+            version of `input_path` (same size and modification time) the CSV isn't parsed at all,
+            otherwise the CSV is streamed and the cache rewritten. Defaults to None (no cache).
+        chunk_size (int, optional): Rows per CSV chunk. Defaults to CSV_CHUNK_SIZE.
+
+    Returns:
+        pd.DataFrame: The VENDOR_COLUMNS of every vendor, indexed by vendor id (row position),
+        with 'seller' and 'main_category' as categoricals.
+    """
+    source = get_source_fingerprint(input_path)
+    if cache_path:
+        manifest = read_bundle_manifest(cache_path)
+        if manifest is not None and manifest.get('format_version') == VENDOR_DATA_CACHE_FORMAT_VERSION \
+                and manifest.get('source') == source:
+            try:
+                return load_vendor_data_cache(cache_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Error loading vendor data cache from {cache_path}, reading {input_path}: {e}")
+
+    df = read_vendor_columns(iter_vendor_chunks(input_path, chunk_size))
+
+    if cache_path:
+        save_vendor_data_cache(df, cache_path, source)
+    return df
+
+def read_vendor_columns(chunks):
+    """
+    Assembles vendor chunks into one DataFrame, consuming them one at a time: only the column values are
+    kept from each chunk, so the chunks and the assembled frame are never all in memory together.
+
+    Args:
+        chunks (iterable): DataFrames with the VENDOR_COLUMNS (see `iter_vendor_chunks`).
+
+    Returns:
+        pd.DataFrame: The VENDOR_COLUMNS of every vendor, indexed by row position, with the CATEGORICAL_COLUMNS
+        as categoricals over the union of the chunks' categories, in order of appearance.
+    """
+    ratings = []
+    strings = {name: [] for name in VENDOR_COLUMNS if name != 'rating' and name not in CATEGORICAL_COLUMNS}
+    codes = {name: [] for name in CATEGORICAL_COLUMNS}
+    categories = {name: {} for name in CATEGORICAL_COLUMNS}
+
+    for chunk in chunks:
+        ratings.append(chunk['rating'].to_numpy(dtype=np.float64, na_value=np.nan))
+        for name, values in strings.items():
+            values.extend(chunk[name].tolist())
+        # Chunks have their own categories, map their codes onto the categories seen so far
+        for name in CATEGORICAL_COLUMNS:
+            seen = categories[name]
+            chunk_categories = chunk[name].cat.categories
+            code_map = np.array([seen.setdefault(category, len(seen)) for category in chunk_categories] + [-1],
+                                dtype=np.int32)
+            codes[name].append(code_map[chunk[name].cat.codes.to_numpy()])
+
+    columns = {}
+    for name in VENDOR_COLUMNS:
+        if name == 'rating':
+            columns[name] = np.concatenate(ratings) if ratings else np.empty(0, dtype=np.float64)
+        elif name in CATEGORICAL_COLUMNS:
+            columns[name] = pd.Categorical.from_codes(
+                np.concatenate(codes[name]) if codes[name] else np.empty(0, dtype=np.int32),
+                categories=pd.Index(list(categories[name])))
+        else:
+            columns[name] = np.array(strings[name], dtype=object)
+    return pd.DataFrame(columns)
+
+def get_data_cache_path(index_path):
+    """Returns where the columnar vendor data cache lives next to a feature index directory, None without one."""
+    return index_path.rstrip(os.sep) + '-data' if index_path else None
+
+def save_vendor_data_cache(df, cache_path, source=None):
+    """
+    Saves the vendor columns as a bundle of .npy arrays (see `VectorizerUtility.save_array_bundle`).
+
+    Strings are stored as one UTF-8 buffer plus offsets, categoricals as codes plus their categories.
+
+    Args:
+        df (pd.DataFrame): Vendor data as returned by `load_vendor_data`.
+        cache_path (str): Directory to write the cache to.
+        source (dict, optional): Fingerprint of the file the data was read from (see `get_source_fingerprint`).
+
+    Returns:
+        str: The cache directory path.
+    """
+    arrays = {'rating': df['rating'].to_numpy(dtype=np.float64, na_value=np.nan)}
+    for name in VENDOR_COLUMNS:
+        if name in CATEGORICAL_COLUMNS:
+            arrays[f"{name}.codes"] = df[name].cat.codes.to_numpy(dtype=np.int32)
+            _encode_strings(arrays, f"{name}.categories", df[name].cat.categories)
+        elif name != 'rating':
+            _encode_strings(arrays, name, df[name])
+
+    manifest = {'format_version': VENDOR_DATA_CACHE_FORMAT_VERSION, 'rows': len(df), 'source': source}
+    return save_array_bundle(cache_path, arrays, manifest)
+
+def load_vendor_data_cache(cache_path):
+    """Loads vendor data saved by `save_vendor_data_cache`."""
+    columns = {}
+    for name in VENDOR_COLUMNS:
+        if name == 'rating':
+            columns[name] = _load_array(cache_path, name)
+        elif name in CATEGORICAL_COLUMNS:
+            categories = _decode_strings(cache_path, f"{name}.categories")
+            columns[name] = pd.Categorical.from_codes(_load_array(cache_path, f"{name}.codes"), categories=categories)
+        else:
+            columns[name] = _decode_strings(cache_path, name)
+    return pd.DataFrame(columns)
+
+def _load_array(cache_path, name):
+    """Loads one array of a vendor data cache."""
+    return np.load(os.path.join(cache_path, f"{name}.npy"), allow_pickle=False)
+
+def _encode_strings(arrays, name, values):
+    """Adds the UTF-8 buffer, offsets and missing flags of a string column to `arrays`."""
+    missing = np.asarray(pd.isna(values), dtype=bool)
+    encoded = [b'' if is_missing else str(value).encode('utf-8') for value, is_missing in zip(values, missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    arrays[f"{name}.data"] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    arrays[f"{name}.offsets"] = offsets
+    arrays[f"{name}.missing"] = missing
+
+def _decode_strings(cache_path, name):
+    """Rebuilds a string column from its buffer, offsets and missing flags, missing values are NaN like in read_csv."""
+    data = _load_array(cache_path, f"{name}.data").tobytes()
+    offsets = _load_array(cache_path, f"{name}.offsets").tolist()
+    missing = _load_array(cache_path, f"{name}.missing").tolist()
+    return np.array([np.nan if is_missing else data[start:end].decode('utf-8')
+                     for start, end, is_missing in zip(offsets[:-1], offsets[1:], missing)], dtype=object)
@@ -0,0 +1,107 @@
+import re
+import threading
+import numpy as np
+import pandas as pd
+
+# Words of a category name, used as keys of the token-level index
+_CATEGORY_TOKENS = re.compile(r'\w+')
+
+# Number of distinct category filters whose vendor ids are memoized per index
+CATEGORY_LOOKUP_CACHE_SIZE = 4096
+
+def build_category_index(main_categories):
+    """
+    Precomputes which vendors belong to which main category, so filtering by category is a dictionary lookup.
+
+    Args:
+        main_categories (pd.Series): The 'main_category' of every vendor, indexed by vendor id (row position).
+
+    Returns:
+        dict: The category index, containing:
+            - 'categories': Distinct lower-cased categories.
+            - 'category_vendors': Sorted vendor ids of every distinct category, aligned with 'categories'.
+            - 'token_categories': Category word -> positions in 'categories' of the categories containing it.
+            - 'all_vendors': Sorted ids of all vendors that have a category.
+            - 'lookups': Memoized results of `find_category_vendors`, guarded by 'lookups_lock'.
+    """
+    codes, categories = pd.factorize(main_categories.str.lower(), sort=True)
+    vendor_ids = np.arange(len(codes), dtype=np.int64)
+
+    # Stable sort keeps vendor ids sorted within every category; vendors without a category (code -1) come first
+    order = np.argsort(codes, kind='stable')
+    boundaries = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+    category_vendors = [vendor_ids[order[boundaries[code]:boundaries[code + 1]]] for code in range(len(categories))]
+
+    token_categories = {}
+    for code, category in enumerate(categories):
+        for token in set(_CATEGORY_TOKENS.findall(category)):
+            token_categories.setdefault(token, []).append(code)
+
+    return {
+        'categories': list(categories),
+        'category_vendors': category_vendors,
+        'token_categories': {token: np.asarray(codes_, dtype=np.int64) for token, codes_ in token_categories.items()},
+        'all_vendors': vendor_ids[codes >= 0],
+        'lookups': {},
+        'lookups_lock': threading.Lock(),
+    }
+
+def find_category_vendors(category_index, software_category):
+    """
+    Returns the vendors whose main category contains `software_category`, ignoring case.
+
+    This matches `df['main_category'].str.contains(software_category, case=False, na=False)`,
+    except that `software_category` is matched literally rather than as a regular expression.
+
+    Args:
+        category_index (dict): Category index built by `build_category_index`.
+        software_category (str): The software category to filter by.
+
+    Returns:
+        np.ndarray: Sorted vendor ids, shared with the index and must not be modified.
+    """
+    needle = software_category.lower()
+    lookups = category_index['lookups']
+    vendor_ids = lookups.get(needle)
+    if vendor_ids is not None:
+        return vendor_ids
+
+    if not needle:
+        vendor_ids = category_index['all_vendors']
+    else:
+        codes = _find_matching_categories(category_index, needle)
+        if len(codes) == 1:
+            vendor_ids = category_index['category_vendors'][codes[0]]
+        elif len(codes):
+            vendor_ids = np.sort(np.concatenate([category_index['category_vendors'][code] for code in codes]))
+        else:
+            vendor_ids = np.empty(0, dtype=np.int64)
+
+    with category_index['lookups_lock']:
+        if len(lookups) >= CATEGORY_LOOKUP_CACHE_SIZE:
+            lookups.clear()
+        lookups[needle] = vendor_ids
+    return vendor_ids
+
+def _find_matching_categories(category_index, needle):
+    """Returns the positions of the categories containing `needle` (lower-cased)."""
+    categories = category_index['categories']
+    candidates = None
+
+    # Every word of the filter but the first and the last must be a whole word of a matching category,
+    # the first and last may be cut (e.g. 'account' in 'accounting'). Narrow down with the word index.
+    tokens = _CATEGORY_TOKENS.findall(needle)
+    token_categories = category_index['token_categories']
+    for position, token in enumerate(tokens):
+        if 0 < position < len(tokens) - 1:
+            codes = token_categories.get(token, np.empty(0, dtype=np.int64))
+        else:
+            codes = np.unique(np.concatenate([codes for word, codes in token_categories.items() if token in word]
+                                             or [np.empty(0, dtype=np.int64)]))
+        candidates = codes if candidates is None else np.intersect1d(candidates, codes)
+
+    if candidates is None:
+        # No word characters in the filter, check every category
+        candidates = np.arange(len(categories))
+
+    return [candidate for candidate in candidates.tolist() if needle in categories[candidate]]
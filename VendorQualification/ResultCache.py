@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+from CommonProcessingUtility import preprocess_text, load_stemmer_lemmatizer_stopwords
+from PreQualifiedList import tokenize_category_text
+
+# Bounded LRU cache of qualification results, entries expire after RESULT_CACHE_TTL seconds.
+# Results are only valid for the catalog version they were computed on, the whole cache is
+# dropped as soon as a lookup comes in for another version.
+RESULT_CACHE_SIZE = 1024
+RESULT_CACHE_TTL = 300
+_result_cache = OrderedDict()
+_result_cache_lock = threading.Lock()
+_result_cache_version = None
+_result_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+def make_result_cache_key(query, software_category, k, weight_similarity, weight_rating, prequalify=False,
+                          scorer='tfidf', offset=0, fields=None, shortlist_size=None):
+    """
+    Builds the cache key of a qualification query.
+
+    Scoring only depends on which normalized terms the query contains and how often, so the key
+    uses the sorted preprocessed terms: capabilities given in another order map to the same entry.
+
+    Args:
+        query (str): The query text (see `CommonProcessingUtility.get_query`).
+        software_category (str): The software category the vendors are filtered by (case-insensitive).
+        k (int): Number of top vendors returned.
+        weight_similarity (float): Ranking weight of the similarity score.
+        weight_rating (float): Ranking weight of the rating.
+        prequalify (bool, optional): Whether vendors whose category matches the query are ranked first.
+            Prequalification tokenizes the query without stemming, so its terms are part of the key.
+        scorer (str, optional): How vendors are scored. Only TF-IDF scores depend on the preprocessed terms
+            alone, other scorers are keyed on the exact query text.
+        offset (int, optional): Number of top ranked vendors skipped.
+        fields (iterable, optional): Vendor fields of the result, None for all of them.
+        shortlist_size (int, optional): Vendors re-ranked by the 'hybrid' scorer.
+
+    Returns:
+        tuple: The cache key.
+    """
+    lemmatizer, stemmer, stop_words = load_stemmer_lemmatizer_stopwords()
+    terms = tuple(sorted(preprocess_text(stemmer, lemmatizer, stop_words, query).split())) if scorer == 'tfidf' \
+        else query
+    category_terms = tuple(sorted(tokenize_category_text(query))) if prequalify else None
+    return (scorer, terms, software_category.lower(), k, weight_similarity, weight_rating, category_terms, offset,
+            tuple(fields) if fields is not None else None, shortlist_size)
+
+def get_cached_result(key, catalog_version):
+    """
+    Looks up a cached qualification result.
+
+    Args:
+        key (tuple): Key from `make_result_cache_key`.
+        catalog_version (int): Version of the catalog the result must have been computed on.
+
+    Returns:
+        The cached result, or None on a miss. The result is shared and must not be modified.
+    """
+    global _result_cache_version
+    with _result_cache_lock:
+        if catalog_version != _result_cache_version:
+            if _result_cache:
+                _result_cache_stats['invalidations'] += 1
+            _result_cache.clear()
+            _result_cache_version = catalog_version
+
+        entry = _result_cache.get(key)
+        if entry is not None:
+            result, expires_at = entry
+            if expires_at > time.monotonic():
+                _result_cache.move_to_end(key)
+                _result_cache_stats['hits'] += 1
+                return result
+            del _result_cache[key]
+            _result_cache_stats['expirations'] += 1
+
+        _result_cache_stats['misses'] += 1
+        return None
+
+def store_result(key, catalog_version, result):
+    """
+    Caches a qualification result computed on the given catalog version.
+
+    Args:
+        key (tuple): Key from `make_result_cache_key`.
+        catalog_version (int): Version of the catalog the result was computed on.
+        result: The result to cache, it must not be modified afterwards.
+    """
+    with _result_cache_lock:
+        # The catalog was reloaded while this result was computed
+        if catalog_version != _result_cache_version:
+            return
+
+        _result_cache[key] = (result, time.monotonic() + RESULT_CACHE_TTL)
+        _result_cache.move_to_end(key)
+        if len(_result_cache) > RESULT_CACHE_SIZE:
+            _result_cache.popitem(last=False)
+            _result_cache_stats['evictions'] += 1
+
+def get_result_cache_stats():
+    """
+    Returns the counters and current size of the result cache.
+
+    Returns:
+        dict: 'hits', 'misses', 'evictions', 'expirations', 'invalidations', 'size', 'max_size'
+        and 'catalog_version' of the cache.
+    """
+    with _result_cache_lock:
+        return {**_result_cache_stats, 'size': len(_result_cache), 'max_size': RESULT_CACHE_SIZE,
+                'catalog_version': _result_cache_version}
+
+def clear_result_cache():
+    """Empties the result cache and resets its counters."""
+    with _result_cache_lock:
+        _result_cache.clear()
+        for name in _result_cache_stats:
+            _result_cache_stats[name] = 0
@@ -0,0 +1,210 @@
+import itertools
+import threading
+import time
+import numpy as np
+from CommonProcessingUtility import load_nltk_data
+from VendorDataLoader import load_vendor_data, get_data_cache_path
+from Vectorization.FullDataVectorizer import build_feature_index
+from Vectorization.VectorizerUtility import save_feature_index, load_feature_index, read_feature_index_manifest,\
+      get_source_fingerprint
+from Vectorization.IncrementalIndexer import fingerprint_vendors, refresh_feature_index, refresh_feature_table
+from Vectorization.FeatureTable import get_feature_table_path
+from VendorQualification.CategoryIndex import build_category_index
+from SimilarityEvaluation.SimilarityEvaluator import get_term_postings
+from PreQualifiedList import build_category_model
+from SimilarityEvaluation.EmbeddingScorer import load_or_build_embedding_index, get_embedding_index_path
+from SimilarityEvaluation.VectorRetrieval import load_or_build_retrieval_index, get_retrieval_index_path
+
+# Process-wide catalog shared by every request. Requests only read it; a rebuild
+# swaps the reference in one assignment so in-flight requests keep the old one.
+_catalog = None
+_catalog_lock = threading.Lock()
+_catalog_versions = itertools.count(1)
+
+def load_or_build_feature_index(df, input_path, index_path):
+    """
+    Loads the saved feature index at `index_path` if it was built from the current vendor dataset.
+    Otherwise the index is refreshed, vectorizing only the vendors that were added or changed since
+    it was saved (or all of them if there is no saved index), and saved there for the next start.
+    The vendors' features are flattened once at ingestion into a feature table saved next to the index
+    (see `IncrementalIndexer.refresh_feature_table`), the index is built from it.
+
+    Args:
+        df (pd.DataFrame): Vendor DataFrame, indexed by vendor id (row position).
+        input_path (str): Path to the CSV file `df` was loaded from.
+        index_path (str): Directory of the saved feature index.
+
+    Returns:
+        dict: The feature index (see `build_feature_index`).
+    """
+    source = get_source_fingerprint(input_path)
+    vendor_names = df['product_name'].astype(str).to_numpy()
+
+    manifest = read_feature_index_manifest(index_path)
+    if manifest is not None and manifest.get('source') == source:
+        try:
+            feature_index, saved_names, _ = load_feature_index(index_path)
+            if np.array_equal(saved_names, vendor_names):
+                return feature_index
+            print(f"Saved feature index at {index_path} doesn't match the vendor data, rebuilding it")
+        except (ValueError, OSError, EOFError) as e:
+            print(f"Error loading feature index from {index_path}: {e}")
+
+    fingerprints = fingerprint_vendors(df)
+    feature_table = refresh_feature_table(df, fingerprints, get_feature_table_path(index_path), source)
+    feature_index, changes = refresh_feature_index(df, vendor_names, fingerprints, index_path, feature_table)
+    print(f"Reindexed {changes['reindexed']} of {len(df)} vendors")
+
+    save_feature_index(feature_index, index_path, vendor_names=vendor_names, source=source,
+                       vendor_fingerprints=fingerprints)
+    return feature_index
+
+def build_catalog(input_path, index_path=None):
+    """
+    Loads the vendor dataset and precomputes everything the qualification pipeline needs
+    that does not depend on the query.
+
+    Args:
+        input_path (str): Path to the CSV file containing vendor information.
+        index_path (str, optional): Directory to persist the feature index in. When it holds an index built
+            from the same file, that index is memory-mapped instead of vectorizing the vendors again.
+            The vendor columns are cached next to it as well (see `VendorDataLoader.load_vendor_data`).
+
+    Returns:
+        dict: The catalog, containing:
+            - 'input_path': The file the catalog was built from.
+            - 'index_path': Directory the feature index is persisted in, or None.
+            - 'df': Vendor DataFrame with the relevant columns, indexed by vendor id (row position).
+            - 'feature_index': Shared TF-IDF feature index of all vendors (see `build_feature_index`).
+            - 'category_index': Vendor ids per main category (see `build_category_index`).
+            - 'category_model': Category TF-IDF model used to prequalify vendors (see `build_category_model`).
+            - 'version': Monotonically increasing build number, changes on every (re)build.
+            - 'built_at': Unix timestamp of the build.
+            - 'indexes_lock': Guards the indexes built on first use (see `get_catalog_embedding_index`),
+              per catalog so a long build never blocks loading or reloading catalogs.
+    """
+    # Load NLTK data required for text preprocessing
+    load_nltk_data()
+
+    # Only the columns used are parsed, from the columnar cache next to the index when the file hasn't changed
+    df = load_vendor_data(input_path, get_data_cache_path(index_path))
+
+    # Vectorize every vendor feature into one shared sparse matrix
+    if index_path:
+        feature_index = load_or_build_feature_index(df, input_path, index_path)
+    else:
+        feature_index = build_feature_index(df)
+
+    # Inverted index of the feature terms, so queries only visit the features they match
+    get_term_postings(feature_index)
+
+    return {
+        'input_path': input_path,
+        'index_path': index_path,
+        'df': df,
+        'feature_index': feature_index,
+        'category_index': build_category_index(df['main_category']),
+        'category_model': build_category_model(df['main_category']),
+        'version': next(_catalog_versions),
+        'built_at': time.time(),
+        'indexes_lock': threading.Lock(),
+    }
+
+def get_catalog(input_path, index_path=None):
+    """
+    Returns the shared vendor catalog, building it on first use.
+
+    If the loaded catalog was built from a different file, it is rebuilt from `input_path`.
+
+    Args:
+        input_path (str): Path to the CSV file containing vendor information.
+        index_path (str, optional): Directory to persist the feature index in (see `build_catalog`).
+
+    Returns:
+        dict: The catalog as returned by `build_catalog`.
+    """
+    global _catalog
+    catalog = _catalog
+    if catalog is not None and catalog['input_path'] == input_path:
+        return catalog
+
+    with _catalog_lock:
+        # Another thread may have built it while we were waiting for the lock
+        if _catalog is None or _catalog['input_path'] != input_path:
+            _catalog = build_catalog(input_path, index_path)
+        return _catalog
+
+def reload_catalog(input_path=None, index_path=None):
+    """
+    Rebuilds the shared vendor catalog, e.g. after the source dataset was refreshed.
+
+    Args:
+        input_path (str, optional): File to build from. Defaults to the file of the loaded catalog.
+        index_path (str, optional): Directory to persist the feature index in. Defaults to the one of the
+            loaded catalog.
+
+    Returns:
+        dict: The freshly built catalog.
+
+    Raises:
+        ValueError: If no path is given and no catalog has been loaded yet.
+    """
+    global _catalog
+    with _catalog_lock:
+        if input_path is None:
+            if _catalog is None:
+                raise ValueError("No catalog loaded yet, an input path is required to build one")
+            input_path = _catalog['input_path']
+        if index_path is None and _catalog is not None:
+            index_path = _catalog['index_path']
+        _catalog = build_catalog(input_path, index_path)
+        return _catalog
+
+def get_catalog_embedding_index(catalog):
+    """
+    Returns the vendor embeddings of a catalog, loaded (or built) on first use and kept with the catalog.
+
+    The embeddings are saved next to the catalog's feature index (see `EmbeddingScorer.get_embedding_index_path`).
+    Building them runs the transformer over every vendor, so it is meant to happen offline. Concurrent callers
+    wait for the catalog's 'indexes_lock' only, never for the process-wide catalog lock.
+
+    Args:
+        catalog (dict): The catalog as returned by `build_catalog`.
+
+    Returns:
+        dict: The embedding index (see `EmbeddingScorer.build_embedding_index`).
+    """
+    embedding_index = catalog.get('embedding_index')
+    if embedding_index is None:
+        with catalog['indexes_lock']:
+            embedding_index = catalog.get('embedding_index')
+            if embedding_index is None:
+                embedding_index = load_or_build_embedding_index(
+                    catalog['df'], get_embedding_index_path(catalog['index_path']),
+                    source=get_source_fingerprint(catalog['input_path']))
+                catalog['embedding_index'] = embedding_index
+    return embedding_index
+
+def get_catalog_retrieval_index(catalog):
+    """
+    Returns the retrieval index over the catalog's vendor embeddings (see `VectorRetrieval`), loaded (or built)
+    on first use and kept with the catalog. Its backend is VectorRetrieval.RETRIEVAL_BACKEND.
+
+    Args:
+        catalog (dict): The catalog as returned by `build_catalog`.
+
+    Returns:
+        dict: The retrieval index (see `VectorRetrieval.build_retrieval_index`).
+    """
+    retrieval_index = catalog.get('retrieval_index')
+    if retrieval_index is None:
+        embedding_index = get_catalog_embedding_index(catalog)
+        with catalog['indexes_lock']:
+            retrieval_index = catalog.get('retrieval_index')
+            if retrieval_index is None:
+                retrieval_index = load_or_build_retrieval_index(
+                    embedding_index['embeddings'], get_retrieval_index_path(catalog['index_path']),
+                    source={'data': get_source_fingerprint(catalog['input_path']),
+                            'model_name': embedding_index['model_name']})
+                catalog['retrieval_index'] = retrieval_index
+    return retrieval_index
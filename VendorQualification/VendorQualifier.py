@@ -1,61 +1,496 @@
-from CommonProcessingUtility import load_nltk_data, load_data
-from Vectorization.FullDataVectorizer import generate_tfidf_per_row
-from SimilarityEvaluation.SimilarityEvaluator import calculate_similarity, filter_highly_similar_rows
-from RankingService import rank_vendors
-#from PreQualifiedList import set_prequalified_by_main_category
+import os
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from VendorQualification.VendorCatalog import get_catalog, get_catalog_embedding_index, get_catalog_retrieval_index
+from SimilarityEvaluation.SimilarityEvaluator import aggregate_candidate_vendor_scores, get_feature_similarity_scores,\
+      calculate_feature_similarity_batch, get_query_feature_scores
+from VendorQualification.CategoryIndex import find_category_vendors
+from VendorQualification.ResultCache import make_result_cache_key, get_cached_result, store_result
+from CommonProcessingUtility import get_query
+from SimilarityEvaluation.EmbeddingScorer import embed_query, EMBEDDING_SIMILARITY_THRESHOLD
+from SimilarityEvaluation.VectorRetrieval import search_retrieval_index, score_rows
+from RankingService import rank_top_vendors
+from PreQualifiedList import get_prequalified_vendors
+from Instrumentation import stage_timer, increment_counter
 
-def get_qualifiedVendors(input_path, query, software_category, capabilities):
+# Ways of scoring vendors against a query, see `get_qualifiedVendors`
+SCORERS = ('tfidf', 'embedding', 'hybrid')
+
+# Vendors retrieved by similarity before they are ranked with their rating, when the retrieval is approximate
+EMBEDDING_RETRIEVAL_CANDIDATES = 1000
+
+# Hybrid scorer: vendors shortlisted by TF-IDF for the embedding re-rank, and the latency budget (seconds) of
+# the re-rank, TF-IDF results are returned when it isn't met. The shortlist is scored against the catalog's
+# precomputed vendor embeddings, so a re-rank only embeds the query (tens of milliseconds on a CPU) once the
+# embeddings and the model are loaded; until then (see `app.PRELOAD_EMBEDDINGS`) re-ranks time out and fall back
+HYBRID_SHORTLIST_SIZE = int(os.environ.get('VENDOR_HYBRID_SHORTLIST_SIZE', '50'))
+HYBRID_RERANK_TIMEOUT = float(os.environ.get('VENDOR_HYBRID_RERANK_TIMEOUT', '0.5'))
+
+# Re-ranks running at once, requests beyond that fall back to TF-IDF results right away
+HYBRID_RERANK_WORKERS = int(os.environ.get('VENDOR_HYBRID_RERANK_WORKERS', '2'))
+
+# Re-ranks run on their own threads so they can be abandoned when they exceed their budget
+_rerank_executor = ThreadPoolExecutor(max_workers=HYBRID_RERANK_WORKERS, thread_name_prefix='rerank')
+_rerank_slots = threading.BoundedSemaphore(HYBRID_RERANK_WORKERS)
+
+# Vendor data fields a result can include, only read for the vendors returned
+VENDOR_FIELDS = ('product_name', 'rating', 'seller', 'main_category', 'Features')
+
+# Score columns every result has, after the vendor fields
+SCORE_FIELDS = ('avg_similarity_scores', 'max_similarity_scores', 'similarity_scores', 'final_score', 'rank')
+
+def check_vendor_fields(fields):
+    """
+    Validates the vendor fields asked for in a result.
+
+    Args:
+        fields (iterable or None): Names among VENDOR_FIELDS, None for all of them.
+
+    Returns:
+        tuple: The fields, in the order given, without duplicates.
+
+    Raises:
+        ValueError: If a field is not one of VENDOR_FIELDS.
+    """
+    if fields is None:
+        return VENDOR_FIELDS
+    fields = tuple(dict.fromkeys(fields))
+    unknown = [field for field in fields if field not in VENDOR_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown vendor fields {', '.join(map(str, unknown))}, expected some of {', '.join(VENDOR_FIELDS)}")
+    return fields
+
+def get_qualifiedVendors(input_path, query, software_category, capabilities, k=10, index_path=None,
+                         weight_similarity=0.7, weight_rating=0.3, use_cache=True, prequalify=True, scorer='tfidf',
+                         offset=0, fields=None, shortlist_size=None, rerank_timeout=None):
     """
     Filters and ranks vendors based on similarity to a query, within a specified software category,
-    using TF-IDF vectorization and cosine similarity. The function returns the top 10 vendors based on
-    their similarity scores and ranking.
+    using TF-IDF vectorization and cosine similarity against a shared feature index. The function returns
+    the top k vendors based on their similarity scores and ranking.
 
     Args:
         input_path (str): Path to the input data file containing vendor information.
         query (str): The query text to compare against the vendors' features for similarity.
         software_category (str): The software category to filter the vendors by (case-insensitive).
         capabilities (dict): Additional capabilities or filters (not used in this implementation but reserved for future extensions).
+        k (int, optional): Number of top vendors to return. Defaults to 10.
+        index_path (str, optional): Directory the vectorized catalog is persisted in (see `VendorCatalog.build_catalog`).
+        weight_similarity (float, optional): Ranking weight of the average similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        use_cache (bool, optional): Serve repeated queries from the result cache (see `ResultCache`). Defaults to True.
+        prequalify (bool, optional): Rank vendors whose main category matches the query first
+            (see `PreQualifiedList.get_prequalified_vendors`). Defaults to True.
+        scorer (str, optional): How vendors are scored against the query, one of SCORERS:
+            - 'tfidf': TF-IDF cosine similarity of every vendor feature (the default).
+            - 'embedding': cosine similarity of precomputed transformer embeddings of whole vendors
+              (see `EmbeddingScorer`), only the query is embedded per call. Vendors of the category are
+              retrieved with the backend of `VectorRetrieval.RETRIEVAL_BACKEND`; approximate backends only
+              rank the EMBEDDING_RETRIEVAL_CANDIDATES most similar ones.
+            - 'hybrid': the `shortlist_size` best qualified vendors by TF-IDF are re-ranked by the similarity
+              of their precomputed embeddings with the query's, only the query is embedded per call. The ranking
+              only holds the shortlist: pages are taken within it, so every page ranks the same vendors, and
+              pages past it are empty. When the re-rank takes more than `rerank_timeout` seconds (e.g. while the
+              embeddings are first loaded) or fails, the TF-IDF ranking is returned instead.
+        offset (int, optional): Number of top ranked vendors to skip, to page through the results. Defaults to 0.
+        fields (iterable, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
+        shortlist_size (int, optional): Vendors re-ranked by the 'hybrid' scorer. Defaults to HYBRID_SHORTLIST_SIZE.
+        rerank_timeout (float, optional): Latency budget of the 'hybrid' re-rank in seconds.
+            Defaults to HYBRID_RERANK_TIMEOUT.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the top 10 vendors sorted by their similarity to the query, including:
+        pd.DataFrame: A DataFrame containing the k vendors ranked after the first `offset`, sorted by their
+        similarity to the query and indexed by vendor id, including the requested vendor fields:
             - 'product_name': Name of the product/vendor.
             - 'rating': Vendor's rating.
             - 'seller': Vendor's seller.
             - 'main_category': Vendor's main software category.
-            - 'Features': Features associated with the vendor.
+            - 'Features': Features associated with the vendor (raw JSON text).
+        followed by:
             - 'avg_similarity_scores': The average similarity score of the vendor's features to the query.
+            - 'max_similarity_scores': The highest similarity score among the vendor's features.
+            - 'similarity_scores': A dictionary of similarity scores per feature.
             - 'final_score': Final score after ranking.
-            - 'rank': Rank based on the final score.
+            - 'rank': Rank based on the final score, counted from the first vendor (not from `offset`).
     
+    Raises:
+        ValueError: If `scorer` is not one of SCORERS, `offset` is negative or a field is not one of VENDOR_FIELDS.
+
     Notes:
-        - The function preprocesses text and calculates TF-IDF vectors for the vendor features.
+        - The vendor data and its TF-IDF feature index are built once per process (see `VendorCatalog.get_catalog`)
+          and reused across calls; only the query is processed per call.
         - The vendors are filtered by their main category, then ranked based on their similarity to the input query.
+          Only vendor ids and scores go through the pipeline, the vendor fields are read for the returned vendors only.
+        - Results are cached per catalog version, a cached DataFrame is shared and must not be modified.
+          Hybrid results that fell back to TF-IDF are not cached.
         - The function assumes the input data is in a compatible format (e.g., CSV or JSON).
     """
 
-    # Load vendor data from the specified file path
-    df = load_data(input_path)
+    if scorer not in SCORERS:
+        raise ValueError(f"Unknown scorer '{scorer}', expected one of {', '.join(SCORERS)}")
+    if offset < 0:
+        raise ValueError(f"'offset' must not be negative, got {offset}")
+    fields = check_vendor_fields(fields)
+    shortlist_size = HYBRID_SHORTLIST_SIZE if shortlist_size is None else shortlist_size
+
+    # Get the preloaded vendor data with its precomputed TF-IDF feature index
+    with stage_timer('load_data'):
+        catalog = get_catalog(input_path, index_path)
+
+    if use_cache:
+        cache_key = make_result_cache_key(query, software_category, k, weight_similarity, weight_rating, prequalify,
+                                          scorer, offset, fields, shortlist_size if scorer == 'hybrid' else None)
+        cached = get_cached_result(cache_key, catalog['version'])
+        if cached is not None:
+            increment_counter('cache_hits')
+            return cached
+        increment_counter('cache_misses')
+
+    if scorer == 'embedding':
+        # Embed the query and retrieve the closest vendor embeddings of the category
+        with stage_timer('load_data'):
+            embedding_index = get_catalog_embedding_index(catalog)
+            retrieval_index = get_catalog_retrieval_index(catalog)
+        with stage_timer('vectorize'):
+            query_embedding = embed_query(query, embedding_index)
+        with stage_timer('score'):
+            category_vendors = find_category_vendors(catalog['category_index'], software_category)
+            candidates = len(category_vendors) if retrieval_index['backend'] == 'exact' \
+                else EMBEDDING_RETRIEVAL_CANDIDATES
+            vendor_ids, vendor_scores = search_retrieval_index(retrieval_index, embedding_index['embeddings'],
+                                                               query_embedding, candidates, allowed_ids=category_vendors)
+        rankedvendors = rank_embedding_vendors(catalog, vendor_ids, vendor_scores, software_category, k,
+                                               weight_similarity, weight_rating, query if prequalify else None,
+                                               offset, fields)
+    elif scorer == 'hybrid':
+        # Shortlist vendors by TF-IDF, then re-rank the shortlist by embedding similarity within the budget
+        scores = calculate_feature_similarity_batch([query], catalog['feature_index'])
+        feature_rows, feature_scores = get_query_feature_scores(scores, 0)
+        rankedvendors, reranked = rank_hybrid_vendors(
+            catalog, query, feature_rows, feature_scores, software_category, k, weight_similarity, weight_rating,
+            query if prequalify else None, offset, fields, shortlist_size,
+            HYBRID_RERANK_TIMEOUT if rerank_timeout is None else rerank_timeout)
+        use_cache = use_cache and reranked
+    else:
+        # Calculate similarity scores between the query and the vendor features sharing a term with it
+        scores = calculate_feature_similarity_batch([query], catalog['feature_index'])
+        feature_rows, feature_scores = get_query_feature_scores(scores, 0)
+        rankedvendors = rank_qualified_vendors(catalog, feature_rows, feature_scores, software_category, k,
+                                               weight_similarity, weight_rating, query if prequalify else None,
+                                               offset, fields)
+    if use_cache:
+        store_result(cache_key, catalog['version'], rankedvendors)
+    return rankedvendors
+
+def get_qualifiedVendors_batch(input_path, queries, k=10, index_path=None, weight_similarity=0.7, weight_rating=0.3,
+                               use_cache=True, prequalify=True, fields=None):
+    """
+    Qualifies vendors for many (software_category, capabilities) pairs at once. The queries that aren't
+    cached are vectorized together, then each one is scored by walking the term postings of its own
+    terms (see `SimilarityEvaluator.calculate_feature_similarity_batch`), filtered and ranked like in
+    `get_qualifiedVendors`.
+
+    Args:
+        input_path (str): Path to the input data file containing vendor information.
+        queries (list): (software_category, capabilities) pairs, see `get_qualifiedVendors`.
+        k (int, optional): Number of top vendors to return per query. Defaults to 10.
+        index_path (str, optional): Directory the vectorized catalog is persisted in (see `VendorCatalog.build_catalog`).
+        weight_similarity (float, optional): Ranking weight of the average similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        use_cache (bool, optional): Serve repeated queries from the result cache, only the others are scored.
+            Defaults to True.
+        prequalify (bool, optional): Rank vendors whose main category matches the query first. Defaults to True.
+        fields (iterable, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
+
+    Returns:
+        list: One DataFrame per query, in the order of `queries`, with the columns of `get_qualifiedVendors`.
+
+    Raises:
+        ValueError: If a field is not one of VENDOR_FIELDS.
+    """
+    fields = check_vendor_fields(fields)
+    with stage_timer('load_data'):
+        catalog = get_catalog(input_path, index_path)
+
+    query_texts = [get_query(software_category, capabilities) for software_category, capabilities in queries]
+
+    results = [None] * len(queries)
+    cache_keys = [None] * len(queries)
+    if use_cache:
+        for position, (query, (software_category, _)) in enumerate(zip(query_texts, queries)):
+            cache_keys[position] = make_result_cache_key(query, software_category, k, weight_similarity, weight_rating,
+                                                         prequalify, fields=fields)
+            results[position] = get_cached_result(cache_keys[position], catalog['version'])
+            increment_counter('cache_hits' if results[position] is not None else 'cache_misses')
+
+    # Score the queries that were not cached together
+    missing = [position for position, result in enumerate(results) if result is None]
+    if missing:
+        scores = calculate_feature_similarity_batch([query_texts[position] for position in missing], catalog['feature_index'])
+        for column, position in enumerate(missing):
+            software_category = queries[position][0]
+            feature_rows, feature_scores = get_query_feature_scores(scores, column)
+            results[position] = rank_qualified_vendors(catalog, feature_rows, feature_scores, software_category, k,
+                                                       weight_similarity, weight_rating,
+                                                       query_texts[position] if prequalify else None,
+                                                       fields=fields)
+            if use_cache:
+                store_result(cache_keys[position], catalog['version'], results[position])
+
+    return results
+
+def rank_qualified_vendors(catalog, feature_rows, feature_scores, software_category, k=10, weight_similarity=0.7,
+                           weight_rating=0.3, prequalify_query=None, offset=0, fields=VENDOR_FIELDS):
+    """
+    Turns the feature similarity scores of one query into the top k qualified vendors of a software category.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        feature_rows (np.ndarray): Sorted feature rows of the catalog's feature index that share a term with the query.
+        feature_scores (np.ndarray): Similarity score of each of `feature_rows`, every other feature scores 0.
+        software_category (str): The software category to filter the vendors by (case-insensitive).
+        k (int, optional): Number of top vendors to return. Defaults to 10.
+        weight_similarity (float, optional): Ranking weight of the average similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        prequalify_query (str, optional): When given, vendors whose main category matches this query are ranked first.
+        offset (int, optional): Number of top ranked vendors to skip. Defaults to 0.
+        fields (tuple, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
+
+    Returns:
+        pd.DataFrame: The top k vendors, with the columns described in `get_qualifiedVendors`.
+    """
+    feature_index = catalog['feature_index']
+    candidates, avg_scores, max_scores = filter_qualified_vendors(catalog, feature_rows, feature_scores,
+                                                                  software_category)
+
+    return rank_candidate_vendors(
+        catalog, candidates, avg_scores, max_scores,
+        lambda vendor_ids: get_feature_similarity_scores(feature_rows, feature_scores, feature_index, vendor_ids),
+        k, weight_similarity, weight_rating, prequalify_query, offset, fields)
+
+def filter_qualified_vendors(catalog, feature_rows, feature_scores, software_category):
+    """
+    Keeps the vendors of a software category that have a feature highly similar to the query.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        feature_rows (np.ndarray): Sorted feature rows of the catalog's feature index that share a term with the query.
+        feature_scores (np.ndarray): Similarity score of each of `feature_rows`.
+        software_category (str): The software category to filter the vendors by (case-insensitive).
+
+    Returns:
+        tuple: The qualified vendor ids (sorted), their average and their highest feature similarity.
+    """
+    with stage_timer('filter'):
+        # Filter vendors by the specified software category (case-insensitive), a lookup in the category index
+        category_vendors = find_category_vendors(catalog['category_index'], software_category)
+
+        # Only vendors owning a feature that shares a term with the query can score above 0
+        vendor_ids, avg_scores, max_scores, has_high_similarity = aggregate_candidate_vendor_scores(
+            feature_rows, feature_scores, catalog['feature_index'])
+
+        # Keep vendors of the category that have highly similar features to the query (above a predefined threshold)
+        keep = has_high_similarity & np.isin(vendor_ids, category_vendors)
+    increment_counter('vendors_scanned', len(vendor_ids))
+    return vendor_ids[keep], avg_scores[keep], max_scores[keep]
+
+def rank_hybrid_vendors(catalog, query, feature_rows, feature_scores, software_category, k=10, weight_similarity=0.7,
+                        weight_rating=0.3, prequalify_query=None, offset=0, fields=VENDOR_FIELDS,
+                        shortlist_size=HYBRID_SHORTLIST_SIZE, rerank_timeout=HYBRID_RERANK_TIMEOUT):
+    """
+    Shortlists the qualified vendors of a software category by TF-IDF similarity and re-ranks the shortlist
+    by embedding similarity, falling back to the TF-IDF ranking when the re-rank misses its deadline.
+
+    The shortlist doesn't depend on the page: the page is taken within the re-ranked shortlist, so consecutive
+    pages never rank different vendor sets, and pages starting past the shortlist are empty.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        query (str): The query text, embedded for the re-rank.
+        feature_rows (np.ndarray): Sorted feature rows of the catalog's feature index that share a term with the query.
+        feature_scores (np.ndarray): Similarity score of each of `feature_rows`.
+        software_category (str): The software category to filter the vendors by (case-insensitive).
+        k (int, optional): Number of top vendors to return. Defaults to 10.
+        weight_similarity (float, optional): Ranking weight of the similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        prequalify_query (str, optional): When given, vendors whose main category matches this query are ranked first.
+        offset (int, optional): Number of top ranked vendors to skip. Defaults to 0.
+        fields (tuple, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
+        shortlist_size (int, optional): Vendors re-ranked, the most a ranking holds. Defaults to HYBRID_SHORTLIST_SIZE.
+        rerank_timeout (float, optional): Seconds the re-rank may take. Defaults to HYBRID_RERANK_TIMEOUT.
+
+    Returns:
+        tuple: Contains:
+            - rankedvendors (pd.DataFrame): The top k vendors, with the columns described in `get_qualifiedVendors`.
+              When re-ranked, 'avg_similarity_scores' holds the embedding similarity of the vendor, ranked on, while
+              'max_similarity_scores' and 'similarity_scores' keep the TF-IDF feature scores.
+            - reranked (bool): False when the TF-IDF ranking was returned instead.
+    """
+    feature_index = catalog['feature_index']
+    candidates, avg_scores, max_scores = filter_qualified_vendors(catalog, feature_rows, feature_scores,
+                                                                  software_category)
+    get_similarity_scores = \
+        lambda vendor_ids: get_feature_similarity_scores(feature_rows, feature_scores, feature_index, vendor_ids)
+
+    # Shortlist on TF-IDF similarity alone, the rating is fused in after the re-rank
+    top, _ = rank_top_vendors(avg_scores, np.zeros(len(avg_scores)), k=shortlist_size,
+                              weight_similarity=1, weight_rating=0)
+    shortlist = np.sort(top)
+
+    # Nothing to re-rank, e.g. the page starts past the shortlist
+    if offset >= len(shortlist):
+        return rank_candidate_vendors(catalog, candidates[shortlist], avg_scores[shortlist], max_scores[shortlist],
+                                      get_similarity_scores, k, weight_similarity, weight_rating, prequalify_query,
+                                      offset, fields), True
+
+    rerank_scores = run_rerank(catalog, query, candidates[shortlist], rerank_timeout)
+    if rerank_scores is None:
+        return rank_candidate_vendors(catalog, candidates, avg_scores, max_scores, get_similarity_scores, k,
+                                      weight_similarity, weight_rating, prequalify_query, offset, fields), False
+
+    return rank_candidate_vendors(catalog, candidates[shortlist], rerank_scores.astype(np.float64),
+                                  max_scores[shortlist], get_similarity_scores, k, weight_similarity, weight_rating,
+                                  prequalify_query, offset, fields), True
+
+def rerank_vendors(catalog, query, vendor_ids):
+    """
+    Scores vendors by the similarity of the catalog's precomputed vendor embeddings with the query's,
+    loading (or building) them on first use (see `VendorCatalog.get_catalog_embedding_index`).
+
+    Returns:
+        np.ndarray: Embedding similarity (float32) of each of `vendor_ids`.
+    """
+    embedding_index = get_catalog_embedding_index(catalog)
+    return score_rows(embedding_index['embeddings'], embed_query(query, embedding_index), rows=vendor_ids)
+
+def _timed_rerank(catalog, query, vendor_ids):
+    """Runs `rerank_vendors` on a re-rank thread, timing it as the 'rerank' stage and freeing its slot after."""
+    try:
+        with stage_timer('rerank'):
+            return rerank_vendors(catalog, query, vendor_ids)
+    finally:
+        _rerank_slots.release()
+
+def run_rerank(catalog, query, vendor_ids, timeout):
+    """
+    Re-ranks vendors with `rerank_vendors` within a deadline.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        query (str): The query text.
+        vendor_ids (np.ndarray): The shortlisted vendors.
+        timeout (float): Seconds to wait for the scores.
+
+    Returns:
+        np.ndarray: The embedding similarity of each of `vendor_ids`, None when the re-rank could not start
+        (HYBRID_RERANK_WORKERS re-ranks already running), timed out or failed.
 
-    # Select relevant columns from the data
-    df = df[['product_name', 'rating', 'seller', 'main_category', 'Features']]
+    Notes:
+        - A re-rank that times out is not interrupted, it finishes in the background (e.g. loading the vendor
+          embeddings and the model on first use) and holds its slot until then.
+    """
+    if not _rerank_slots.acquire(blocking=False):
+        increment_counter('rerank_skipped')
+        return None
+    try:
+        future = _rerank_executor.submit(_timed_rerank, catalog, query, vendor_ids)
+    except RuntimeError as e:
+        _rerank_slots.release()
+        print(f"Error starting the re-rank: {e}")
+        return None
 
-    # Filter vendors by the specified software category (case-insensitive)
-    df = df[df['main_category'].str.contains(software_category, case=False, na=False)]
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        increment_counter('rerank_timeouts')
+        return None
+    except Exception as e:
+        print(f"Error re-ranking vendors: {e}")
+        increment_counter('rerank_errors')
+        return None
 
-    # Load NLTK data required for text preprocessing
-    load_nltk_data()
+def rank_embedding_vendors(catalog, vendor_ids, vendor_scores, software_category, k=10, weight_similarity=0.7,
+                           weight_rating=0.3, prequalify_query=None, offset=0, fields=VENDOR_FIELDS):
+    """
+    Turns the embedding similarity scores of one query into the top k qualified vendors of a software category.
 
-    # Generate TF-IDF vectors for each row based on the 'Features' column
-    df = generate_tfidf_per_row(df.copy())
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        vendor_ids (np.ndarray): Ids of the vendors retrieved for the query (see `VectorRetrieval.search_retrieval_index`).
+        vendor_scores (np.ndarray): Embedding similarity of each of `vendor_ids`.
+        software_category (str): The software category to filter the vendors by (case-insensitive).
+        k (int, optional): Number of top vendors to return. Defaults to 10.
+        weight_similarity (float, optional): Ranking weight of the similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        prequalify_query (str, optional): When given, vendors whose main category matches this query are ranked first.
+        offset (int, optional): Number of top ranked vendors to skip. Defaults to 0.
+        fields (tuple, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
 
-    # Calculate similarity scores between the query and vendor feature vectors
-    df_new = calculate_similarity(query, df.copy())
+    Returns:
+        pd.DataFrame: The top k vendors, with the columns described in `get_qualifiedVendors`. Vendors are
+        embedded as a whole, so 'avg_similarity_scores' and 'max_similarity_scores' both hold the vendor's
+        similarity and 'similarity_scores' has no per-feature scores.
+    """
+    with stage_timer('filter'):
+        category_vendors = find_category_vendors(catalog['category_index'], software_category)
+
+        # Keep vendors of the category similar enough to the query, in vendor id order
+        order = np.argsort(vendor_ids, kind='stable')
+        vendor_ids, vendor_scores = vendor_ids[order], vendor_scores[order]
+        keep = (vendor_scores >= EMBEDDING_SIMILARITY_THRESHOLD) & np.isin(vendor_ids, category_vendors)
+        candidates, scores = vendor_ids[keep], vendor_scores[keep].astype(np.float64)
+    increment_counter('vendors_scanned', len(vendor_ids))
+
+    return rank_candidate_vendors(catalog, candidates, scores, scores, lambda vendor_ids: [{} for _ in vendor_ids],
+                                  k, weight_similarity, weight_rating, prequalify_query, offset, fields)
+
+def rank_candidate_vendors(catalog, candidates, avg_scores, max_scores, get_similarity_scores, k=10,
+                           weight_similarity=0.7, weight_rating=0.3, prequalify_query=None, offset=0,
+                           fields=VENDOR_FIELDS):
+    """
+    Ranks qualified vendors by similarity and rating and builds the output rows of the top k.
+
+    Args:
+        catalog (dict): The vendor catalog (see `VendorCatalog.build_catalog`).
+        candidates (np.ndarray): Ids of the qualified vendors.
+        avg_scores (np.ndarray): Similarity score ranked on, aligned with `candidates`.
+        max_scores (np.ndarray): Highest feature similarity, aligned with `candidates`.
+        get_similarity_scores (callable): Returns the per-feature score dictionaries of the given vendor ids.
+        k (int, optional): Number of top vendors to return. Defaults to 10.
+        weight_similarity (float, optional): Ranking weight of the similarity score. Defaults to 0.7.
+        weight_rating (float, optional): Ranking weight of the vendor rating. Defaults to 0.3.
+        prequalify_query (str, optional): When given, vendors whose main category matches this query are ranked first.
+        offset (int, optional): Number of top ranked vendors to skip. Defaults to 0.
+        fields (tuple, optional): Vendor fields to include, some of VENDOR_FIELDS. Defaults to all of them.
+
+    Returns:
+        pd.DataFrame: The top k vendors, with the columns described in `get_qualifiedVendors`.
+    """
+    with stage_timer('rank'):
+        df = catalog['df']
 
-    # Filter vendors that have highly similar features to the query (above a predefined threshold)
-    filtereddf = filter_highly_similar_rows(df_new)
+        # Rank the vendors based on their similarity scores and rating, only the top k are sorted
+        ratings = df['rating'].iloc[candidates].to_numpy(dtype=np.float64, na_value=0)
+        prequalified = None
+        if prequalify_query is not None:
+            prequalified = get_prequalified_vendors(catalog['category_model'], prequalify_query)[candidates]
+        top, final_scores = rank_top_vendors(avg_scores, ratings, k=offset + k,
+                                             weight_similarity=weight_similarity, weight_rating=weight_rating,
+                                             prequalified=prequalified)
+        top, final_scores = top[offset:], final_scores[offset:]
+        vendor_ids = candidates[top]
 
-    # Rank the vendors based on their similarity scores
-    rankedvendors = rank_vendors(filtereddf)
+        # Vendor fields and per-feature scores are only read for the rows actually returned
+        columns = {field: ratings[top] if field == 'rating' else df[field].iloc[vendor_ids].to_numpy()
+                   for field in fields}
 
-    # Return the top 10 vendors with the relevant information
-    return rankedvendors[['product_name', 'rating', 'seller', 'main_category', 'Features', 'avg_similarity_scores', 'final_score', 'rank']].head(10)
+        # Return the page of top vendors with the relevant information
+        return pd.DataFrame({
+            **columns,
+            'avg_similarity_scores': avg_scores[top],
+            'max_similarity_scores': max_scores[top],
+            'similarity_scores': get_similarity_scores(vendor_ids),
+            'final_score': final_scores,
+            'rank': np.arange(offset + 1, offset + len(vendor_ids) + 1),
+        }, index=df.index[vendor_ids])
@@ -1,8 +1,157 @@
-from flask import Flask, request, jsonify
-from VendorQualification.VendorQualifier import get_qualifiedVendors
-from CommonProcessingUtility import get_query
+import os
+import json
+from flask import Flask, request, jsonify, g, Response
+from VendorQualification.VendorQualifier import get_qualifiedVendors, get_qualifiedVendors_batch, SCORERS, VENDOR_FIELDS
+from VendorQualification.VendorCatalog import get_catalog, reload_catalog, get_catalog_embedding_index
+from SimilarityEvaluation.EmbeddingScorer import embed_query
+from VendorQualification.ResultCache import get_result_cache_stats
+from CommonProcessingUtility import get_query, load_nltk_data
+from Instrumentation import start_trace, finish_trace, stage_timer, render_prometheus_metrics
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Responses are then encoded with the standard library
 app = Flask(__name__)
 
+# Vendor dataset the catalog is built from, can be overridden per deployment
+VENDOR_DATA_PATH = os.environ.get('VENDOR_DATA_PATH', "C:\\Users\\naikn\\Downloads\\G2 software product overview.csv")
+
+# Directory the vectorized catalog is persisted in, so restarts memory-map it instead of rebuilding it
+VENDOR_INDEX_PATH = os.environ.get('VENDOR_INDEX_PATH') or None
+
+# Set VENDOR_PRELOAD_EMBEDDINGS=1 when serving the 'embedding' or 'hybrid' scorer: the vendor embeddings and the
+# model are then loaded at boot, otherwise the first hybrid re-ranks exceed their budget and fall back to TF-IDF
+PRELOAD_EMBEDDINGS = os.environ.get('VENDOR_PRELOAD_EMBEDDINGS', '0') == '1'
+
+# Set NLTK_OFFLINE=1 on hosts without network access, NLTK data must then be installed beforehand
+NLTK_OFFLINE = os.environ.get('NLTK_OFFLINE', '0') == '1'
+
+# Largest page of vendors a request can ask for, and how deep pages can go (offset + limit vendors are ranked)
+MAX_PAGE_SIZE = 100
+MAX_PAGE_OFFSET = 10000
+
+# Most queries one batch request can score together
+MAX_BATCH_QUERIES = 100
+
+# Vendor fields returned when a request doesn't list any, the decoded 'Features' have to be asked for
+DEFAULT_RESPONSE_FIELDS = ('product_name', 'rating', 'seller', 'main_category')
+
+# Check NLTK data and warm up WordNet once at startup, never on the request path
+load_nltk_data(offline=NLTK_OFFLINE)
+
+def get_request_params():
+    """
+    Returns the query string parameters of the request, overridden by its JSON body. In the query string
+    'capabilities' is repeated once per capability (?capabilities=a&capabilities=b) and read as a list.
+    """
+    params = request.args.to_dict()
+    if 'capabilities' in request.args:
+        params['capabilities'] = request.args.getlist('capabilities')
+    return {**params, **(request.get_json(silent=True) or {})}
+
+def parse_query(params):
+    """
+    Reads the 'software_category' and 'capabilities' of a query.
+
+    Returns:
+        tuple: (software_category, capabilities), the category stripped.
+
+    Raises:
+        ValueError: If 'software_category' is not a string or 'capabilities' not a list of strings.
+    """
+    software_category = params.get('software_category', '')
+    capabilities = params.get('capabilities', [])
+    if not isinstance(software_category, str):
+        raise ValueError("'software_category' must be a string")
+    if not isinstance(capabilities, list) or not all(isinstance(capability, str) for capability in capabilities):
+        raise ValueError("'capabilities' must be a list of strings")
+    return software_category.strip(), capabilities
+
+def parse_count(params, name, default, maximum):
+    """
+    Reads a non-negative integer request parameter. Query string values are parsed, JSON booleans
+    and fractional numbers are rejected rather than converted.
+
+    Raises:
+        ValueError: If the parameter is not an integer between 0 and `maximum`.
+    """
+    value = params.get(name, default)
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"'{name}' must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"'{name}' must be an integer")
+    if not 0 <= value <= maximum:
+        raise ValueError(f"'{name}' must be between 0 and {maximum}")
+    return value
+
+def parse_fields(value):
+    """
+    Reads the 'fields' request parameter: a list or a comma-separated string of vendor fields, case-insensitive.
+
+    Returns:
+        tuple: Names of VENDOR_FIELDS, DEFAULT_RESPONSE_FIELDS when `value` is None.
+
+    Raises:
+        ValueError: If a field is not one of VENDOR_FIELDS.
+    """
+    if value is None:
+        return DEFAULT_RESPONSE_FIELDS
+    if isinstance(value, str):
+        value = value.split(',')
+    fields_by_name = {field.lower(): field for field in VENDOR_FIELDS}
+    fields = []
+    for name in value:
+        field = fields_by_name.get(str(name).strip().lower())
+        if field is None:
+            raise ValueError(f"'fields' must be some of {', '.join(VENDOR_FIELDS)}")
+        fields.append(field)
+    return tuple(fields)
+
+def decode_features(features):
+    """Parses the raw 'Features' JSON text of a vendor, None when it is empty or invalid."""
+    try:
+        return json.loads(features)
+    except (TypeError, ValueError):
+        return None
+
+def to_records(qualifiedVendors):
+    """Converts qualified vendors to JSON-ready records, column by column, with their 'Features' decoded."""
+    columns = {column: qualifiedVendors[column].tolist() for column in qualifiedVendors.columns}
+    if 'Features' in columns:
+        columns['Features'] = [decode_features(features) for features in columns['Features']]
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+def json_response(payload, status=200):
+    """Encodes a JSON response with orjson when it is installed, much faster than the standard library on large results."""
+    if orjson is not None:
+        body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        body = json.dumps(payload, separators=(',', ':'))
+    return Response(body, status=status, content_type='application/json')
+
+@app.before_request
+def start_request_trace():
+    """Assigns every request a trace id, the caller's X-Request-ID when it sends one."""
+    if request.path != '/metrics':
+        g.trace = start_trace(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def add_trace_header(response):
+    """Returns the trace id of the request in the X-Trace-ID header."""
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Trace-ID'] = trace['trace_id']
+    return response
+
+@app.teardown_request
+def finish_request_trace(exc):
+    """Records the request duration and its profile when it was sampled, also for failed requests."""
+    trace = g.pop('trace', None)
+    if trace is not None:
+        finish_trace(trace)
+
 @app.route('/vendor_qualification', methods=['GET'])
 def vendor_qualification ():
     
@@ -10,30 +159,142 @@ def vendor_qualification ():
     Endpoint to qualify vendors based on similarity to a provided query and filter by software category and capabilities.
     This function processes the incoming request, retrieves the list of qualified vendors, and returns them in a JSON format.
 
-    Request Arguments:
+    Request Arguments (JSON body or query string):
         - software_category (str): The category of software the vendors must belong to.
-        - capabilities (list): A list of capabilities used to refine the query (though not utilized in the current implementation).
+        - capabilities (list): A list of capabilities used to refine the query, repeated in the query string
+          (?capabilities=a&capabilities=b).
+        - scorer (str, optional): 'tfidf' (default), 'embedding' to rank by transformer embeddings or 'hybrid'
+          to re-rank the best TF-IDF vendors by embeddings (its pages stop after the HYBRID_SHORTLIST_SIZE
+          re-ranked vendors).
+        - limit (int, optional): Number of vendors to return, at most MAX_PAGE_SIZE. Defaults to 10.
+        - offset (int, optional): Number of top ranked vendors to skip, to fetch the next pages. Defaults to 0.
+        - fields (list or str, optional): Vendor fields to return, some of 'product_name', 'rating', 'seller',
+          'main_category' and 'Features' (decoded JSON), as a list or comma-separated. Defaults to
+          DEFAULT_RESPONSE_FIELDS, without the features.
 
     Returns:
         JSON Response:
             - 'message': A static message indicating the purpose of the endpoint ('Vendor Qualification').
-            - 'similarity_scores': A list of top 10 qualified vendors, including product name, rating, seller, features, and similarity scores.
+            - 'similarity_scores': The page of qualified vendors, with the requested fields and their similarity scores.
+            - 'limit', 'offset': The page returned.
     """
 
-    data = request.get_json()
-    software_category = data.get('software_category', '').strip()
-    capabilities = data.get('capabilities', [])
+    data = get_request_params()
+    scorer = data.get('scorer', 'tfidf')
+    if scorer not in SCORERS:
+        return jsonify({'error': f"'scorer' must be one of {', '.join(SCORERS)}"}), 400
+    try:
+        software_category, capabilities = parse_query(data)
+        limit = parse_count(data, 'limit', 10, MAX_PAGE_SIZE)
+        offset = parse_count(data, 'offset', 0, MAX_PAGE_OFFSET)
+        fields = parse_fields(data.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     query = get_query(software_category, capabilities)
     
-    qualifiedVendors = get_qualifiedVendors("C:\\Users\\naikn\\Downloads\\G2 software product overview.csv", query, software_category, capabilities)
-    qualifiedVendors_json = qualifiedVendors.to_dict(orient='records')
-    
+    qualifiedVendors = get_qualifiedVendors(VENDOR_DATA_PATH, query, software_category, capabilities, k=limit,
+                                            index_path=VENDOR_INDEX_PATH, scorer=scorer, offset=offset, fields=fields)
+    with stage_timer('serialize'):
+        return json_response({
+            'message': 'Vendor Qualification',
+            'similarity_scores': to_records(qualifiedVendors),
+            'limit': limit,
+            'offset': offset
+        })
+
+@app.route('/vendor_qualification/batch', methods=['POST'])
+def vendor_qualification_batch():
+    """
+    Endpoint to qualify vendors for many software category/capabilities combinations in one call.
+    All queries are scored against the vendor catalog together, which is much cheaper than one call per query.
+
+    Request Arguments:
+        - queries (list): Objects with 'software_category' (str) and 'capabilities' (list), as for /vendor_qualification,
+          at most MAX_BATCH_QUERIES.
+        - k (int, optional): Number of top vendors to return per query, at most MAX_PAGE_SIZE. Defaults to 10.
+        - fields (list or str, optional): Vendor fields to return, as for /vendor_qualification.
+
+    Returns:
+        JSON Response:
+            - 'message': A static message indicating the purpose of the endpoint ('Vendor Qualification').
+            - 'results': One entry per query, in request order, with its 'software_category', 'capabilities'
+              and 'similarity_scores' (the top qualified vendors, as for /vendor_qualification).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'The request body must be a JSON object'}), 400
+    items = data.get('queries', [])
+    if not isinstance(items, list):
+        return jsonify({'error': "'queries' must be a list"}), 400
+    if len(items) > MAX_BATCH_QUERIES:
+        return jsonify({'error': f"'queries' can hold at most {MAX_BATCH_QUERIES} queries"}), 400
+    try:
+        k = parse_count(data, 'k', 10, MAX_PAGE_SIZE)
+        fields = parse_fields(data.get('fields'))
+        queries = []
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                raise ValueError(f"Query {position} must be an object")
+            queries.append(parse_query(item))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = get_qualifiedVendors_batch(VENDOR_DATA_PATH, queries, k=k, index_path=VENDOR_INDEX_PATH, fields=fields)
+
+    with stage_timer('serialize'):
+        return json_response({
+            'message': 'Vendor Qualification',
+            'results': [{
+                'software_category': software_category,
+                'capabilities': capabilities,
+                'similarity_scores': to_records(qualifiedVendors)
+            } for (software_category, capabilities), qualifiedVendors in zip(queries, results)]
+        })
+
+@app.route('/vendor_qualification/reload', methods=['POST'])
+def vendor_qualification_reload():
+    """
+    Endpoint to rebuild the in-memory vendor catalog after the vendor dataset was updated.
+
+    Returns:
+        JSON Response:
+            - 'message': A static message ('Vendor catalog reloaded').
+            - 'version': Version number of the newly built catalog.
+            - 'vendors': Number of vendors in the catalog.
+    """
+    catalog = reload_catalog(VENDOR_DATA_PATH, VENDOR_INDEX_PATH)
+
     return jsonify({
-        'message': 'Vendor Qualification',
-        'similarity_scores': qualifiedVendors_json
+        'message': 'Vendor catalog reloaded',
+        'version': catalog['version'],
+        'vendors': len(catalog['df'])
     })
 
+@app.route('/vendor_qualification/cache', methods=['GET'])
+def vendor_qualification_cache():
+    """
+    Endpoint exposing the statistics of the qualification result cache.
+
+    Returns:
+        JSON Response: 'hits', 'misses', 'evictions', 'expirations', 'invalidations', 'size', 'max_size'
+        and 'catalog_version' of the cache.
+    """
+    return jsonify(get_result_cache_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint exposing the pipeline metrics in the Prometheus text format: latency histograms per stage
+    (load_data, preprocess, vectorize, score, rerank, filter, rank, serialize and the whole request) and the
+    counters of requests, scanned vendors, scored features and result cache hits and misses.
+    """
+    return Response(render_prometheus_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 if __name__ == '__main__':
+    # Build the catalog once at boot so the first request doesn't pay for it
+    catalog = get_catalog(VENDOR_DATA_PATH, VENDOR_INDEX_PATH)
+    if PRELOAD_EMBEDDINGS:
+        embed_query('', get_catalog_embedding_index(catalog))
     app.run(debug=True)
@@ -1,17 +1,51 @@
+import os
+import threading
 import pymongo
 
-def get_mongo_client(mongo_uri):
-    """Returns a MongoDB client connected to the given URI."""
+# Maximum number of connections of the shared client, per MongoDB server
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+
+# Process-wide clients by URI. A MongoClient is thread-safe and pools its connections,
+# so one per process is shared instead of connecting on every call.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_mongo_client(mongo_uri, max_pool_size=None):
+    """Returns a new MongoDB client connected to the given URI."""
     try:
-        client = pymongo.MongoClient(mongo_uri)
+        client = pymongo.MongoClient(mongo_uri, maxPoolSize=max_pool_size or MONGO_MAX_POOL_SIZE)
         return client
-    except pymongo.errors.ConnectionError as e:
+    except pymongo.errors.PyMongoError as e:
         print(f"Error connecting to MongoDB: {e}")
         return None
 
+def get_pooled_client(mongo_uri, max_pool_size=None):
+    """Returns the shared MongoDB client for the given URI, created on first use. Callers must not close it."""
+    client = _clients.get(mongo_uri)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(mongo_uri)
+            if client is None:
+                client = get_mongo_client(mongo_uri, max_pool_size)
+                if client is not None:
+                    _clients[mongo_uri] = client
+    return client
+
+def set_pooled_client(mongo_uri, client):
+    """Registers the client to share for the given URI, e.g. a mongomock client in tests."""
+    with _clients_lock:
+        _clients[mongo_uri] = client
+
+def close_pooled_clients():
+    """Closes every shared MongoDB client."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
 def get_db(client, db_name):
     """Returns the database instance."""
-    if client:
+    if client is not None:
         return client[db_name]
     else:
         print("No client available, returning None")
@@ -19,7 +53,7 @@ def get_db(client, db_name):
 
 def get_collection(db, collection_name):
     """Returns the collection instance."""
-    if db:
+    if db is not None:
         return db[collection_name]
     else:
         print(f"Database {db} not found, returning None")
@@ -0,0 +1,33 @@
+import nltk
+import pytest
+from CommonProcessingUtility import NLTK_RESOURCES
+from Benchmarks.CatalogGenerator import generate_catalog, write_catalog
+
+# Generated catalogs the tests run on, small enough for the per-row pipeline
+TEST_CATALOG_SIZE = 300
+TEST_CATALOG_SEED = 7
+
+def has_nltk_data():
+    """Returns whether the NLTK data of text preprocessing is installed, the tests never download it."""
+    try:
+        for resource_path in NLTK_RESOURCES.values():
+            nltk.data.find(resource_path)
+    except LookupError:
+        return False
+    return True
+
+@pytest.fixture(scope='session')
+def nltk_data():
+    """Skips tests that preprocess text when the NLTK data isn't installed."""
+    if not has_nltk_data():
+        pytest.skip(f"NLTK data {', '.join(NLTK_RESOURCES)} is not installed")
+
+@pytest.fixture(scope='session')
+def vendors(nltk_data):
+    """A generated vendor catalog, indexed by vendor id, with a few vendors having invalid 'Features'."""
+    return generate_catalog(TEST_CATALOG_SIZE, TEST_CATALOG_SEED)
+
+@pytest.fixture(scope='session')
+def catalog_path(nltk_data, tmp_path_factory):
+    """The CSV file of the generated catalog, as read by `VendorCatalog.get_catalog`."""
+    return write_catalog(str(tmp_path_factory.mktemp('catalog') / 'vendors.csv'), TEST_CATALOG_SIZE, TEST_CATALOG_SEED)
@@ -0,0 +1,82 @@
+import pytest
+
+@pytest.fixture
+def client(catalog_path, monkeypatch):
+    import app
+    monkeypatch.setattr(app, 'VENDOR_DATA_PATH', catalog_path)
+    return app.app.test_client()
+
+def test_batch_matches_single_endpoint(client):
+    queries = [{'software_category': 'HR Software', 'capabilities': ['billing account']},
+               {'software_category': 'analytics', 'capabilities': ['payment role']},
+               {'software_category': 'No Such Category'}]
+    response = client.post('/vendor_qualification/batch', json={'queries': queries, 'k': 3})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert len(results) == len(queries)
+    for query, result in zip(queries, results):
+        single = client.get('/vendor_qualification', json={**query, 'limit': 3})
+        assert result['similarity_scores'] == single.get_json()['similarity_scores']
+    assert results[0]['similarity_scores']
+
+@pytest.mark.parametrize('body', [
+    [],
+    {'queries': 'CRM Software'},
+    {'queries': ['CRM Software']},
+    {'queries': [{'software_category': 1}]},
+    {'queries': [{'software_category': 'CRM Software', 'capabilities': 'lead pipeline'}]},
+    {'queries': [{'software_category': 'CRM Software'}], 'k': 1000},
+    {'queries': [{'software_category': 'CRM Software'}], 'k': True},
+    {'queries': [{'software_category': 'CRM Software'}], 'k': 2.5},
+    {'queries': [{'software_category': 'CRM Software'}], 'fields': ['price']},
+])
+def test_batch_rejects_invalid_requests(client, body):
+    assert client.post('/vendor_qualification/batch', json=body).status_code == 400
+
+def test_batch_caps_the_number_of_queries(client):
+    import app
+    queries = [{'software_category': 'CRM Software'}] * (app.MAX_BATCH_QUERIES + 1)
+    assert client.post('/vendor_qualification/batch', json={'queries': queries}).status_code == 400
+
+def test_pages_follow_each_other(client):
+    query = {'software_category': 'accounting', 'capabilities': ['approval pipeline', 'storage export']}
+    first = client.get('/vendor_qualification', json={**query, 'limit': 6}).get_json()
+    second = client.get('/vendor_qualification', json={**query, 'limit': 3, 'offset': 3}).get_json()
+
+    assert (second['limit'], second['offset']) == (3, 3)
+    assert second['similarity_scores'] == first['similarity_scores'][3:]
+    assert [vendor['rank'] for vendor in second['similarity_scores']] == [4, 5, 6]
+
+def test_query_string_capabilities_are_a_list(client):
+    from_query_string = client.get('/vendor_qualification?software_category=accounting'
+                                   '&capabilities=approval+pipeline&capabilities=storage+export&limit=3')
+    from_body = client.get('/vendor_qualification', json={
+        'software_category': 'accounting', 'capabilities': ['approval pipeline', 'storage export'], 'limit': 3})
+
+    assert from_query_string.status_code == 200
+    assert from_query_string.get_json()['similarity_scores'] == from_body.get_json()['similarity_scores']
+
+def test_fields_select_the_returned_fields(client):
+    response = client.get('/vendor_qualification?software_category=accounting&capabilities=approval+pipeline'
+                          '&fields=product_name,Features&limit=2')
+
+    vendors = response.get_json()['similarity_scores']
+    assert vendors and all({'product_name', 'Features'} <= vendor.keys() and 'seller' not in vendor for vendor in vendors)
+    assert all(isinstance(vendor['Features'], list) for vendor in vendors)
+
+@pytest.mark.parametrize('params', [
+    {'software_category': 'accounting', 'capabilities': 'approval pipeline'},
+    {'software_category': 'accounting', 'capabilities': [1]},
+    {'software_category': ['accounting']},
+    {'software_category': 'accounting', 'limit': 1000},
+    {'software_category': 'accounting', 'limit': 'ten'},
+    {'software_category': 'accounting', 'limit': True},
+    {'software_category': 'accounting', 'limit': 2.5},
+    {'software_category': 'accounting', 'offset': False},
+    {'software_category': 'accounting', 'offset': -1},
+    {'software_category': 'accounting', 'fields': 'product_name,price'},
+    {'software_category': 'accounting', 'scorer': 'bm25'},
+])
+def test_rejects_invalid_requests(client, params):
+    assert client.get('/vendor_qualification', json=params).status_code == 400
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Benchmarks.CatalogGenerator import MAIN_CATEGORIES
+from VendorQualification.CategoryIndex import build_category_index, find_category_vendors
+
+MAIN_CATEGORY_VALUES = pd.Series(
+    MAIN_CATEGORIES * 3 + [np.nan, 'crm software', 'Point-of-Sale Software', 'Software', 'A/B Testing (Web)'])
+
+@pytest.mark.parametrize('software_category', [
+    '', 'crm', 'CRM Software', 'ware', 'software', 'accounting & finance', 'Accounting & Finance Software',
+    'e-commerce', 'm soft', 'point-of', 'a/b testing (web)', '(web)', 'Sales Soft', 'ales', ' ', '&', 'unknown',
+])
+def test_category_index_matches_str_contains(software_category):
+    category_index = build_category_index(MAIN_CATEGORY_VALUES)
+
+    expected = np.flatnonzero(MAIN_CATEGORY_VALUES.str.contains(software_category, case=False, na=False, regex=False))
+    assert np.array_equal(find_category_vendors(category_index, software_category), expected)
+    # Memoized lookups return the same vendors
+    assert np.array_equal(find_category_vendors(category_index, software_category), expected)
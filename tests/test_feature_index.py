@@ -0,0 +1,75 @@
+import io
+import contextlib
+import numpy as np
+import pandas as pd
+import pytest
+from CommonProcessingUtility import get_query
+from Vectorization.FullDataVectorizer import generate_tfidf_per_row, build_feature_index
+from Vectorization.FeatureTable import flatten_feature_shard
+from Vectorization.VectorizerUtility import save_feature_index, load_feature_index
+from SimilarityEvaluation.SimilarityEvaluator import calculate_similarity, calculate_feature_similarity_batch,\
+      get_query_feature_scores, get_feature_similarity_scores, get_term_postings
+
+QUERIES = [
+    get_query('CRM Software', ['lead pipeline', 'contact management']),
+    get_query('Analytics Software', ['dashboard reporting']),
+    get_query('HR Software', []),
+]
+
+def test_shared_index_matches_per_feature_vectorizers(vendors):
+    sample = vendors.iloc[:60].copy()
+    feature_index = build_feature_index(sample)
+
+    scores = calculate_feature_similarity_batch(QUERIES, feature_index)
+    for position, query in enumerate(QUERIES):
+        # The per-row pipeline prints its errors per vendor
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = calculate_similarity(query, generate_tfidf_per_row(sample.copy()))['similarity_scores']
+
+        feature_rows, feature_scores = get_query_feature_scores(scores, position)
+        found = get_feature_similarity_scores(feature_rows, feature_scores, feature_index, sample.index)
+
+        assert len(found) == len(expected)
+        for vendor_scores, expected_scores in zip(found, expected):
+            assert vendor_scores.keys() == expected_scores.keys()
+            for name, score in expected_scores.items():
+                assert vendor_scores[name] == pytest.approx(score, abs=1e-5)
+
+@pytest.mark.parametrize('workers, chunk_size', [(2, 17), (3, 1)])
+def test_feature_index_is_the_same_for_any_worker_count(vendors, workers, chunk_size):
+    expected = build_feature_index(vendors, workers=1)
+    found = build_feature_index(vendors, workers=workers, chunk_size=chunk_size)
+
+    for name in ('data', 'indices', 'indptr'):
+        assert np.array_equal(getattr(found['matrix'], name), getattr(expected['matrix'], name))
+    assert np.array_equal(found['feature_vendor'], expected['feature_vendor'])
+    assert np.array_equal(found['vendor_offsets'], expected['vendor_offsets'])
+    assert list(found['feature_names']) == list(expected['feature_names'])
+    assert list(found['vectorizer'].get_feature_names_out()) == list(expected['vectorizer'].get_feature_names_out())
+
+def test_features_of_another_shape_are_reported_as_errors(nltk_data):
+    valid = '[{"Category": "Sales", "features": [{"name": "Pipeline", "description": "lead pipeline"}]}]'
+    invalid = ['null', '{}', '"text"', '[1]', '[{"features": "text"}]', '[{"features": [null]}]',
+               '[{"features": [{"name": 5}]}]', '{"features": [}']
+    df = pd.DataFrame({'Features': [valid] + invalid, 'main_category': 'CRM Software'}, index=np.arange(10, 19))
+
+    table, errors = flatten_feature_shard(df)
+
+    assert [idx for idx, _ in errors] == list(range(11, 19))
+    assert np.array_equal(table['invalid_vendors'], np.arange(11, 19))
+    assert np.array_equal(table['feature_vendor'], [10])
+    assert list(table['names']) == ['Pipeline']
+
+def test_saved_index_memory_maps_its_postings(vendors, tmp_path):
+    feature_index = build_feature_index(vendors)
+    expected = calculate_feature_similarity_batch(QUERIES, feature_index)
+    save_feature_index(feature_index, str(tmp_path / 'index'))
+
+    loaded, _, _ = load_feature_index(str(tmp_path / 'index'))
+    postings = get_term_postings(loaded)
+    for name in ('data', 'indices', 'indptr'):
+        assert isinstance(getattr(postings, name), np.memmap)
+        assert np.array_equal(getattr(postings, name), getattr(get_term_postings(feature_index), name))
+
+    found = calculate_feature_similarity_batch(QUERIES, loaded)
+    assert abs(found - expected).max() == 0
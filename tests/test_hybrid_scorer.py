@@ -0,0 +1,103 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import VendorQualification.VendorQualifier as VendorQualifier
+from CommonProcessingUtility import get_query
+from VendorQualification.ResultCache import clear_result_cache
+from Instrumentation import get_metrics_snapshot
+
+SOFTWARE_CATEGORY, CAPABILITIES = 'accounting', ['approval pipeline', 'storage export']
+SHORTLIST_SIZE = 12
+
+def qualify(catalog_path, scorer='hybrid', **kwargs):
+    kwargs.setdefault('use_cache', False)
+    if scorer == 'hybrid':
+        kwargs.setdefault('shortlist_size', SHORTLIST_SIZE)
+    return VendorQualifier.get_qualifiedVendors(catalog_path, get_query(SOFTWARE_CATEGORY, CAPABILITIES),
+                                                SOFTWARE_CATEGORY, CAPABILITIES, scorer=scorer, **kwargs)
+
+def get_counter(name):
+    return get_metrics_snapshot()['counters'].get(name, 0)
+
+def fast_rerank(catalog, query, vendor_ids):
+    """Scores vendors by the reverse of their id, an order unrelated to TF-IDF."""
+    return (1.0 - vendor_ids / (len(catalog['df']) + 1)).astype(np.float32)
+
+@pytest.fixture
+def release_rerank():
+    """An event slow re-rank stubs wait on, set once the test is done so their slots are freed."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    clear_result_cache()
+    yield
+    clear_result_cache()
+
+def test_rerank_orders_the_tfidf_shortlist(catalog_path, monkeypatch):
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', fast_rerank)
+    # The shortlist is the top of the TF-IDF similarity alone
+    shortlist = qualify(catalog_path, 'tfidf', k=SHORTLIST_SIZE, prequalify=False, weight_similarity=1,
+                        weight_rating=0)
+    hybrid = qualify(catalog_path, k=SHORTLIST_SIZE, prequalify=False)
+
+    assert set(hybrid.index) == set(shortlist.index)
+    assert not hybrid.index.equals(shortlist.index)
+    expected_scores = fast_rerank(VendorQualifier.get_catalog(catalog_path), None, hybrid.index.to_numpy())
+    assert np.allclose(hybrid['avg_similarity_scores'], expected_scores)
+    assert hybrid['rank'].tolist() == list(range(1, SHORTLIST_SIZE + 1))
+
+def test_pages_are_taken_within_the_shortlist(catalog_path, monkeypatch):
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', fast_rerank)
+    ranking = qualify(catalog_path, k=SHORTLIST_SIZE)
+
+    for offset, k in ((0, 5), (5, 5), (10, 5)):
+        pd.testing.assert_frame_equal(qualify(catalog_path, k=k, offset=offset), ranking.iloc[offset:offset + k])
+    assert qualify(catalog_path, k=5, offset=SHORTLIST_SIZE).empty
+
+def test_timeout_falls_back_to_tfidf_and_is_not_cached(catalog_path, monkeypatch, release_rerank):
+    def slow_rerank(catalog, query, vendor_ids):
+        release_rerank.wait(10)
+        return fast_rerank(catalog, query, vendor_ids)
+
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', slow_rerank)
+    timeouts = get_counter('rerank_timeouts')
+    fallback = qualify(catalog_path, use_cache=True, rerank_timeout=0.05)
+
+    assert get_counter('rerank_timeouts') == timeouts + 1
+    pd.testing.assert_frame_equal(fallback, qualify(catalog_path, 'tfidf'))
+
+    # The fallback wasn't cached, the same request is re-ranked once the re-rank is fast again
+    release_rerank.set()
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', fast_rerank)
+    reranked = qualify(catalog_path, use_cache=True)
+    pd.testing.assert_frame_equal(reranked, qualify(catalog_path))
+    assert not reranked.equals(fallback)
+
+def test_rerank_is_skipped_when_every_slot_is_busy(catalog_path, monkeypatch):
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', fast_rerank)
+    skipped = get_counter('rerank_skipped')
+    for _ in range(VendorQualifier.HYBRID_RERANK_WORKERS):
+        VendorQualifier._rerank_slots.acquire()
+    try:
+        result = qualify(catalog_path)
+    finally:
+        for _ in range(VendorQualifier.HYBRID_RERANK_WORKERS):
+            VendorQualifier._rerank_slots.release()
+
+    assert get_counter('rerank_skipped') == skipped + 1
+    pd.testing.assert_frame_equal(result, qualify(catalog_path, 'tfidf'))
+
+def test_failed_rerank_falls_back_to_tfidf(catalog_path, monkeypatch):
+    def failing_rerank(catalog, query, vendor_ids):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(VendorQualifier, 'rerank_vendors', failing_rerank)
+    errors = get_counter('rerank_errors')
+    result = qualify(catalog_path)
+
+    assert get_counter('rerank_errors') == errors + 1
+    pd.testing.assert_frame_equal(result, qualify(catalog_path, 'tfidf'))
@@ -0,0 +1,30 @@
+import json
+import numpy as np
+import pandas as pd
+from Vectorization.FullDataVectorizer import build_feature_index
+from Vectorization.IncrementalIndexer import fingerprint_vendors, update_feature_index
+
+def assert_same_feature_index(found, expected):
+    assert np.array_equal(found['vendor_offsets'], expected['vendor_offsets'])
+    assert np.array_equal(found['feature_vendor'], expected['feature_vendor'])
+    assert list(found['feature_names']) == list(expected['feature_names'])
+    assert list(found['vectorizer'].get_feature_names_out()) == list(expected['vectorizer'].get_feature_names_out())
+    assert found['matrix'].shape == expected['matrix'].shape
+    assert abs(found['matrix'] - expected['matrix']).max() <= 1e-6
+
+def test_incremental_reindex_matches_full_rebuild(vendors):
+    old = vendors.iloc[:200].reset_index(drop=True)
+    old_index = build_feature_index(old)
+
+    # Remove vendors, change one's features and another's rating, add a vendor in the middle
+    new = old.drop(index=[3, 50, 51]).reset_index(drop=True)
+    new.loc[10, 'Features'] = json.dumps([{'Category': 'New', 'features': [
+        {'name': 'Zebra', 'description': 'zebra quokka budget forecasting'}]}])
+    new.loc[11, 'rating'] = 1.0
+    added = vendors.iloc[[250]]
+    new = pd.concat([new.iloc[:100], added, new.iloc[100:]], ignore_index=True)
+
+    feature_index, reindexed = update_feature_index(old_index, fingerprint_vendors(old), new, fingerprint_vendors(new))
+
+    assert reindexed == 3
+    assert_same_feature_index(feature_index, build_feature_index(new))
@@ -0,0 +1,68 @@
+import pytest
+import Instrumentation
+from Instrumentation import LATENCY_BUCKETS, METRICS_PREFIX, observe_stage, increment_counter, stage_timer, \
+    get_metrics_snapshot, reset_metrics, render_prometheus_metrics, trace_request
+
+@pytest.fixture(autouse=True)
+def metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+def test_durations_fall_in_the_first_bucket_they_fit():
+    # On a bound, just above it, below the first one and above the last one
+    for seconds in (LATENCY_BUCKETS[0], LATENCY_BUCKETS[3] * 1.01, 0.0, LATENCY_BUCKETS[-1] * 2):
+        observe_stage('score', seconds)
+
+    histogram = get_metrics_snapshot()['stages']['score']
+    expected = [0] * len(LATENCY_BUCKETS)
+    expected[0] = 2
+    expected[4] = 1
+    assert histogram['buckets'] == expected
+    assert histogram['count'] == 4
+    assert histogram['sum'] == pytest.approx(LATENCY_BUCKETS[0] + LATENCY_BUCKETS[3] * 1.01 + LATENCY_BUCKETS[-1] * 2)
+
+def test_prometheus_buckets_are_cumulative():
+    for seconds in (0.0001, 0.003, 0.003, 0.2, 60.0):
+        observe_stage('rank', seconds)
+    observe_stage('custom', 0.01)
+    observe_stage('load_data', 0.01)
+    increment_counter('cache_hits', 3)
+
+    lines = render_prometheus_metrics().splitlines()
+    name = f"{METRICS_PREFIX}_stage_seconds"
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines if line.startswith(f'{name}_bucket{{stage="rank"')]
+    assert len(buckets) == len(LATENCY_BUCKETS) + 1
+    assert buckets == sorted(buckets)
+    assert buckets[LATENCY_BUCKETS.index(0.0005)] == 1
+    assert buckets[LATENCY_BUCKETS.index(0.005)] == 3
+    assert buckets[LATENCY_BUCKETS.index(0.25)] == 4
+    assert buckets[-2:] == [4, 5]
+    assert f'{name}_bucket{{stage="rank",le="+Inf"}} 5' in lines
+    assert f'{name}_count{{stage="rank"}} 5' in lines
+    assert f"{METRICS_PREFIX}_cache_hits_total 3" in lines
+
+    # Pipeline stages come first in their STAGES order, then the others
+    stages = [line.split('"')[1] for line in lines if line.startswith(f'{name}_count')]
+    assert stages == ['load_data', 'rank', 'custom']
+
+def test_metrics_endpoint_serves_the_prometheus_format(nltk_data):
+    import app
+    observe_stage('score', 0.01)
+    response = app.app.test_client().get('/metrics')
+
+    assert response.status_code == 200
+    assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
+    assert response.get_data(as_text=True) == render_prometheus_metrics()
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(Instrumentation, 'METRICS_ENABLED', False)
+    observe_stage('score', 0.01)
+    increment_counter('cache_hits')
+    with stage_timer('rank'):
+        pass
+    with trace_request(profile=False):
+        pass
+
+    assert get_metrics_snapshot() == {'stages': {}, 'counters': {}}
+    assert stage_timer('rank') is stage_timer('score')
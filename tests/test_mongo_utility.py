@@ -0,0 +1,70 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+import MongoUtility
+from mongodbConnectio import set_pooled_client, close_pooled_clients
+from MongoUtility import sync_vendor_delta_mongo, fetch_feature_index_mongodb
+from Vectorization.FullDataVectorizer import build_feature_index
+from Vectorization.IncrementalIndexer import fingerprint_vendors, diff_vendor_fingerprints
+
+mongomock = pytest.importorskip('mongomock')
+
+@pytest.fixture
+def mongo_client():
+    """Shares a mongomock client for MongoUtility.MONGO_URI instead of connecting to a server."""
+    client = mongomock.MongoClient()
+    set_pooled_client(MongoUtility.MONGO_URI, client)
+    yield client
+    close_pooled_clients()
+
+def sync(old, new):
+    """Syncs the changes from `old` to `new` (two vendor DataFrames) and returns the feature index of `new`."""
+    old_fingerprints, fingerprints = fingerprint_vendors(old), fingerprint_vendors(new)
+    changes = diff_vendor_fingerprints(old['product_name'], old_fingerprints, new['product_name'], fingerprints)
+    feature_index = build_feature_index(new)
+    sync_vendor_delta_mongo(new, feature_index, fingerprints, changes, batch_size=40)
+    return feature_index
+
+def assert_fetched(expected):
+    """Fetches the synced vendors and checks them against a fresh build over `expected`, in the fetched order."""
+    df, feature_index = fetch_feature_index_mongodb(batch_size=25)
+    expected = expected.set_index('product_name').loc[df['product_name']].reset_index()
+    expected_index = build_feature_index(expected)
+
+    for field in ('product_name', 'seller', 'main_category', 'Features'):
+        assert df[field].tolist() == expected[field].tolist()
+    assert np.allclose(df['rating'].astype(float), expected['rating'].astype(float), equal_nan=True)
+
+    assert np.array_equal(feature_index['vendor_offsets'], expected_index['vendor_offsets'])
+    assert np.array_equal(feature_index['feature_vendor'], expected_index['feature_vendor'])
+    assert list(feature_index['feature_names']) == list(expected_index['feature_names'])
+    assert list(feature_index['vectorizer'].get_feature_names_out()) == \
+        list(expected_index['vectorizer'].get_feature_names_out())
+    assert feature_index['matrix'].shape == expected_index['matrix'].shape
+    assert abs(feature_index['matrix'] - expected_index['matrix']).max() == 0
+
+def test_synced_catalog_is_fetched_back_exactly(vendors, mongo_client):
+    catalog = vendors.iloc[:80].reset_index(drop=True)
+    sync(catalog.iloc[:0], catalog)
+
+    assert mongo_client[MongoUtility.DB_NAME][MongoUtility.COLLECTION_NAME].count_documents({}) == len(catalog)
+    assert_fetched(catalog)
+
+def test_delta_sync_tombstones_removed_and_updates_changed_vendors(vendors, mongo_client):
+    old = vendors.iloc[:80].reset_index(drop=True)
+    sync(old.iloc[:0], old)
+
+    # Remove vendors, change one's features and another's rating, add a vendor
+    new = old.drop(index=[3, 50, 51]).reset_index(drop=True)
+    new.loc[10, 'Features'] = json.dumps([{'Category': 'New', 'features': [
+        {'name': 'Zebra', 'description': 'zebra quokka budget forecasting'}]}])
+    new.loc[11, 'rating'] = 1.0
+    new = pd.concat([new, vendors.iloc[[250]]], ignore_index=True)
+    sync(old, new)
+
+    collection = mongo_client[MongoUtility.DB_NAME][MongoUtility.COLLECTION_NAME]
+    removed = old['product_name'].iloc[[3, 50, 51]].tolist()
+    assert sorted(doc['product_name'] for doc in collection.find({'deleted': True})) == sorted(removed)
+    assert collection.count_documents({}) == len(old) + 1
+    assert_fetched(new)
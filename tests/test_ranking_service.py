@@ -0,0 +1,32 @@
+import numpy as np
+from RankingService import rank_top_vendors
+
+def test_top_k_is_a_prefix_of_larger_tops_with_tied_scores():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        similarity_scores = rng.choice([0.3, 0.5, 0.7], size=200)
+        ratings = rng.choice([3.0, 4.0, 5.0], size=200)
+
+        ranking, scores = rank_top_vendors(similarity_scores, ratings, k=200)
+        for k in (10, 20, 35):
+            top, top_scores = rank_top_vendors(similarity_scores, ratings, k=k)
+            assert np.array_equal(top, ranking[:k])
+            assert np.array_equal(top_scores, scores[:k])
+
+        # Ties are ranked by position, after the score
+        assert np.all(np.diff(scores) <= 0)
+        tied = scores[1:] == scores[:-1]
+        assert np.all(ranking[1:][tied] > ranking[:-1][tied])
+
+def test_pages_never_repeat_a_vendor_with_tied_scores():
+    similarity_scores = np.full(50, 0.5)
+    ratings = np.full(50, 4.0)
+
+    first, _ = rank_top_vendors(similarity_scores, ratings, k=10)
+    second, _ = rank_top_vendors(similarity_scores, ratings, k=20)
+    assert np.array_equal(first, np.arange(10))
+    assert not set(first) & set(second[10:])
+
+def test_prequalified_vendors_come_first():
+    top, _ = rank_top_vendors([0.9, 0.2, 0.5], [5, 1, 3], k=2, prequalified=np.array([False, True, False]))
+    assert top.tolist() == [1, 0]
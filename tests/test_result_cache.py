@@ -0,0 +1,55 @@
+import types
+import pytest
+import VendorQualification.ResultCache as ResultCache
+from VendorQualification.ResultCache import get_cached_result, store_result, get_result_cache_stats, clear_result_cache
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Empties the cache and replaces its clock with one the test moves forward."""
+    clear_result_cache()
+    now = [1000.0]
+    monkeypatch.setattr(ResultCache, 'time', types.SimpleNamespace(monotonic=lambda: now[0]))
+    yield now
+    clear_result_cache()
+
+def test_reloaded_catalog_invalidates_every_result():
+    assert get_cached_result('a', 1) is None
+    store_result('a', 1, 'result a')
+    assert get_cached_result('a', 1) == 'result a'
+
+    assert get_cached_result('a', 2) is None
+    assert get_result_cache_stats()['invalidations'] == 1
+    assert get_result_cache_stats()['size'] == 0
+
+    # A result computed on the previous version is not stored
+    store_result('a', 1, 'stale result')
+    assert get_cached_result('a', 2) is None
+    store_result('a', 2, 'result a2')
+    assert get_cached_result('a', 2) == 'result a2'
+
+def test_results_expire_after_the_ttl(clock):
+    get_cached_result('a', 1)
+    store_result('a', 1, 'result a')
+
+    clock[0] += ResultCache.RESULT_CACHE_TTL - 1
+    assert get_cached_result('a', 1) == 'result a'
+    clock[0] += 1
+    assert get_cached_result('a', 1) is None
+
+    stats = get_result_cache_stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 2, 1, 0)
+
+def test_least_recently_used_result_is_evicted(monkeypatch):
+    monkeypatch.setattr(ResultCache, 'RESULT_CACHE_SIZE', 3)
+    get_cached_result('a', 1)
+    for key in ('a', 'b', 'c'):
+        store_result(key, 1, f"result {key}")
+
+    # Using 'a' makes 'b' the least recently used
+    assert get_cached_result('a', 1) == 'result a'
+    store_result('d', 1, 'result d')
+
+    assert get_cached_result('b', 1) is None
+    assert [get_cached_result(key, 1) for key in ('a', 'c', 'd')] == ['result a', 'result c', 'result d']
+    stats = get_result_cache_stats()
+    assert (stats['evictions'], stats['size'], stats['max_size']) == (1, 3, 3)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from SimilarityEvaluation.VectorRetrieval import build_retrieval_index, search_retrieval_index, \
+    save_retrieval_index, load_retrieval_index, evaluate_recall
+
+def random_vectors(count, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+@pytest.fixture(scope='module')
+def embeddings():
+    return random_vectors(2000)
+
+@pytest.fixture(scope='module')
+def queries():
+    return random_vectors(20, seed=1)
+
+def test_ivf_probing_every_list_is_exact(embeddings, queries):
+    retrieval_index = build_retrieval_index(embeddings, backend='ivf', n_lists=40)
+    evaluation = evaluate_recall(embeddings, queries, retrieval_index, k=10, n_probe=40)
+    assert evaluation['recall_at_k'] == 1.0
+
+    allowed_ids = np.arange(0, len(embeddings), 7)
+    evaluation = evaluate_recall(embeddings, queries, retrieval_index, k=10, allowed_ids=allowed_ids, n_probe=40)
+    assert evaluation['recall_at_k'] == 1.0
+
+@pytest.mark.parametrize('backend', ['exact', 'ivf', 'hnsw'])
+def test_results_come_from_the_allowed_rows(embeddings, queries, backend):
+    if backend == 'hnsw':
+        pytest.importorskip('hnswlib')
+    retrieval_index = build_retrieval_index(embeddings, backend=backend, n_lists=40)
+
+    # A small allowed set also exercises the IVF probe widening and the HNSW brute-force fallback
+    for allowed_ids in (np.arange(3, len(embeddings), 5), np.array([11, 500, 1999])):
+        for query in queries:
+            rows, scores = search_retrieval_index(retrieval_index, embeddings, query, 10, allowed_ids, n_probe=2)
+            assert len(rows) == min(10, len(allowed_ids))
+            assert np.isin(rows, allowed_ids).all()
+            assert np.all(np.diff(scores) <= 0)
+
+@pytest.mark.parametrize('backend', ['ivf', 'hnsw'])
+def test_saved_index_gives_the_same_results(embeddings, queries, tmp_path, backend):
+    if backend == 'hnsw':
+        pytest.importorskip('hnswlib')
+    retrieval_index = build_retrieval_index(embeddings, backend=backend, n_lists=40)
+    save_retrieval_index(retrieval_index, str(tmp_path / 'retrieval'), source={'data': 'test'})
+    loaded_index, source = load_retrieval_index(str(tmp_path / 'retrieval'))
+
+    assert source == {'data': 'test'}
+    assert loaded_index['backend'] == backend
+    for query in queries:
+        rows, scores = search_retrieval_index(retrieval_index, embeddings, query, 10)
+        loaded_rows, loaded_scores = search_retrieval_index(loaded_index, embeddings, query, 10)
+        assert np.array_equal(rows, loaded_rows)
+        assert np.array_equal(scores, loaded_scores)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import scipy.sparse as sp
+from Vectorization.VectorStore import VECTOR_DTYPE, VECTOR_INDEX_DTYPE, as_vector_matrix, encode_vector_block, \
+    decode_vector_block, get_vendor_vectors
+
+def random_vectors(rows, columns, density, seed=0):
+    matrix = sp.random(rows, columns, density=density, format='csr', random_state=seed, dtype=np.float64)
+    # Leave some rows without any weight
+    matrix = sp.csr_matrix(sp.diags((np.arange(rows) % 3 != 1).astype(np.float64)) @ matrix)
+    matrix.eliminate_zeros()
+    return as_vector_matrix(matrix)
+
+def assert_same_vectors(found, expected):
+    assert found.shape == expected.shape
+    assert found.data.dtype == VECTOR_DTYPE and found.indices.dtype == VECTOR_INDEX_DTYPE
+    for name in ('data', 'indices', 'indptr'):
+        assert np.array_equal(getattr(found, name), getattr(expected, name))
+
+@pytest.mark.parametrize('matrix', [
+    random_vectors(30, 50, 0.1),
+    sp.csr_matrix((4, 7), dtype=np.float32),
+    sp.csr_matrix((0, 7), dtype=np.float32),
+    np.array([[0.0, 0.5, 0.0], [0.0, 0.0, 0.0]]),
+])
+def test_vector_blocks_round_trip(matrix):
+    expected = as_vector_matrix(matrix)
+    block = encode_vector_block(matrix)
+    vectors = decode_vector_block(block)
+
+    assert_same_vectors(vectors, expected)
+    assert np.shares_memory(vectors.indptr, np.frombuffer(block, dtype=np.uint8))
+    assert not vectors.data.flags.writeable
+
+def test_damaged_vector_blocks_are_rejected():
+    block = encode_vector_block(random_vectors(10, 20, 0.2))
+
+    for damaged in (block[:-1], block[:10], b'', block + b'\0', b'VSB0' + block[4:]):
+        with pytest.raises(ValueError):
+            decode_vector_block(damaged)
+
+def test_vendor_vectors_are_views_of_the_index():
+    matrix = random_vectors(12, 40, 0.3)
+    feature_index = {'matrix': matrix, 'vendor_offsets': np.array([0, 5, 5, 12])}
+
+    for vendor, (first, last) in enumerate([(0, 5), (5, 5), (5, 12)]):
+        vectors = get_vendor_vectors(feature_index, vendor)
+        assert_same_vectors(vectors, matrix[first:last])
+        if vectors.nnz:
+            assert np.shares_memory(vectors.data, matrix.data)
+            assert np.shares_memory(vectors.indices, matrix.indices)
@@ -0,0 +1,59 @@
+import os
+import threading
+import numpy as np
+import pytest
+import VendorQualification.VendorCatalog as VendorCatalog
+
+def test_embedding_build_does_not_block_catalog_loads(catalog_path, monkeypatch):
+    catalog = VendorCatalog.get_catalog(catalog_path)
+    building, release = threading.Event(), threading.Event()
+    builds = []
+
+    def slow_build(df, embedding_path=None, source=None):
+        builds.append(len(df))
+        building.set()
+        release.wait(10)
+        return {'embeddings': None, 'model_name': 'stub'}
+
+    monkeypatch.setattr(VendorCatalog, 'load_or_build_embedding_index', slow_build)
+    callers = [threading.Thread(target=VendorCatalog.get_catalog_embedding_index, args=(catalog,)) for _ in range(2)]
+    try:
+        for caller in callers:
+            caller.start()
+        assert building.wait(10)
+
+        # Reloading takes the process-wide catalog lock, the embedding build only holds the catalog's own
+        reloader = threading.Thread(target=VendorCatalog.reload_catalog, args=(catalog_path,))
+        reloader.start()
+        reloader.join(30)
+        assert not reloader.is_alive()
+        assert 'embedding_index' not in catalog
+    finally:
+        release.set()
+        for caller in callers:
+            caller.join(10)
+
+    assert builds == [len(catalog['df'])]
+    assert catalog['embedding_index']['model_name'] == 'stub'
+
+@pytest.mark.parametrize('damage', ['delete', 'truncate'])
+def test_damaged_saved_index_is_rebuilt(catalog_path, tmp_path, capsys, damage):
+    index_path = str(tmp_path / 'index')
+    expected = VendorCatalog.build_catalog(catalog_path, index_path)['feature_index']
+
+    array_path = os.path.join(index_path, 'data.npy')
+    if damage == 'delete':
+        os.remove(array_path)
+    else:
+        with open(array_path, 'r+b') as file:
+            file.truncate(os.path.getsize(array_path) // 2)
+    capsys.readouterr()
+
+    feature_index = VendorCatalog.build_catalog(catalog_path, index_path)['feature_index']
+    assert 'Error loading feature index' in capsys.readouterr().out
+    assert abs(feature_index['matrix'] - expected['matrix']).max() == 0
+    assert np.array_equal(feature_index['vendor_offsets'], expected['vendor_offsets'])
+
+    # The rebuilt index was saved again
+    assert os.path.exists(array_path)
+    assert isinstance(VendorCatalog.build_catalog(catalog_path, index_path)['feature_index']['matrix'].data, np.memmap)
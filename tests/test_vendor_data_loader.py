@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+import VendorDataLoader
+from VendorDataLoader import load_vendor_data, VENDOR_COLUMNS
+
+ROWS = [
+    {'product_name': 'Alpha CRM', 'rating': '4.5', 'seller': 'Acme', 'main_category': 'CRM Software',
+     'Features': '[{"Category": "Core", "features": [{"name": "Leads", "description": "lead tracking"}]}]',
+     'url': 'https://alpha.example'},
+    {'product_name': 'Béta Ledger', 'rating': 'n/a', 'seller': '', 'main_category': 'Accounting & Finance Software',
+     'Features': '', 'url': ''},
+    {'product_name': 'Gamma HR', 'rating': '', 'seller': 'Acme', 'main_category': 'HR Software',
+     'Features': '{"not": "a list"}', 'url': ''},
+    {'product_name': 'Delta, "quoted"', 'rating': '3', 'seller': 'Delta Inc', 'main_category': '',
+     'Features': '[]', 'url': ''},
+    {'product_name': 'Epsilon CRM', 'rating': '5.0', 'seller': 'Epsilon', 'main_category': 'CRM Software',
+     'Features': 'not json', 'url': ''},
+]
+
+@pytest.fixture
+def vendor_csv(tmp_path):
+    path = tmp_path / 'vendors.csv'
+    pd.DataFrame(ROWS * 3).to_csv(path, index=False)
+    return str(path)
+
+def read_expected(vendor_csv):
+    expected = pd.read_csv(vendor_csv, usecols=VENDOR_COLUMNS)[VENDOR_COLUMNS]
+    expected['rating'] = pd.to_numeric(expected['rating'], errors='coerce')
+    return expected
+
+def as_plain_columns(df):
+    """Compares categoricals by their values, object columns hold NaN for missing strings either way."""
+    return df.astype({'seller': object, 'main_category': object, 'product_name': object, 'Features': object})
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 100])
+def test_loader_matches_read_csv(vendor_csv, chunk_size):
+    df = load_vendor_data(vendor_csv, chunk_size=chunk_size)
+
+    assert isinstance(df['seller'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['main_category'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(as_plain_columns(df), as_plain_columns(read_expected(vendor_csv)))
+
+def test_cache_round_trip(vendor_csv, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / 'cache')
+    loaded = load_vendor_data(vendor_csv, cache_path, chunk_size=2)
+
+    # The second load must come from the cache, without reading the CSV
+    def fail(*args, **kwargs):
+        raise AssertionError("The CSV was read although the cache is current")
+    monkeypatch.setattr(VendorDataLoader, 'iter_vendor_chunks', fail)
+    cached = load_vendor_data(vendor_csv, cache_path)
+
+    pd.testing.assert_frame_equal(cached, loaded)
+    pd.testing.assert_frame_equal(as_plain_columns(cached), as_plain_columns(read_expected(vendor_csv)))
+
+def test_empty_file(tmp_path):
+    path = tmp_path / 'empty.csv'
+    pd.DataFrame(columns=VENDOR_COLUMNS).to_csv(path, index=False)
+    df = load_vendor_data(str(path))
+    assert list(df.columns) == VENDOR_COLUMNS and len(df) == 0
+    assert np.isnan(df['rating'].to_numpy()).all()
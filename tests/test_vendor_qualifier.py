@@ -0,0 +1,41 @@
+import pandas as pd
+from CommonProcessingUtility import get_query
+from VendorQualification.VendorQualifier import get_qualifiedVendors, get_qualifiedVendors_batch
+
+# Queries over the generator's words, most of them qualify some vendors of the test catalog
+QUERIES = [
+    ('Accounting & Finance Software', ['planning ticket', 'permission workflow']),
+    ('HR Software', ['billing account']),
+    ('analytics', ['payment role']),
+    ('accounting', ['approval pipeline', 'storage export']),
+    ('No Such Category', ['payroll']),
+]
+
+def test_batch_matches_single_queries(catalog_path):
+    results = get_qualifiedVendors_batch(catalog_path, QUERIES, k=5, use_cache=False)
+
+    assert len(results) == len(QUERIES)
+    assert sum(len(result) for result in results) > 0
+    for (software_category, capabilities), result in zip(QUERIES, results):
+        expected = get_qualifiedVendors(catalog_path, get_query(software_category, capabilities), software_category,
+                                        capabilities, k=5, use_cache=False)
+        pd.testing.assert_frame_equal(result, expected)
+
+def test_pages_match_the_full_ranking(catalog_path):
+    software_category, capabilities = QUERIES[3]
+    query = get_query(software_category, capabilities)
+    ranking = get_qualifiedVendors(catalog_path, query, software_category, capabilities, k=15, use_cache=False)
+    assert len(ranking) == 15
+
+    for offset, k in ((0, 5), (5, 5), (10, 5)):
+        page = get_qualifiedVendors(catalog_path, query, software_category, capabilities, k=k, offset=offset,
+                                    use_cache=False)
+        pd.testing.assert_frame_equal(page, ranking.iloc[offset:offset + k])
+
+def test_fields_select_the_vendor_columns(catalog_path):
+    software_category, capabilities = QUERIES[3]
+    result = get_qualifiedVendors(catalog_path, get_query(software_category, capabilities), software_category,
+                                  capabilities, k=3, use_cache=False, fields=('product_name', 'rating'))
+
+    assert list(result.columns) == ['product_name', 'rating', 'avg_similarity_scores', 'max_similarity_scores',
+                                    'similarity_scores', 'final_score', 'rank']